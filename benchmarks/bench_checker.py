@@ -0,0 +1,137 @@
+# benchmarks/bench_checker.py
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import config
+from db.models import Alert
+from scraper import core as scraper_core
+from scraper.models import ProductInfo
+from tasks import checker
+
+from .timing import measure_async
+
+# Alertas por producto y por chat en el conjunto sintético.
+ALERTS_PER_PRODUCT = 3
+ALERTS_PER_CHAT = 5
+# Una de cada NOTIFY_EVERY alertas tiene el objetivo por encima del precio y dispara.
+NOTIFY_EVERY = 10
+
+
+class FakeDB:
+    """Sustituto en memoria de db.async_queries con lo que usa un ciclo del checker.
+
+    Solo cuenta las escrituras; get_seconds_until_next_check marca el fin del ciclo.
+    """
+
+    def __init__(self, alerts: list[Alert]):
+        self.alerts = sorted(alerts, key=lambda a: a.clean_url)
+        self.cycle_done = asyncio.Event()
+        self.writes = {"last_price": 0, "last_notified": 0, "schedules": 0}
+
+    async def iter_due_alerts(self, page_size: int | None = None):
+        page_size = page_size or config.CHECKER_PREFETCH_BATCH_SIZE
+        previous_url = None
+        products = 0
+        for alert in self.alerts:
+            if alert.clean_url != previous_url:
+                if products % page_size == 0:
+                    await asyncio.sleep(0)  # un viaje a la BD por página de productos
+                products += 1
+                previous_url = alert.clean_url
+            yield alert
+
+    async def get_cached_prices(self, clean_urls):
+        return {}
+
+    async def update_alerts_last_price_bulk(self, updates):
+        self.writes["last_price"] += len(updates)
+
+    async def update_alerts_last_notified_bulk(self, alert_ids):
+        self.writes["last_notified"] += len(alert_ids)
+
+    async def upsert_product_schedules(self, schedules):
+        self.writes["schedules"] += len(schedules)
+
+    async def get_seconds_until_next_check(self):
+        self.cycle_done.set()
+        return config.CHECKER_MAX_SLEEP_SECONDS
+
+    @asynccontextmanager
+    async def try_advisory_lock(self, key: int):
+        # Sustituye a db.async_connection.try_advisory_lock (lock del mantenimiento).
+        yield True
+
+    async def _noop(self, *args, **kwargs):
+        return 0
+
+    reschedule_products_in_cooldown = cleanup_old_scraped_prices = cleanup_untracked_products = _noop
+    cleanup_unused_telegram_file_ids = ensure_price_history_partitions = downsample_price_history = _noop
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, **kwargs):
+        self.sent += 1
+
+    async def send_photo(self, **kwargs):
+        self.sent += 1
+        return SimpleNamespace(photo=[])
+
+
+def synthetic_alerts(count: int) -> list[Alert]:
+    alerts = []
+    for i in range(count):
+        product = i // ALERTS_PER_PRODUCT
+        url = f"https://www.backmarket.es/es-es/p/producto-{product}?l=1"
+        alerts.append(Alert(
+            id=f"{i:08x}-0000-4000-8000-000000000000",
+            chat_id=i // ALERTS_PER_CHAT,
+            full_url=url,
+            clean_url=url,
+            target_price=1000.0 if i % NOTIFY_EVERY == 0 else 10.0,
+            last_price=None,
+            subscriber_count=ALERTS_PER_PRODUCT,
+        ))
+    return alerts
+
+
+def _fake_get_product_info(latency_seconds: float):
+    async def get_product_info(url, check_cache=True, allow_stale=True):
+        await asyncio.sleep(latency_seconds)
+        return ProductInfo(price=100.0 + len(url) % 50, name="Producto", full_url=url, status="SCRAPED_SUCCESS")
+    return get_product_info
+
+
+async def run_cycle(alert_count: int, scrape_latency_seconds: float = 0.0) -> dict:
+    """Un ciclo completo de check_alerts_periodically (scrape, notificaciones, escrituras y
+    mantenimiento) contra el scraper, el bot y la BD falsos. Devuelve los contadores del ciclo."""
+    fake_db = FakeDB(synthetic_alerts(alert_count))
+    bot = FakeBot()
+    scraper_core._price_cache.clear()
+    with patch.object(checker, "db_queries", fake_db), \
+            patch("db.write_buffer.db_queries", fake_db), \
+            patch.object(scraper_core, "db_queries", fake_db), \
+            patch.object(checker.db_async_connection, "try_advisory_lock", fake_db.try_advisory_lock), \
+            patch.object(checker.scraper_core, "get_product_info", _fake_get_product_info(scrape_latency_seconds)), \
+            patch.object(config, "NOTIFY_GLOBAL_RATE_PER_SECOND", 1e9), \
+            patch.object(config, "NOTIFY_PER_CHAT_RATE_PER_SECOND", 1e9):
+        task = asyncio.create_task(checker.check_alerts_periodically(SimpleNamespace(bot=bot)))
+        await fake_db.cycle_done.wait()
+        # Cancelar durante la espera hasta el siguiente ciclo: el notificador entrega lo pendiente al pararse.
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    return {**fake_db.writes, "messages": bot.sent}
+
+
+def run(quick: bool = False, scrape_latency_seconds: float = 0.0) -> dict[str, dict]:
+    rounds = 3 if quick else 5
+    results = {}
+    for alert_count in ((100, 1_000) if quick else (100, 1_000, 10_000)):
+        results[f"checker.cycle_{alert_count}_alerts"] = measure_async(
+            lambda alert_count=alert_count: run_cycle(alert_count, scrape_latency_seconds), rounds, items=alert_count
+        )
+    return results
@@ -0,0 +1,60 @@
+# benchmarks/bench_parse.py
+import json
+from pathlib import Path
+
+from scraper import core as scraper_core
+
+from .timing import measure
+
+FIXTURE_PATH = Path(__file__).resolve().parent.parent / "scraper.html"
+_URL = "https://www.backmarket.es/es-es/p/benchmark"
+
+_PRODUCT_LD_JSON = json.dumps({
+    "@context": "https://schema.org",
+    "@type": "Product",
+    "name": "iPad Air 5 (2022) 256 GB",
+    "image": ["https://example.com/ipad.jpg"],
+    "brand": {"@type": "Brand", "name": "Apple"},
+    "offers": {
+        "@type": "Offer",
+        "price": "549.00",
+        "availability": "https://schema.org/InStock",
+        "itemCondition": "https://schema.org/RefurbishedCondition",
+    },
+})
+_FILLER_CHUNK = '<div class="card"><span>Lorem ipsum dolor sit amet</span><a href="/x">enlace</a></div>\n'
+
+
+def synthetic_page(size_bytes: int, position: str) -> str:
+    """Página HTML de unos `size_bytes` con el bloque JSON-LD al principio, en medio o al final."""
+    script = f'<script type="application/ld+json">{_PRODUCT_LD_JSON}</script>'
+    filler = _FILLER_CHUNK * max(1, size_bytes // len(_FILLER_CHUNK))
+    if position == "head":
+        body = script + filler
+    elif position == "middle":
+        half = len(filler) // 2
+        body = filler[:half] + script + filler[half:]
+    else:
+        body = filler + script
+    return f"<html><head><title>Bench</title></head><body>{body}</body></html>"
+
+
+def run(quick: bool = False) -> dict[str, dict]:
+    rounds = 3 if quick else 10
+    results = {}
+
+    fixture = FIXTURE_PATH.read_text(encoding="utf-8")
+    results["parse.fixture"] = measure(lambda: scraper_core._parse_product_details(fixture, _URL), rounds)
+    # Camino lento (BeautifulSoup) sobre la misma página, como referencia del fallback.
+    results["parse.fixture_soup"] = measure(
+        lambda: scraper_core._parse_product_details_soup(fixture, _URL), max(1, rounds // 3)
+    )
+
+    sizes = {"50k": 50_000, "500k": 500_000} if quick else {"50k": 50_000, "500k": 500_000, "2m": 2_000_000}
+    for size_name, size_bytes in sizes.items():
+        for position in ("head", "middle", "tail"):
+            page = synthetic_page(size_bytes, position)
+            results[f"parse.synthetic_{size_name}_{position}"] = measure(
+                lambda page=page: scraper_core._parse_product_details(page, _URL), rounds
+            )
+    return results
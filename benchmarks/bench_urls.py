@@ -0,0 +1,22 @@
+# benchmarks/bench_urls.py
+from scraper.utils import clean_url
+
+from .timing import measure
+
+
+def url_batch(count: int) -> list[str]:
+    """URLs con la forma de las de Back Market: parámetro `l` a conservar, tracking y fragmento a quitar."""
+    return [
+        f"https://www.backmarket.es/es-es/p/producto-{i}/{i:08x}-76fc-42fc-92f1-f6cf8879c836"
+        f"?l={i % 12}&variantClicked=true&utm_source=bench&utm_campaign={i}#scroll=false"
+        for i in range(count)
+    ]
+
+
+def run(quick: bool = False) -> dict[str, dict]:
+    rounds = 3 if quick else 10
+    results = {}
+    for count in ((1_000, 10_000) if quick else (1_000, 10_000, 100_000)):
+        urls = url_batch(count)
+        results[f"clean_url.batch_{count}"] = measure(lambda urls=urls: [clean_url(u) for u in urls], rounds, items=count)
+    return results
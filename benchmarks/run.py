@@ -0,0 +1,109 @@
+# benchmarks/run.py
+"""Benchmarks de los caminos calientes: parseo, limpieza de URLs y ciclo del checker.
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --compare bench.json --tolerance 0.15
+
+Los resultados son JSON (mediana, mínimo, etc. por benchmark). Con --compare se comparan
+las medianas con un fichero anterior y se sale con código 1 si alguna empeora más de
+--tolerance, para usarlo en CI antes de desplegar.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+SUITES = ("parse", "urls", "checker")
+
+
+def _prepare_environment():
+    """Debe llamarse antes de importar config. El ciclo del checker usa una BD falsa, así que
+    basta con que las variables obligatorias existan; el log a WARNING no mide la E/S de logging."""
+    os.environ.setdefault("TELEGRAM_TOKEN", "benchmark")
+    os.environ.setdefault("DATABASE_URL", "postgresql://benchmark")
+    os.environ.setdefault("SCRAPERAPI_KEY", "benchmark")
+    os.environ.setdefault("LOGGING_LEVEL", "WARNING")
+    os.environ.setdefault("PARSE_EXECUTOR", "none")
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suites(suites: list[str], quick: bool = False, scrape_latency_seconds: float = 0.0) -> dict:
+    from . import bench_checker, bench_parse, bench_urls
+
+    results = {}
+    if "parse" in suites:
+        results.update(bench_parse.run(quick))
+    if "urls" in suites:
+        results.update(bench_urls.run(quick))
+    if "checker" in suites:
+        results.update(bench_checker.run(quick, scrape_latency_seconds))
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """Compara las medianas de los benchmarks comunes. `ratio` > 1 significa más lento que la base."""
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("median_s"):
+            continue
+        ratio = result["median_s"] / base["median_s"]
+        rows.append({"name": name, "baseline_s": base["median_s"], "current_s": result["median_s"],
+                     "ratio": ratio, "regression": ratio > 1 + tolerance})
+    return rows
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de parseo, URLs y ciclo del checker.")
+    parser.add_argument("--suite", action="append", choices=SUITES, help="Suite a ejecutar (repetible; por defecto todas).")
+    parser.add_argument("--quick", action="store_true", help="Menos rondas y tamaños, para CI.")
+    parser.add_argument("--scrape-latency", type=float, default=0.0, help="Latencia simulada por scrape en el ciclo del checker (s).")
+    parser.add_argument("--output", help="Fichero JSON donde guardar los resultados (por defecto, stdout).")
+    parser.add_argument("--compare", help="Resultados anteriores con los que comparar.")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Empeoramiento relativo tolerado en --compare.")
+    args = parser.parse_args(argv)
+
+    _prepare_environment()
+    report = run_suites(args.suite or list(SUITES), args.quick, args.scrape_latency)
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            rows = compare(report, json.load(f), args.tolerance)
+        report["comparison"] = {"baseline": args.compare, "tolerance": args.tolerance, "rows": rows}
+        for row in rows:
+            flag = "REGRESIÓN" if row["regression"] else "ok"
+            print(f"{row['name']:<40} {row['baseline_s']:.6f}s -> {row['current_s']:.6f}s  x{row['ratio']:.2f}  {flag}", file=sys.stderr)
+        if any(row["regression"] for row in rows):
+            exit_code = 1
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
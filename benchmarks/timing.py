@@ -0,0 +1,43 @@
+# benchmarks/timing.py
+import asyncio
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+
+
+def _summary(samples: list[float], items: int) -> dict:
+    median = statistics.median(samples)
+    return {
+        "rounds": len(samples),
+        "items": items,
+        "min_s": min(samples),
+        "median_s": median,
+        "max_s": max(samples),
+        "stdev_s": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "items_per_s": items / median if median > 0 else None,
+    }
+
+
+def measure(fn: Callable[[], object], rounds: int, items: int = 1, warmup: int = 1) -> dict:
+    """Ejecuta `fn` `warmup` veces sin medir y `rounds` veces midiendo. `items` es el
+    número de elementos que procesa cada llamada (para calcular items_per_s)."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return _summary(samples, items)
+
+
+def measure_async(make_coro: Callable[[], Awaitable], rounds: int, items: int = 1, warmup: int = 1) -> dict:
+    """Como `measure`, pero cada ronda ejecuta `make_coro()` en un bucle de eventos nuevo."""
+    for _ in range(warmup):
+        asyncio.run(make_coro())
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        asyncio.run(make_coro())
+        samples.append(time.perf_counter() - start)
+    return _summary(samples, items)
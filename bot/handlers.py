@@ -1,14 +1,16 @@
 # bot/handlers.py
 import logging
-import asyncio
+from datetime import datetime, timedelta
 from telegram import Update, InputMediaPhoto
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 from telegram.error import TelegramError
 
-from db import queries as db_queries
+import config
+from db import async_queries as db_queries
 from scraper import core as scraper_core
 from scraper import utils as scraper_utils
+from .media import send_photo_cached
 from .ui import (
     format_product_info_message,
     format_alert_list_message,
@@ -17,6 +19,39 @@ from .ui import (
 
 logger = logging.getLogger(__name__)
 
+# Callbacks de paginación de /alerts: "<aln|alp>:<posición>:<inserted_at en µs>:<uuid en hex>",
+# dentro del límite de 64 bytes de callback_data de Telegram.
+ALERTS_NEXT_PREFIX = "aln"
+ALERTS_PREV_PREFIX = "alp"
+_EPOCH = datetime(1970, 1, 1)
+
+def _encode_page_callback(prefix: str, start_index: int, cursor_row: dict) -> str | None:
+    if cursor_row.get('inserted_at') is None:
+        return None
+    micros = (cursor_row['inserted_at'] - _EPOCH) // timedelta(microseconds=1)
+    return f"{prefix}:{start_index}:{micros}:{str(cursor_row['id']).replace('-', '')}"
+
+def _decode_page_callback(data: str) -> tuple[int, tuple[datetime, str]]:
+    _, start_index, micros, alert_id = data.split(":")
+    return int(start_index), (_EPOCH + timedelta(microseconds=int(micros)), alert_id)
+
+async def render_alerts_page(chat_id: int, start_index: int = 0, after: tuple[datetime, str] | None = None,
+                             before: tuple[datetime, str] | None = None):
+    """Texto y teclado de una página de /alerts. Sin cursor, la primera página."""
+    page_size = max(1, config.ALERTS_PAGE_SIZE)
+    alerts, has_more = await db_queries.get_user_alerts_page(chat_id, page_size, after=after, before=before)
+    if not alerts and (after is not None or before is not None):
+        # El cursor ya no apunta a nada (p. ej. se borraron alertas): volver al principio
+        return await render_alerts_page(chat_id)
+    if before is not None:
+        has_prev, has_next = has_more, True
+        start_index = max(0, start_index) if has_more else 0
+    else:
+        has_prev, has_next = after is not None, has_more
+    prev_callback = _encode_page_callback(ALERTS_PREV_PREFIX, max(0, start_index - page_size), alerts[0]) if has_prev and alerts else None
+    next_callback = _encode_page_callback(ALERTS_NEXT_PREFIX, start_index + len(alerts), alerts[-1]) if has_next and alerts else None
+    return format_alert_list_message(alerts, start_index, prev_callback, next_callback)
+
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(HELP_MESSAGE_MARKDOWN, parse_mode=ParseMode.MARKDOWN)
 
@@ -46,22 +81,22 @@ async def track_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     product_name_for_db = product_info.get("name") if product_info.get("status") == "SCRAPED_SUCCESS" else None
     
     # Usar la función renombrada y la lógica de creación/actualización
-    existing_alert = await asyncio.to_thread(db_queries.get_alert_by_chat_and_clean_url, chat_id, cleaned_url)
+    existing_alert = await db_queries.get_alert_by_chat_and_clean_url(chat_id, cleaned_url)
     response_key_part = ""
 
     if existing_alert:
-        await asyncio.to_thread(db_queries.update_alert_target_price, str(existing_alert['id']), target_price, url)
+        await db_queries.update_alert_target_price(str(existing_alert['id']), target_price, url)
         response_key_part = "🔁 Alerta actualizada."
     else:
         # Pasar product_name a create_alert si se quiere guardar en tabla alerts en el futuro
-        await asyncio.to_thread(db_queries.create_alert, chat_id, url, cleaned_url, target_price, product_name_for_db)
+        await db_queries.create_alert(chat_id, url, cleaned_url, target_price, product_name_for_db)
         response_key_part = "✅ Alerta creada correctamente."
 
     # Formatear el mensaje de respuesta
     # format_product_info_message ahora devuelve (texto, teclado), pero para /track no necesitamos teclado aquí.
     message_text_body, _ = format_product_info_message(product_info, target_price)
     
-    if product_info['status'] in ["CACHE_HIT", "SCRAPED_SUCCESS"]:
+    if product_info['status'] in ["CACHE_HIT", "CACHE_STALE", "SCRAPED_SUCCESS", "SCRAPED_UNCHANGED"]:
         full_response_message = f"{response_key_part}\n\n{message_text_body}"
     elif product_info['status'].startswith("SCRAPE_FAILED"):
         full_response_message = (f"{response_key_part}\n\n"
@@ -80,9 +115,10 @@ async def track_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if processing_message: # Editar el mensaje "Procesando..." para que sea la foto
                  await context.bot.delete_message(chat_id=chat_id, message_id=processing_message.message_id)
                  # No se puede editar un mensaje de texto a foto, se envía uno nuevo.
-            await context.bot.send_photo(
-                chat_id=chat_id,
-                photo=image_url,
+            await send_photo_cached(
+                context.bot,
+                chat_id,
+                image_url,
                 caption=full_response_message,
                 parse_mode=ParseMode.MARKDOWN
             )
@@ -107,8 +143,7 @@ async def track_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def list_alerts_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
-    user_alerts = await asyncio.to_thread(db_queries.get_user_alerts, chat_id)
-    message_text, reply_markup = format_alert_list_message(user_alerts)
+    message_text, reply_markup = await render_alerts_page(chat_id)
     await update.message.reply_text(message_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
 
 async def delete_alert_by_number_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -121,15 +156,12 @@ async def delete_alert_by_number_command(update: Update, context: ContextTypes.D
     except ValueError:
         await update.message.reply_text("❌ El número debe ser un entero.")
         return
-    alerts_ordered = await asyncio.to_thread(db_queries.get_user_alerts, chat_id)
-    if not (0 <= idx_to_delete < len(alerts_ordered)):
+    alert_id_to_delete = await db_queries.get_user_alert_id_at(chat_id, idx_to_delete + 1)
+    if alert_id_to_delete is None:
         await update.message.reply_text("❌ Número de alerta inválido.")
         return
-    alert_id_to_delete = str(alerts_ordered[idx_to_delete]['id'])
-    deleted = await asyncio.to_thread(db_queries.delete_alert_by_id, alert_id_to_delete, chat_id)
+    deleted = await db_queries.delete_alert_by_id(alert_id_to_delete, chat_id)
     if deleted:
-        # Obtener nombre del producto para mensaje de confirmación (opcional)
-        # alert_name = alerts_ordered[idx_to_delete].get('product_name', 'la alerta seleccionada')
         await update.message.reply_text(f"🗑️ Alerta eliminada.") # Podrías añadir `para {alert_name}`
     else:
         await update.message.reply_text("⚠️ No se pudo eliminar.")
@@ -142,7 +174,7 @@ async def handle_refresh_alert(update: Update, context: ContextTypes.DEFAULT_TYP
     
     await query.edit_message_text(text=f"🔄 Actualizando información para alerta ID {alert_id_str[-6:]}...", reply_markup=None)
 
-    alert_data = await asyncio.to_thread(db_queries.get_alert_by_id, alert_id_str)
+    alert_data = await db_queries.get_alert_by_id(alert_id_str)
     if not alert_data or alert_data['chat_id'] != chat_id:
         await query.edit_message_text("⚠️ Error: Alerta no encontrada o no te pertenece.")
         return
@@ -150,13 +182,12 @@ async def handle_refresh_alert(update: Update, context: ContextTypes.DEFAULT_TYP
     product_info = await scraper_core.get_product_info(alert_data['full_url'])
     
     if product_info.get("price") is not None:
-        await asyncio.to_thread(db_queries.update_alert_last_price, alert_id_str, product_info["price"])
+        await db_queries.update_alert_last_price(alert_id_str, product_info["price"])
         feedback_msg_text, _ = format_product_info_message(product_info, alert_data['target_price'])
-        final_message = f"✅ Información actualizada para [{product_info.get('name', 'Producto')}]({alert_data['full_url']}):\n{feedback_msg_text}"
+        final_message = f"✅ Información actualizada para [{product_info.get('name') or 'Producto'}]({alert_data['full_url']}):\n{feedback_msg_text}"
         
-        # Re-enviar la lista de alertas actualizada
-        user_alerts = await asyncio.to_thread(db_queries.get_user_alerts, chat_id)
-        list_text, list_markup = format_alert_list_message(user_alerts)
+        # Re-enviar la lista de alertas actualizada (primera página)
+        list_text, list_markup = await render_alerts_page(chat_id)
 
         # Primero editar el mensaje de "actualizando" para quitarlo
         await query.edit_message_text(text=final_message, parse_mode=ParseMode.MARKDOWN, reply_markup=None)
@@ -173,6 +204,19 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
     action_data = query.data
     chat_id = query.message.chat_id
 
+    if action_data.startswith((f"{ALERTS_NEXT_PREFIX}:", f"{ALERTS_PREV_PREFIX}:")):
+        try:
+            start_index, cursor = _decode_page_callback(action_data)
+        except ValueError:
+            logger.error(f"Callback de paginación inválido: '{action_data}'")
+            return
+        if action_data.startswith(ALERTS_NEXT_PREFIX):
+            message_text, reply_markup = await render_alerts_page(chat_id, start_index, after=cursor)
+        else:
+            message_text, reply_markup = await render_alerts_page(chat_id, start_index, before=cursor)
+        await query.edit_message_text(text=message_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
+        return
+
     if action_data.startswith("delete_alert_"):
         try:
             alert_id_str = action_data.replace("delete_alert_", "")
@@ -181,9 +225,9 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
             await query.edit_message_text(text="❌ Error: ID de alerta inválido.")
             return
         
-        deleted = await asyncio.to_thread(db_queries.delete_alert_by_id, alert_id_str, chat_id)
+        deleted = await db_queries.delete_alert_by_id(alert_id_str, chat_id)
         if deleted:
             await query.edit_message_text(text="🗑️ Alerta eliminada.")
             # Actualizar la lista de alertas después de eliminar
-            user_alerts = await asyncio.to_thread(db_queries.get_user_alerts, chat_id)
-            message_text, reply_markup = format_alert_list_message(user_alerts)
+            message_text, reply_markup = await render_alerts_page(chat_id)
+            await context.bot.send_message(chat_id=chat_id, text=message_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
@@ -0,0 +1,102 @@
+# bot/media.py
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from telegram import Bot, Message
+from telegram.error import BadRequest
+
+from db import async_queries as db_queries
+
+logger = logging.getLogger(__name__)
+
+# file_id de Telegram por URL de imagen: evita que Telegram descargue la misma imagen en cada envío.
+_MAX_CACHED_FILE_IDS = 10000
+_file_ids: dict[str, str] = {}
+# Lock por URL y número de envíos que lo usan (esperando o dentro); se descarta con el último.
+_upload_locks: dict[str, tuple[asyncio.Lock, int]] = {}
+
+
+async def get_file_id(image_url: str) -> str | None:
+    """file_id ya subido para `image_url`, consultando primero la memoria y luego la BD."""
+    file_id = _file_ids.get(image_url)
+    if file_id is not None:
+        return file_id
+    try:
+        file_id = await db_queries.get_telegram_file_id(image_url)
+    except Exception as e:
+        logger.warning(f"No se pudo leer el file_id de {image_url}: {e}")
+        return None
+    if file_id is not None:
+        _remember_in_memory(image_url, file_id)
+    return file_id
+
+
+def _remember_in_memory(image_url: str, file_id: str):
+    _file_ids.pop(image_url, None)
+    _file_ids[image_url] = file_id
+    while len(_file_ids) > _MAX_CACHED_FILE_IDS:
+        del _file_ids[next(iter(_file_ids))]
+
+
+async def remember_file_id(image_url: str, message: Message | None):
+    """Guarda el file_id de la foto más grande del mensaje enviado."""
+    if message is None or not message.photo:
+        return
+    file_id = message.photo[-1].file_id
+    _remember_in_memory(image_url, file_id)
+    try:
+        await db_queries.save_telegram_file_id(image_url, file_id)
+    except Exception as e:
+        logger.warning(f"No se pudo guardar el file_id de {image_url}: {e}")
+
+
+async def forget_file_id(image_url: str):
+    _file_ids.pop(image_url, None)
+    try:
+        await db_queries.delete_telegram_file_id(image_url)
+    except Exception as e:
+        logger.warning(f"No se pudo borrar el file_id de {image_url}: {e}")
+
+
+@asynccontextmanager
+async def _upload_lock(image_url: str):
+    """Serializa las subidas de una misma URL. El lock solo se elimina cuando nadie más lo
+    espera: si lo quitara quien termina, un envío posterior crearía otro y subiría de nuevo."""
+    lock, users = _upload_locks.get(image_url) or (asyncio.Lock(), 0)
+    _upload_locks[image_url] = (lock, users + 1)
+    try:
+        async with lock:
+            yield
+    finally:
+        lock, users = _upload_locks[image_url]
+        if users == 1:
+            del _upload_locks[image_url]
+        else:
+            _upload_locks[image_url] = (lock, users - 1)
+
+
+async def send_photo_cached(bot: Bot, chat_id: int, image_url: str, **kwargs) -> Message:
+    """send_photo reutilizando el file_id de envíos anteriores de la misma imagen.
+
+    La primera subida de cada URL se hace una sola vez aunque haya varios envíos
+    simultáneos; si Telegram rechaza un file_id guardado, se olvida y se reenvía por URL.
+    """
+    file_id = await get_file_id(image_url)
+    if file_id is None:
+        async with _upload_lock(image_url):
+            file_id = await get_file_id(image_url)
+            if file_id is None:
+                message = await bot.send_photo(chat_id=chat_id, photo=image_url, **kwargs)
+                await remember_file_id(image_url, message)
+                return message
+    try:
+        return await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+    except BadRequest as e:
+        if "file" not in str(e).lower():
+            raise
+        logger.info(f"file_id rechazado para {image_url} ({e}); se vuelve a enviar por URL.")
+        await forget_file_id(image_url)
+        message = await bot.send_photo(chat_id=chat_id, photo=image_url, **kwargs)
+        await remember_file_id(image_url, message)
+        return message
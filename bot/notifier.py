@@ -0,0 +1,238 @@
+# bot/notifier.py
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Awaitable, Callable
+
+from telegram import Bot, InlineKeyboardMarkup
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+import config
+import metrics
+from db.models import Alert
+from scraper.models import ProductInfo
+from . import media as bot_media
+from . import ui as bot_ui
+
+logger = logging.getLogger(__name__)
+
+# Cubos de chats sin actividad que se conservan antes de purgarlos.
+_MAX_IDLE_CHAT_BUCKETS = 1000
+
+
+class TokenBucket:
+    """Cubo de fichas: ráfagas de hasta `capacity` envíos y `rate` envíos por segundo de media."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = max(rate, 0.001)
+        self.capacity = max(1.0, capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated: float | None = None
+
+    def _refill(self, now: float):
+        if self._updated is not None:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self._tokens >= self.capacity
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        self._refill(loop.time())
+        # Se reserva la ficha antes de dormir (puede quedar saldo negativo), así quienes
+        # esperan a la vez quedan espaciados sin necesidad de un lock.
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+
+
+@dataclass
+class OutgoingNotification:
+    chat_id: int
+    text: str
+    reply_markup: InlineKeyboardMarkup | None = None
+    photo: str | None = None
+    alert_ids: list[str] = field(default_factory=list)
+    attempts: int = 0
+
+
+class NotificationDispatcher:
+    """Cola de salida de notificaciones de Telegram.
+
+    El checker encola con `enqueue` y sigue; `flush_digests` agrupa lo encolado en el ciclo
+    (un mensaje resumen por chat con varias alertas) y lo pasa a los `senders` concurrentes,
+    que respetan un límite global y otro por chat y reintentan tras un RetryAfter.
+    `on_sent` recibe los IDs de alerta de cada mensaje entregado.
+    """
+
+    def __init__(self, bot: Bot, on_sent: Callable[[list[str]], Awaitable] | None = None,
+                 global_rate: float | None = None, per_chat_rate: float | None = None,
+                 senders: int | None = None, max_retries: int | None = None):
+        self.bot = bot
+        self.on_sent = on_sent
+        self.max_retries = config.NOTIFY_MAX_RETRIES if max_retries is None else max_retries
+        self.sender_count = max(1, config.NOTIFY_SENDERS if senders is None else senders)
+        self.per_chat_rate = config.NOTIFY_PER_CHAT_RATE_PER_SECOND if per_chat_rate is None else per_chat_rate
+        self._global_bucket = TokenBucket(config.NOTIFY_GLOBAL_RATE_PER_SECOND if global_rate is None else global_rate)
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._digests: dict[int, list[tuple[Alert | dict, ProductInfo | dict]]] = {}
+        self._pending_alert_ids: set[str] = set()
+        self._queue: asyncio.Queue[OutgoingNotification] = asyncio.Queue()
+        self._paused_until = 0.0
+        self._senders: list[asyncio.Task] = []
+
+    @property
+    def pending(self) -> int:
+        return sum(len(items) for items in self._digests.values()) + self._queue.qsize()
+
+    def start(self):
+        if not self._senders:
+            self._senders = [asyncio.create_task(self._sender(i)) for i in range(self.sender_count)]
+
+    def enqueue(self, alert_data: Alert | dict, product_info: ProductInfo | dict) -> bool:
+        """Encola la notificación de una alerta. False si ya había una pendiente para ella."""
+        alert_id = str(alert_data['id'])
+        if alert_id in self._pending_alert_ids:
+            return False
+        self._pending_alert_ids.add(alert_id)
+        self._digests.setdefault(alert_data['chat_id'], []).append((alert_data, product_info))
+        return True
+
+    def flush_digests(self):
+        """Convierte lo encolado en mensajes: uno normal si el chat tiene una sola alerta, un resumen si tiene varias."""
+        digests, self._digests = self._digests, {}
+        for chat_id, items in digests.items():
+            if len(items) == 1:
+                alert_data, product_info = items[0]
+                text, reply_markup, image_url = bot_ui.format_notification_content(alert_data, product_info)
+                self._queue.put_nowait(OutgoingNotification(chat_id, text, reply_markup, image_url, [str(alert_data['id'])]))
+                continue
+            max_items = max(1, config.NOTIFY_DIGEST_MAX_ITEMS)
+            for start in range(0, len(items), max_items):
+                chunk = items[start:start + max_items]
+                text, reply_markup = bot_ui.format_digest_content(chunk)
+                self._queue.put_nowait(OutgoingNotification(chat_id, text, reply_markup, None, [str(a['id']) for a, _ in chunk]))
+        if digests:
+            self.start()
+
+    async def flush(self):
+        """Fin de ciclo del checker: misma interfaz que bot.outbox.OutboxPublisher."""
+        self.flush_digests()
+
+    async def drain(self):
+        """Envía lo encolado y espera a que la cola quede vacía."""
+        self.flush_digests()
+        await self._queue.join()
+
+    async def stop(self, timeout: float | None = None):
+        """Intenta entregar lo pendiente durante `timeout` segundos y detiene los senders."""
+        try:
+            await asyncio.wait_for(self.drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Notificador detenido con {self._queue.qsize()} mensaje(s) sin enviar.")
+        finally:
+            for sender in self._senders:
+                sender.cancel()
+            await asyncio.gather(*self._senders, return_exceptions=True)
+            self._senders = []
+
+    async def _sender(self, sender_id: int):
+        while True:
+            notification = await self._queue.get()
+            try:
+                await self._deliver(notification)
+            except Exception as e:
+                logger.error(f"[Notifier] Sender {sender_id}: error inesperado enviando a {notification.chat_id}: {e}", exc_info=True)
+                metrics.NOTIFICATION_FAILURES.labels("unexpected").inc()
+                self._finish(notification)
+            finally:
+                self._queue.task_done()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= _MAX_IDLE_CHAT_BUCKETS:
+                now = asyncio.get_running_loop().time()
+                self._chat_buckets = {cid: b for cid, b in self._chat_buckets.items() if not b.is_full(now)}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, capacity=1)
+        return bucket
+
+    async def _wait_pause(self):
+        loop = asyncio.get_running_loop()
+        while (delay := self._paused_until - loop.time()) > 0:
+            await asyncio.sleep(delay)
+
+    async def _deliver(self, notification: OutgoingNotification):
+        await self._chat_bucket(notification.chat_id).acquire()
+        await self._wait_pause()
+        await self._global_bucket.acquire()
+        started_at = time.perf_counter()
+        try:
+            if notification.photo:
+                await bot_media.send_photo_cached(
+                    self.bot,
+                    notification.chat_id,
+                    notification.photo,
+                    caption=notification.text,
+                    parse_mode=ParseMode.MARKDOWN,
+                    reply_markup=notification.reply_markup
+                )
+            else:
+                await self.bot.send_message(
+                    chat_id=notification.chat_id,
+                    text=notification.text,
+                    parse_mode=ParseMode.MARKDOWN,
+                    reply_markup=notification.reply_markup
+                )
+        except RetryAfter as e:
+            metrics.NOTIFICATION_FAILURES.labels("retry_after").inc()
+            retry_after = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else float(e.retry_after)
+            # El flood control de Telegram afecta a todo el bot: se pausan todos los senders.
+            loop = asyncio.get_running_loop()
+            self._paused_until = max(self._paused_until, loop.time() + retry_after)
+            logger.warning(f"[Notifier] RetryAfter de Telegram: pausa de {retry_after:.0f}s (chat {notification.chat_id}).")
+            self._retry(notification)
+            return
+        except (Forbidden, BadRequest) as e:
+            metrics.NOTIFICATION_FAILURES.labels("rejected").inc()
+            logger.error(f"Error Telegram al enviar notificación a {notification.chat_id} (alertas {notification.alert_ids}): {e}")
+            if "bot was blocked by the user" in str(e).lower() or "chat not found" in str(e).lower():
+                logger.warning(f"Bot bloqueado o chat no encontrado para {notification.chat_id}. Considerar eliminar/desactivar alertas.")
+            self._finish(notification)
+            return
+        except TelegramError as e:
+            metrics.NOTIFICATION_FAILURES.labels("telegram_error").inc()
+            logger.warning(f"[Notifier] Error Telegram transitorio enviando a {notification.chat_id}: {e}")
+            self._retry(notification)
+            return
+        finally:
+            metrics.NOTIFICATION_SEND_DURATION.observe(time.perf_counter() - started_at)
+
+        metrics.NOTIFICATIONS_SENT.inc()
+        logger.info(f"Notificación enviada a chat_id {notification.chat_id} por alerta(s) {notification.alert_ids}.")
+        # Las alertas siguen marcadas como pendientes hasta que last_notified está guardado: si no,
+        # un enqueue en ese intervalo pasaría la deduplicación y el cooldown y se enviaría dos veces.
+        try:
+            if self.on_sent is not None:
+                await self.on_sent(notification.alert_ids)
+        except Exception as e:
+            logger.error(f"[Notifier] Error registrando el envío de alertas {notification.alert_ids}: {e}", exc_info=True)
+        finally:
+            self._finish(notification)
+
+    def _retry(self, notification: OutgoingNotification):
+        notification.attempts += 1
+        if notification.attempts > self.max_retries:
+            logger.error(f"[Notifier] Notificación a {notification.chat_id} descartada tras {notification.attempts} intentos.")
+            metrics.NOTIFICATION_FAILURES.labels("dropped").inc()
+            self._finish(notification)
+            return
+        self._queue.put_nowait(notification)
+
+    def _finish(self, notification: OutgoingNotification):
+        self._pending_alert_ids.difference_update(notification.alert_ids)
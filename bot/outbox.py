@@ -0,0 +1,177 @@
+# bot/outbox.py
+"""Entrega de notificaciones a través de la tabla notification_outbox (NOTIFICATION_DELIVERY=outbox).
+
+El checker (OutboxPublisher) guarda cada alerta disparada en la tabla y Postgres emite
+NOTIFY alert_triggered. El notificador (OutboxNotifier), que corre en el proceso del bot o
+aparte con `python -m bot.outbox`, escucha ese canal, reclama lo pendiente y lo envía con
+NotificationDispatcher. Así el checker no necesita hablar con Telegram y cada parte se
+puede escalar o reiniciar por separado: lo que no llegue a enviarse sigue en la tabla.
+"""
+import asyncio
+import dataclasses
+import json
+import logging
+
+import psycopg
+from telegram import Bot
+
+import config
+from db import async_queries as db_queries
+from db.models import Alert
+from scraper.models import ProductInfo
+from .notifier import NotificationDispatcher
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "alert_triggered"
+
+# Campos que necesita bot.ui para formatear el mensaje; las fechas no viajan en el payload.
+_ALERT_PAYLOAD_FIELDS = ("id", "chat_id", "full_url", "clean_url", "target_price", "last_price")
+
+
+def encode_payload(alert: Alert, product_info: ProductInfo) -> str:
+    product = dataclasses.asdict(product_info)
+    product.pop("scraped_at", None)
+    return json.dumps({"alert": {name: getattr(alert, name) for name in _ALERT_PAYLOAD_FIELDS}, "product": product})
+
+
+def decode_payload(payload: dict) -> tuple[Alert, ProductInfo]:
+    return Alert(**payload["alert"]), ProductInfo(**payload["product"])
+
+
+class OutboxPublisher:
+    """Sustituto de NotificationDispatcher para el checker: lo encolado en el ciclo se escribe
+    en notification_outbox en una sola sentencia al llamar a `flush`."""
+
+    def __init__(self):
+        self._pending: dict[str, tuple[int, str]] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def start(self):
+        pass
+
+    def enqueue(self, alert: Alert, product_info: ProductInfo) -> bool:
+        alert_id = str(alert.id)
+        if alert_id in self._pending:
+            return False
+        self._pending[alert_id] = (alert.chat_id, encode_payload(alert, product_info))
+        return True
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            inserted = await db_queries.enqueue_outbox_notifications(
+                [(alert_id, chat_id, payload) for alert_id, (chat_id, payload) in pending.items()]
+            )
+            logger.info(f"[Outbox] {inserted} notificación(es) publicadas ({len(pending) - inserted} ya pendientes).")
+        except Exception as e:
+            logger.error(f"[Outbox] Error publicando {len(pending)} notificación(es): {e}", exc_info=True)
+            # Se reintenta en el próximo flush; lo añadido mientras tanto prevalece.
+            self._pending = {**pending, **self._pending}
+
+    async def stop(self, timeout: float | None = None):
+        await self.flush()
+
+
+class OutboxNotifier:
+    """Escucha NOTIFY alert_triggered y envía lo pendiente en notification_outbox.
+
+    Cada lote reclamado se borra cuando el dispatcher ha terminado con él (entregado o
+    descartado tras sus reintentos). Mientras se envía, el lease se prorroga cada tercio de
+    OUTBOX_LEASE_SECONDS: un RetryAfter largo de Telegram no hace que otro notificador lo
+    reenvíe. Si el proceso muere, el lease caduca y otro notificador lo recoge. Sin NOTIFY,
+    la tabla se relee cada OUTBOX_POLL_SECONDS.
+    """
+
+    def __init__(self, bot: Bot, dispatcher: NotificationDispatcher):
+        self.bot = bot
+        self.dispatcher = dispatcher
+
+    async def drain_once(self) -> int:
+        """Reclama y envía un lote. Devuelve el número de notificaciones reclamadas."""
+        rows = await db_queries.claim_outbox_notifications(config.OUTBOX_BATCH_SIZE, config.OUTBOX_LEASE_SECONDS)
+        if not rows:
+            return 0
+        for row in rows:
+            try:
+                alert, product_info = decode_payload(row["payload"])
+            except (KeyError, TypeError) as e:
+                logger.error(f"[Outbox] Payload inválido en la notificación {row['id']}: {e}")
+                continue
+            self.dispatcher.enqueue(alert, product_info)
+        ids = [row["id"] for row in rows]
+        renewer = asyncio.create_task(self._renew_claims_periodically(ids))
+        try:
+            await self.dispatcher.drain()
+        finally:
+            renewer.cancel()
+            await asyncio.gather(renewer, return_exceptions=True)
+        await db_queries.delete_outbox_notifications(ids)
+        return len(rows)
+
+    async def _renew_claims_periodically(self, ids: list[int]):
+        while True:
+            await asyncio.sleep(config.OUTBOX_LEASE_SECONDS / 3)
+            try:
+                await db_queries.renew_outbox_claims(ids, config.OUTBOX_LEASE_SECONDS)
+            except Exception as e:
+                logger.error(f"[Outbox] Error prorrogando la reserva de {len(ids)} notificación(es): {e}", exc_info=True)
+
+    async def _drain(self):
+        try:
+            while await self.drain_once():
+                pass
+        except Exception as e:
+            logger.error(f"[Outbox] Error enviando notificaciones pendientes: {e}", exc_info=True)
+
+    async def run_forever(self):
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(config.DATABASE_URL, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    logger.info(f"[Outbox] Escuchando el canal {CHANNEL}.")
+                    while True:
+                        # Primero lo que ya hubiera (también tras reconectar) y luego se espera aviso.
+                        await self._drain()
+                        async for _ in conn.notifies(timeout=config.OUTBOX_POLL_SECONDS, stop_after=1):
+                            pass
+            except psycopg.OperationalError as e:
+                logger.error(f"[Outbox] Conexión LISTEN perdida: {e}. Reintentando en 5s.")
+                await asyncio.sleep(5)
+
+
+async def run_outbox_notifier(bot: Bot, on_sent=None):
+    """Notificador de larga duración con su propio dispatcher (para una tarea del bot o un proceso aparte)."""
+    dispatcher = NotificationDispatcher(bot, on_sent=on_sent or db_queries.update_alerts_last_notified_bulk)
+    dispatcher.start()
+    try:
+        await OutboxNotifier(bot, dispatcher).run_forever()
+    finally:
+        await dispatcher.stop(timeout=config.NOTIFY_SHUTDOWN_TIMEOUT_SECONDS)
+
+
+async def _main():
+    from db import async_connection as db_async_connection
+
+    await db_async_connection.open_async_pool()
+    try:
+        async with Bot(config.TELEGRAM_TOKEN) as bot:
+            await run_outbox_notifier(bot)
+    finally:
+        await db_async_connection.close_async_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - [%(module)s:%(lineno)d] - %(message)s',
+        level=config.LOGGING_LEVEL
+    )
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        logger.info("Notificador detenido (Ctrl+C).")
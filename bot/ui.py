@@ -2,16 +2,24 @@
 import logging
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
+from db.models import Alert
+from scraper.models import ProductInfo
+
 logger = logging.getLogger(__name__)
 
-def format_product_info_message(product_info: dict, target_price: float | None = None, for_notification: bool = False) -> tuple[str, InlineKeyboardMarkup | None]:
-    """Formatea un mensaje con la información del producto y botones opcionales para notificaciones."""
+def format_product_info_message(product_info: ProductInfo | dict, target_price: float | None = None, for_notification: bool = False,
+                                alert_id: str | None = None, full_url: str | None = None) -> tuple[str, InlineKeyboardMarkup | None]:
+    """Formatea un mensaje con la información del producto y botones opcionales para notificaciones.
+
+    `product_info` puede ser un ProductInfo o un dict. `full_url` sustituye a la del producto
+    (cada alerta enlaza a su propia URL) y `alert_id` activa el botón de borrado.
+    """
     msg_parts = []
     keyboard_buttons = []
     
     image_url = product_info.get("image") # Guardar para posible envío de foto separado
 
-    name = product_info.get("name", "Producto Desconocido")
+    name = product_info.get("name")
     if name and name != "N/A (cache)":
         msg_parts.append(f"🏷️ *{name}*")
     
@@ -38,13 +46,15 @@ def format_product_info_message(product_info: dict, target_price: float | None =
     if condition_value and condition_value != "N/A (cache)":
         msg_parts.append(f"✨ Condición: {condition_value}")
     
-    full_url = product_info.get("full_url", "")
+    if product_info.get("status") == "CACHE_STALE":
+        msg_parts.append("🕒 Precio guardado hace un rato; se está actualizando en segundo plano.")
+
+    full_url = full_url or product_info.get("full_url") or ""
     if full_url:
          msg_parts.append(f"\n🔗 [{name if name and name != 'N/A (cache)' else 'Ver en la web'}]({full_url})")
 
     # Botones para notificaciones
     if for_notification and full_url:
-        alert_id = product_info.get("alert_id_for_button") # Necesitaremos pasar el alert_id aquí
         if alert_id:
             keyboard_buttons.append(InlineKeyboardButton("🛒 Ver Oferta", url=full_url))
             keyboard_buttons.append(InlineKeyboardButton("🗑️ Eliminar Alerta", callback_data=f"delete_alert_{alert_id}"))
@@ -53,7 +63,10 @@ def format_product_info_message(product_info: dict, target_price: float | None =
     return "\n".join(msg_parts), reply_markup
 
 
-def format_alert_list_message(alerts: list[dict]) -> tuple[str, InlineKeyboardMarkup | None]:
+def format_alert_list_message(alerts: list[dict], start_index: int = 0, prev_callback: str | None = None,
+                              next_callback: str | None = None) -> tuple[str, InlineKeyboardMarkup | None]:
+    """Una página del listado de alertas. `start_index` es la posición de la primera alerta
+    en el listado completo; los callbacks opcionales añaden los botones de navegación."""
     if not alerts:
         return "📭 No tienes alertas activas.", None
 
@@ -64,13 +77,13 @@ def format_alert_list_message(alerts: list[dict]) -> tuple[str, InlineKeyboardMa
         full_url = alert_data.get('full_url', '')
         alert_id_str = str(alert_data['id'])
 
-        item_number = i + 1 # Número del ítem en la lista
+        item_number = start_index + i + 1 # Número del ítem en el listado completo (el que usa /delete)
         
         link_text = full_url
         if len(link_text) > 40:
             link_text = link_text[:37] + "..."
         
-        line = f"\n{i+1}. "
+        line = f"\n{item_number}. "
         if full_url:
             line += f"[{link_text if link_text else 'Producto'}]({full_url})"
         else:
@@ -89,17 +102,25 @@ def format_alert_list_message(alerts: list[dict]) -> tuple[str, InlineKeyboardMa
             InlineKeyboardButton(f"🗑️ Eliminar {item_number}", callback_data=f"delete_alert_{alert_id_str}")
         ]
         keyboard_layout.append(buttons_for_alert)
+
+    navigation_buttons = []
+    if prev_callback:
+        navigation_buttons.append(InlineKeyboardButton("⬅️ Anteriores", callback_data=prev_callback))
+    if next_callback:
+        navigation_buttons.append(InlineKeyboardButton("Siguientes ➡️", callback_data=next_callback))
+    if navigation_buttons:
+        keyboard_layout.append(navigation_buttons)
     
     reply_markup = InlineKeyboardMarkup(keyboard_layout) if keyboard_layout else None
     return "\n".join(main_text_parts), reply_markup
 
-# Esta función ahora devuelve texto y teclado, y asume que product_info tiene 'alert_id_for_button'
-def format_notification_content(alert_data: dict, product_info: dict) -> tuple[str, InlineKeyboardMarkup | None, str | None]:
-    """Prepara el contenido para una notificación: texto, teclado y URL de imagen."""
-    product_info_for_msg = product_info.copy()
-    product_info_for_msg["alert_id_for_button"] = str(alert_data.get("id")) # Añadir alert_id para los botones
+def format_notification_content(alert_data: Alert | dict, product_info: ProductInfo | dict) -> tuple[str, InlineKeyboardMarkup | None, str | None]:
+    """Prepara el contenido para una notificación: texto, teclado y URL de imagen.
 
-    price_info_text = f"{product_info.get('price','Precio Desconocido')}€"
+    El producto se comparte entre todas sus alertas; la URL y el ID salen de `alert_data`.
+    """
+    current_price = product_info.get('price')
+    price_info_text = f"{current_price if current_price is not None else 'Precio Desconocido'}€"
     previous_last_price = alert_data.get('last_price')
 
     if previous_last_price is not None and product_info.get('price') is not None and product_info['price'] < previous_last_price:
@@ -112,9 +133,11 @@ def format_notification_content(alert_data: dict, product_info: dict) -> tuple[s
     # Formatear el cuerpo del mensaje usando la función existente
     # Pasamos for_notification=True para que genere los botones "Ver Oferta" y "Eliminar"
     message_body_text, inline_keyboard = format_product_info_message(
-        product_info_for_msg, 
-        target_price=alert_data['target_price'], 
-        for_notification=True
+        product_info,
+        target_price=alert_data['target_price'],
+        for_notification=True,
+        alert_id=str(alert_data['id']),
+        full_url=alert_data.get('full_url')
     )
     
     full_message_text = f"{title}\n{message_body_text}"
@@ -126,6 +149,36 @@ def format_notification_content(alert_data: dict, product_info: dict) -> tuple[s
     return full_message_text, inline_keyboard, image_url_to_send
 
 
+def format_digest_content(items: list[tuple[Alert | dict, ProductInfo | dict]]) -> tuple[str, InlineKeyboardMarkup | None]:
+    """Agrupa en un solo mensaje varias alertas del mismo chat: texto y teclado con un botón de borrado por alerta."""
+    main_text_parts = [f"📉 ¡{len(items)} alertas han alcanzado tu precio objetivo!"]
+    keyboard_layout = []
+
+    for i, (alert_data, product_info) in enumerate(items):
+        item_number = i + 1
+        name = product_info.get("name")
+        if not name or name == "N/A (cache)":
+            name = "Ver en la web"
+        full_url = alert_data.get("full_url") or product_info.get("full_url") or ""
+
+        current_price = product_info.get('price')
+        price_info_text = f"{current_price if current_price is not None else 'Precio Desconocido'}€"
+        previous_last_price = alert_data.get('last_price')
+        if previous_last_price is not None and product_info.get('price') is not None and product_info['price'] < previous_last_price:
+            price_info_text = f"de {previous_last_price}€ a {product_info['price']}€"
+
+        line = f"\n{item_number}. [{name}]({full_url})" if full_url else f"\n{item_number}. {name}"
+        line += f"\n    💲 {price_info_text} (🎯 ≤{alert_data['target_price']}€)"
+        main_text_parts.append(line)
+
+        keyboard_layout.append([
+            InlineKeyboardButton(f"🗑️ Eliminar {item_number}", callback_data=f"delete_alert_{alert_data['id']}")
+        ])
+
+    reply_markup = InlineKeyboardMarkup(keyboard_layout) if keyboard_layout else None
+    return "\n".join(main_text_parts), reply_markup
+
+
 HELP_MESSAGE_MARKDOWN = (
     "🤖 *Comandos disponibles:*\n\n"
     "/track `<URL>` `<precio_objetivo>` – Añade o actualiza una alerta.\n"
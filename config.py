@@ -11,11 +11,65 @@ SCRAPERAPI_KEY = os.getenv("SCRAPERAPI_KEY")
 
 CHECK_INTERVAL_SECONDS = int(os.getenv("CHECK_INTERVAL_SECONDS", 14400))
 NOTIFY_COOLDOWN_HOURS = float(os.getenv("NOTIFY_COOLDOWN_HOURS", 4))
+ALERTS_PAGE_SIZE = int(os.getenv("ALERTS_PAGE_SIZE", 10)) # alertas por página en /alerts
+NOTIFY_GLOBAL_RATE_PER_SECOND = float(os.getenv("NOTIFY_GLOBAL_RATE_PER_SECOND", 25)) # Telegram: ~30 msg/s por bot
+NOTIFY_PER_CHAT_RATE_PER_SECOND = float(os.getenv("NOTIFY_PER_CHAT_RATE_PER_SECOND", 1)) # Telegram: ~1 msg/s por chat
+NOTIFY_SENDERS = int(os.getenv("NOTIFY_SENDERS", 4))
+NOTIFY_MAX_RETRIES = int(os.getenv("NOTIFY_MAX_RETRIES", 3))
+NOTIFY_DIGEST_MAX_ITEMS = int(os.getenv("NOTIFY_DIGEST_MAX_ITEMS", 10))
+NOTIFY_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("NOTIFY_SHUTDOWN_TIMEOUT_SECONDS", 10))
+# direct: el checker envía a Telegram. outbox: el checker escribe en notification_outbox y un notificador
+# (el proceso del bot o python -m bot.outbox) las envía al recibir NOTIFY alert_triggered.
+NOTIFICATION_DELIVERY = os.getenv("NOTIFICATION_DELIVERY", "direct").lower()
+RUN_NOTIFIER_IN_BOT = os.getenv("RUN_NOTIFIER_IN_BOT", "true").lower() in ("1", "true", "yes")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", 120))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", 30)) # relectura aunque no llegue ningún NOTIFY
 SCRAPE_TTL_MINUTES = float(os.getenv("SCRAPE_TTL_MINUTES", 240))
+# Stale-while-revalidate: entre SCRAPE_TTL_MINUTES y SCRAPE_HARD_TTL_MINUTES se sirve el dato en caché
+# (estado CACHE_STALE) y se refresca en segundo plano. Igualarlos desactiva el modo.
+SCRAPE_HARD_TTL_MINUTES = max(SCRAPE_TTL_MINUTES, float(os.getenv("SCRAPE_HARD_TTL_MINUTES", SCRAPE_TTL_MINUTES * 3)))
+SCRAPE_MEMORY_CACHE_MAX_ENTRIES = int(os.getenv("SCRAPE_MEMORY_CACHE_MAX_ENTRIES", 5000))
 MAX_RETRIES_SCRAPER = int(os.getenv("MAX_RETRIES_SCRAPER", 2))
 RETRY_DELAY_SCRAPER_SECONDS = int(os.getenv("RETRY_DELAY_SCRAPER_SECONDS", 5))
 API_TIMEOUT_SECONDS = int(os.getenv("API_TIMEOUT_SECONDS", 20))
 SCRAPER_MAX_COST = os.getenv("SCRAPER_MAX_COST", '1')
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 20))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 10))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", 30))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes")
+CHECKER_CONCURRENCY = int(os.getenv("CHECKER_CONCURRENCY", 5))
+# Todos los productos están en el mismo host, así que estos límites marcan el ritmo real del checker.
+# Por defecto acompañan a CHECKER_CONCURRENCY y sin separación mínima, para que el ciclo escale con
+# la concurrencia; con SCRAPER_PER_HOST_DELAY_SECONDS=d el máximo es 1/d peticiones por segundo
+# sea cual sea CHECKER_CONCURRENCY (más educado con el host, pero el ciclo tarda ~d s por producto).
+SCRAPER_PER_HOST_CONCURRENCY = int(os.getenv("SCRAPER_PER_HOST_CONCURRENCY", CHECKER_CONCURRENCY))
+SCRAPER_PER_HOST_DELAY_SECONDS = float(os.getenv("SCRAPER_PER_HOST_DELAY_SECONDS", 0))
+SCHEDULE_MIN_INTERVAL_SECONDS = int(os.getenv("SCHEDULE_MIN_INTERVAL_SECONDS", 1800))
+SCHEDULE_MAX_INTERVAL_SECONDS = int(os.getenv("SCHEDULE_MAX_INTERVAL_SECONDS", 86400))
+CHECKER_MAX_SLEEP_SECONDS = int(os.getenv("CHECKER_MAX_SLEEP_SECONDS", 300))
+# Modo multi-worker (python -m tasks.worker): cada worker reclama lotes de productos con un lease.
+RUN_CHECKER_IN_BOT = os.getenv("RUN_CHECKER_IN_BOT", "true").lower() in ("1", "true", "yes") # false si hay workers aparte
+CHECKER_WORKER_ID = os.getenv("CHECKER_WORKER_ID") # por defecto host:pid
+CHECKER_CLAIM_BATCH_SIZE = int(os.getenv("CHECKER_CLAIM_BATCH_SIZE", 50))
+CHECKER_LEASE_SECONDS = int(os.getenv("CHECKER_LEASE_SECONDS", 600))
+PRICE_HISTORY_RAW_RETENTION_DAYS = int(os.getenv("PRICE_HISTORY_RAW_RETENTION_DAYS", 90))
+CHECKER_PREFETCH_BATCH_SIZE = int(os.getenv("CHECKER_PREFETCH_BATCH_SIZE", 200))
+CHECKER_WRITE_BATCH_SIZE = int(os.getenv("CHECKER_WRITE_BATCH_SIZE", 500))
+CHECKER_WRITE_FLUSH_SECONDS = float(os.getenv("CHECKER_WRITE_FLUSH_SECONDS", 5))
+# Productos con al menos tantos suscriptores se evalúan en SQL (apply_observed_price, un viaje por producto);
+# el resto, en Python con las escrituras de last_price agrupadas en el buffer. 0 lo desactiva.
+CHECKER_SQL_TRIGGER_MIN_SUBSCRIBERS = int(os.getenv("CHECKER_SQL_TRIGGER_MIN_SUBSCRIBERS", 20))
+PARSE_EXECUTOR = os.getenv("PARSE_EXECUTOR", "thread").lower() # none | thread | process
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", os.cpu_count() or 2))
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", 30))
+DB_POOL_HEALTHCHECK_IDLE_SECONDS = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE_SECONDS", 60))
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0)) # 0 = sin endpoint /metrics
+METRICS_ADDR = os.getenv("METRICS_ADDR", "0.0.0.0")
 
 LOGGING_LEVEL_NAME = os.getenv("LOGGING_LEVEL", "INFO").upper()
 LOGGING_HTTPX_LEVEL_NAME = os.getenv("LOGGING_HTTPX_LEVEL", "WARNING").upper()
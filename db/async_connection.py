@@ -0,0 +1,83 @@
+# db/async_connection.py
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from psycopg.rows import dict_row
+from psycopg.types.string import TextLoader
+from psycopg_pool import AsyncConnectionPool
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_pool: AsyncConnectionPool | None = None
+_open_lock = asyncio.Lock()
+
+
+async def _configure_connection(conn):
+    # Mismas formas de fila que con psycopg2: los UUID se devuelven como texto.
+    conn.adapters.register_loader("uuid", TextLoader)
+
+
+def get_async_pool() -> AsyncConnectionPool:
+    """Devuelve el pool asíncrono (sin abrir) compartido por todo el proceso."""
+    global _pool
+    if _pool is None:
+        _pool = AsyncConnectionPool(
+            config.DATABASE_URL,
+            min_size=config.DB_POOL_MIN_SIZE,
+            max_size=config.DB_POOL_MAX_SIZE,
+            timeout=config.DB_POOL_TIMEOUT_SECONDS,
+            kwargs={"autocommit": True, "row_factory": dict_row},
+            configure=_configure_connection,
+            check=AsyncConnectionPool.check_connection,
+            open=False,
+        )
+    return _pool
+
+
+async def open_async_pool():
+    """Abre el pool y espera a tener las conexiones mínimas. Lanza excepción si la BD no responde."""
+    async with _open_lock:
+        pool = get_async_pool()
+        await pool.open(wait=True, timeout=config.DB_POOL_TIMEOUT_SECONDS)
+    logger.info(f"Pool asíncrono de conexiones abierto (min={config.DB_POOL_MIN_SIZE}, max={config.DB_POOL_MAX_SIZE}).")
+
+
+@asynccontextmanager
+async def get_async_db_connection():
+    """Presta una conexión del pool asíncrono, abriéndolo si hace falta."""
+    pool = get_async_pool()
+    if pool.closed:
+        async with _open_lock:
+            if pool.closed:
+                await pool.open()
+    async with pool.connection() as conn:
+        yield conn
+
+
+@asynccontextmanager
+async def try_advisory_lock(key: int):
+    """Intenta tomar el advisory lock de sesión `key` sin esperar y cede si se obtuvo.
+
+    Retiene una conexión del pool mientras dura el bloque y suelta el lock al salir; si la
+    conexión se pierde antes, Postgres lo libera al cerrar la sesión.
+    """
+    async with get_async_db_connection() as conn:
+        cur = await conn.execute("SELECT pg_try_advisory_lock(%s) AS locked", (key,))
+        locked = (await cur.fetchone())['locked']
+        try:
+            yield locked
+        finally:
+            if locked:
+                await conn.execute("SELECT pg_advisory_unlock(%s)", (key,))
+
+
+async def close_async_pool():
+    """Cierra el pool asíncrono si está abierto."""
+    global _pool
+    if _pool is not None and not _pool.closed:
+        await _pool.close()
+        logger.info("Pool asíncrono de conexiones cerrado.")
+    _pool = None
@@ -0,0 +1,828 @@
+# db/async_queries.py
+# Capa de consultas de la aplicación, sobre psycopg 3 y un pool asíncrono, para usarse con
+# await sin pasar por hilos. Las funciones que también existen en db/queries.py (API síncrona
+# original) devuelven lo mismo.
+import logging
+import re
+import sys
+from collections.abc import AsyncIterator
+from datetime import date, datetime, timedelta
+from .async_connection import get_async_db_connection
+from .models import Alert
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+def _alert_row(cursor):
+    """row_factory posicional: Alert(*valores) por fila, sin el dict de nombres de columna que
+    construye class_row. Las consultas deben devolver las columnas en el orden de los campos de Alert."""
+    return lambda values: Alert(*values)
+
+# --- Scraped Prices Queries ---
+
+async def get_cached_price(clean_url: str, max_age_minutes: float | None = None) -> dict | None:
+    """Fila de scraped_prices más reciente que `max_age_minutes` (por defecto SCRAPE_TTL_MINUTES)."""
+    if max_age_minutes is None:
+        max_age_minutes = config.SCRAPE_TTL_MINUTES
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            SELECT price, product_condition, scraped_at,
+                   product_name, description, image_url,
+                   color, storage, brand_name
+            FROM scraped_prices
+            WHERE clean_url = %s
+        """, (clean_url,))
+        row = await cur.fetchone()
+    if row and datetime.utcnow() - row['scraped_at'] < timedelta(minutes=max_age_minutes):
+        logger.info(f"Usando datos completos de caché para {clean_url}")
+        return dict(row)
+    return None
+
+async def get_cached_prices(clean_urls: list[str]) -> dict[str, dict]:
+    """Devuelve {clean_url: fila} para las URLs con caché vigente, en una sola consulta.
+
+    Las filas tienen la misma forma que las de get_cached_price; el TTL se filtra en SQL.
+    """
+    if not clean_urls:
+        return {}
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            SELECT clean_url, price, product_condition, scraped_at,
+                   product_name, description, image_url,
+                   color, storage, brand_name
+            FROM scraped_prices
+            WHERE clean_url = ANY(%s)
+              AND scraped_at > now() - %s * interval '1 minute'
+        """, (list(clean_urls), config.SCRAPE_TTL_MINUTES))
+        rows = await cur.fetchall()
+    cached = {}
+    for row in rows:
+        row = dict(row)
+        cached[row.pop('clean_url')] = row
+    logger.info(f"Caché precargada: {len(cached)}/{len(clean_urls)} URL(s) vigentes.")
+    return cached
+
+async def save_scraped_price(clean_url: str, product_details: dict, validators: dict | None = None):
+    """Guarda o actualiza todos los detalles scrapeados del producto.
+
+    `validators` admite 'etag', 'last_modified' y 'content_hash' para la próxima petición condicional.
+    """
+    validators = validators or {}
+    params_for_query = {
+        'clean_url': clean_url,
+        'price': product_details.get('price'),
+        'product_condition': product_details.get('condition'), # _parse_product_details devuelve 'condition'
+        'name': product_details.get('name'),
+        'description': product_details.get('description'),
+        'image_url': product_details.get('image'), # La columna es image_url, el detalle es 'image'
+        'color': product_details.get('color'),
+        'storage': product_details.get('storage'),
+        'brand_name': product_details.get('brand_name'),
+        'etag': validators.get('etag'),
+        'last_modified': validators.get('last_modified'),
+        'content_hash': validators.get('content_hash')
+    }
+
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        sql = """
+            INSERT INTO scraped_prices (
+                clean_url, price, product_condition, scraped_at,
+                product_name, description, image_url, color, storage, brand_name,
+                etag, last_modified, content_hash
+            )
+            VALUES (
+                %(clean_url)s, %(price)s, %(product_condition)s, now(),
+                %(name)s, %(description)s, %(image_url)s, %(color)s, %(storage)s, %(brand_name)s,
+                %(etag)s, %(last_modified)s, %(content_hash)s
+            )
+            ON CONFLICT (clean_url) DO UPDATE SET
+                price = EXCLUDED.price,
+                product_condition = EXCLUDED.product_condition,
+                scraped_at = EXCLUDED.scraped_at,
+                product_name = EXCLUDED.product_name,
+                description = EXCLUDED.description,
+                image_url = EXCLUDED.image_url,
+                color = EXCLUDED.color,
+                storage = EXCLUDED.storage,
+                brand_name = EXCLUDED.brand_name,
+                etag = EXCLUDED.etag,
+                last_modified = EXCLUDED.last_modified,
+                content_hash = EXCLUDED.content_hash
+        """
+        await cur.execute(sql, params_for_query)
+    logger.info(f"Datos completos del producto guardados/actualizados para {clean_url}")
+
+
+async def get_last_scraped_price(clean_url: str) -> dict | None:
+    """Última fila de scraped_prices sin límite de antigüedad, con sus validadores HTTP y el hash del JSON-LD."""
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            SELECT price, product_condition, scraped_at,
+                   product_name, description, image_url,
+                   color, storage, brand_name,
+                   etag, last_modified, content_hash
+            FROM scraped_prices
+            WHERE clean_url = %s
+        """, (clean_url,))
+        return await cur.fetchone()
+
+async def touch_scraped_price(clean_url: str, etag: str | None = None, last_modified: str | None = None) -> bool:
+    """Marca como recién scrapeada una página sin cambios, sin reescribir sus datos."""
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            UPDATE scraped_prices
+            SET scraped_at = now(),
+                etag = COALESCE(%s, etag),
+                last_modified = COALESCE(%s, last_modified)
+            WHERE clean_url = %s
+        """, (etag, last_modified, clean_url))
+        return cur.rowcount > 0
+
+async def cleanup_old_scraped_prices():
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        # El intervalo para limpieza podría ir a config.py
+        await cur.execute("DELETE FROM scraped_prices WHERE scraped_at < now() - interval '2 days'")
+        deleted_count = cur.rowcount
+    if deleted_count > 0:
+        logger.info(f"Limpieza de caché: {deleted_count} registros eliminados.")
+    return deleted_count
+
+# --- Alerts Queries ---
+
+async def get_alert_by_chat_and_clean_url(chat_id: int, clean_url: str) -> dict | None:
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("SELECT * FROM alerts WHERE chat_id=%s AND clean_url=%s", (chat_id, clean_url))
+        return await cur.fetchone()
+
+async def get_alert_by_id(alert_id: str) -> dict | None:
+    """Obtiene una alerta específica por su ID (UUID como string)."""
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("SELECT * FROM alerts WHERE id::text = %s", (alert_id,))
+        return await cur.fetchone()
+
+async def update_alert_target_price(alert_id: str, target_price: float, full_url: str):
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute(
+            "UPDATE alerts SET target_price=%s, inserted_at=now(), full_url=%s WHERE id::text=%s",
+            (target_price, full_url, alert_id)
+        )
+    logger.info(f"Alerta {alert_id} actualizada. Nuevo objetivo: {target_price}€")
+
+async def create_alert(chat_id: int, full_url: str, clean_url: str, target_price: float, product_name: str | None = None):
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        # Podríamos considerar añadir product_name a la tabla alerts si queremos mostrarlo en /alerts sin joins
+        # El producto entra en tracked_products al momento: los workers solo reclaman productos planificados.
+        await cur.execute("""
+            WITH new_alert AS (
+                INSERT INTO alerts (chat_id, full_url, clean_url, target_price)
+                VALUES (%s, %s, %s, %s) RETURNING id, clean_url
+            ), tracked AS (
+                INSERT INTO tracked_products (clean_url)
+                SELECT clean_url FROM new_alert
+                ON CONFLICT (clean_url) DO NOTHING
+            )
+            SELECT id FROM new_alert
+        """, (chat_id, full_url, clean_url, target_price))
+        new_alert_id = (await cur.fetchone())['id']
+    logger.info(f"Nueva alerta ID {new_alert_id} creada para chat_id {chat_id}, URL: {clean_url}, Objetivo: {target_price}€")
+    return new_alert_id
+
+
+async def get_user_alerts(chat_id: int) -> list[dict]:
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("SELECT * FROM alerts WHERE chat_id=%s ORDER BY inserted_at DESC, id DESC", (chat_id,))
+        return await cur.fetchall()
+
+async def get_user_alerts_page(chat_id: int, page_size: int, after: tuple[datetime, str] | None = None,
+                         before: tuple[datetime, str] | None = None) -> tuple[list[dict], bool]:
+    """Una página de alertas del chat, de la más reciente a la más antigua (paginación por clave).
+
+    `after`/`before` son el cursor (inserted_at, id) de la última/primera fila de la página
+    actual para pedir la siguiente/anterior. Devuelve las filas y si hay más en esa dirección.
+    """
+    if before is not None:
+        cursor_clause, order, cursor = "AND (inserted_at, id) > (%s, %s::uuid)", "ASC", before
+    elif after is not None:
+        cursor_clause, order, cursor = "AND (inserted_at, id) < (%s, %s::uuid)", "DESC", after
+    else:
+        cursor_clause, order, cursor = "", "DESC", ()
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute(f"""
+            SELECT id, full_url, target_price, last_price, inserted_at
+            FROM alerts
+            WHERE chat_id = %s {cursor_clause}
+            ORDER BY inserted_at {order}, id {order}
+            LIMIT %s
+        """, (chat_id, *cursor, page_size + 1))
+        rows = await cur.fetchall()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if before is not None:
+        rows.reverse()
+    return rows, has_more
+
+async def get_user_alert_id_at(chat_id: int, position: int) -> str | None:
+    """ID de la alerta que ocupa la posición `position` (desde 1) en el listado de /alerts."""
+    if position < 1:
+        return None
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            SELECT id FROM alerts
+            WHERE chat_id = %s
+            ORDER BY inserted_at DESC, id DESC
+            OFFSET %s LIMIT 1
+        """, (chat_id, position - 1))
+        row = await cur.fetchone()
+    return str(row['id']) if row else None
+
+async def delete_alert_by_id(alert_id: str, chat_id: int) -> bool:
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("DELETE FROM alerts WHERE id::text=%s AND chat_id=%s RETURNING id", (alert_id, chat_id))
+        deleted_row = await cur.fetchone()
+    if deleted_row:
+        logger.info(f"Alerta {alert_id} eliminada para chat_id {chat_id}.")
+        return True
+    logger.warning(f"Intento de eliminar alerta {alert_id} (chat_id {chat_id}) fallido.")
+    return False
+
+async def get_all_alerts() -> list[dict]:
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("SELECT * FROM alerts")
+        return await cur.fetchall()
+
+async def update_alert_last_price(alert_id: str, current_price: float | None):
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        # Si current_price es None, guardamos NULL en la BD
+        await cur.execute(
+            "UPDATE alerts SET last_price=%s WHERE id::text=%s",
+            (current_price, alert_id)
+        )
+
+async def update_alert_last_notified(alert_id: str):
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("UPDATE alerts SET last_notified=now() WHERE id::text=%s", (alert_id,))
+
+async def update_alerts_last_price_bulk(updates: list[tuple[str, float | None]]) -> int:
+    """Actualiza last_price de muchas alertas en una sola sentencia. `updates` son pares (alert_id, precio)."""
+    if not updates:
+        return 0
+    alert_ids = [alert_id for alert_id, _ in updates]
+    prices = [price for _, price in updates]
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            UPDATE alerts AS a
+            SET last_price = v.last_price
+            FROM unnest(%s::uuid[], %s::float8[]) AS v(id, last_price)
+            WHERE a.id = v.id
+        """, (alert_ids, prices))
+        return cur.rowcount
+
+async def apply_observed_price(clean_url: str, price: float | None, cooldown_seconds: float) -> list[Alert]:
+    """Guarda `price` como last_price de todas las alertas de `clean_url` y devuelve, en el mismo
+    viaje a la BD, las que deben notificarse: objetivo alcanzado y fuera de cooldown.
+
+    Una sola sentencia sobre el índice (clean_url, target_price), sin importar cuántos
+    suscriptores tenga el producto. Las alertas devueltas conservan el last_price anterior
+    (el SELECT ve la tabla previa al UPDATE). Con price None solo se anota el fallo.
+    """
+    async with get_async_db_connection() as conn, conn.cursor(row_factory=_alert_row) as cur:
+        await cur.execute("""
+            WITH updated AS (
+                UPDATE alerts
+                SET last_price = %(price)s
+                WHERE clean_url = %(clean_url)s AND last_price IS DISTINCT FROM %(price)s
+            )
+            SELECT a.id, a.chat_id, a.full_url, a.clean_url, a.target_price, a.last_price, a.last_notified
+            FROM alerts a
+            WHERE a.clean_url = %(clean_url)s
+              AND a.target_price >= %(price)s
+              AND (a.last_notified IS NULL OR a.last_notified < now() - make_interval(secs => %(cooldown_seconds)s))
+        """, {'clean_url': clean_url, 'price': price, 'cooldown_seconds': cooldown_seconds})
+        return await cur.fetchall()
+
+async def update_alerts_last_notified_bulk(alert_ids: list[str]) -> int:
+    """Marca como notificadas muchas alertas en una sola sentencia."""
+    if not alert_ids:
+        return 0
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("UPDATE alerts SET last_notified=now() WHERE id = ANY(%s::uuid[])", (list(alert_ids),))
+        return cur.rowcount
+
+# --- Telegram file_id (imágenes ya subidas) ---
+
+async def get_telegram_file_id(image_url: str) -> str | None:
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("SELECT file_id FROM telegram_file_ids WHERE image_url = %s", (image_url,))
+        row = await cur.fetchone()
+    return row['file_id'] if row else None
+
+async def save_telegram_file_id(image_url: str, file_id: str):
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            INSERT INTO telegram_file_ids (image_url, file_id, created_at)
+            VALUES (%s, %s, now())
+            ON CONFLICT (image_url) DO UPDATE SET file_id = EXCLUDED.file_id, created_at = EXCLUDED.created_at
+        """, (image_url, file_id))
+
+async def delete_telegram_file_id(image_url: str):
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("DELETE FROM telegram_file_ids WHERE image_url = %s", (image_url,))
+
+async def cleanup_unused_telegram_file_ids() -> int:
+    """Elimina los file_id de imágenes que ya no usa ningún producto (p. ej. porque cambió su URL)."""
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            DELETE FROM telegram_file_ids t
+            WHERE NOT EXISTS (SELECT 1 FROM scraped_prices s WHERE s.image_url = t.image_url)
+        """)
+        deleted_count = cur.rowcount
+    if deleted_count > 0:
+        logger.info(f"Caché de imágenes de Telegram: {deleted_count} file_id(s) sin uso eliminados.")
+    return deleted_count
+
+# --- Notification outbox (checker -> notificador) ---
+
+async def enqueue_outbox_notifications(notifications: list[tuple[str, int, str]]) -> int:
+    """Inserta notificaciones (alert_id, chat_id, payload JSON) en una sola sentencia.
+
+    Una alerta con una notificación aún pendiente no se duplica. El trigger de la tabla
+    emite NOTIFY alert_triggered al confirmar la inserción.
+    """
+    if not notifications:
+        return 0
+    alert_ids, chat_ids, payloads = (list(column) for column in zip(*notifications))
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            INSERT INTO notification_outbox (alert_id, chat_id, payload)
+            SELECT v.alert_id, v.chat_id, v.payload
+            FROM unnest(%s::uuid[], %s::int8[], %s::jsonb[]) AS v(alert_id, chat_id, payload)
+            ON CONFLICT (alert_id) DO NOTHING
+        """, (alert_ids, chat_ids, payloads))
+        return cur.rowcount
+
+async def claim_outbox_notifications(limit: int, lease_seconds: float) -> list[dict]:
+    """Reserva hasta `limit` notificaciones pendientes durante `lease_seconds` (SKIP LOCKED,
+    así varios notificadores no se pisan). Las de un notificador caído vuelven al caducar."""
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            UPDATE notification_outbox o
+            SET claimed_until = now() + make_interval(secs => %(lease_seconds)s)
+            FROM (
+                SELECT id FROM notification_outbox
+                WHERE claimed_until IS NULL OR claimed_until <= now()
+                ORDER BY id
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            ) c
+            WHERE o.id = c.id
+            RETURNING o.id, o.payload
+        """, {'limit': limit, 'lease_seconds': lease_seconds})
+        return await cur.fetchall()
+
+async def renew_outbox_claims(ids: list[int], lease_seconds: float) -> int:
+    """Prorroga `lease_seconds` la reserva de las notificaciones `ids` que sigan en la tabla."""
+    if not ids:
+        return 0
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            UPDATE notification_outbox
+            SET claimed_until = now() + make_interval(secs => %s)
+            WHERE id = ANY(%s)
+        """, (lease_seconds, ids))
+        return cur.rowcount
+
+async def delete_outbox_notifications(ids: list[int]) -> int:
+    if not ids:
+        return 0
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("DELETE FROM notification_outbox WHERE id = ANY(%s)", (ids,))
+        return cur.rowcount
+
+# --- Tracked Products (planificación del checker) ---
+
+# Alertas de un conjunto de productos ({products}: consulta que devuelve clean_url), con las
+# columnas en el orden de los campos de db.models.Alert. subscriber_count se cuenta una vez
+# por producto (no con una subconsulta por fila) e incluye las alertas en cooldown.
+_ALERTS_TO_CHECK_SQL = """
+    WITH products AS ({products}),
+    counts AS (
+        SELECT s.clean_url, count(*) AS subscriber_count
+        FROM alerts s
+        WHERE s.clean_url IN (SELECT clean_url FROM products)
+        GROUP BY s.clean_url
+    )
+    SELECT a.id, a.chat_id, a.full_url, a.clean_url, a.target_price, a.last_price, a.last_notified,
+           p.check_interval_seconds, p.last_price AS product_last_price, c.subscriber_count
+    FROM alerts a
+    JOIN counts c ON c.clean_url = a.clean_url
+    LEFT JOIN tracked_products p ON p.clean_url = a.clean_url
+    {where}
+    ORDER BY a.clean_url
+"""
+
+_ALERT_OUT_OF_COOLDOWN = "(a.last_notified IS NULL OR a.last_notified < now() - make_interval(secs => %(cooldown_seconds)s))"
+
+# Una página de productos sin planificar o vencidos con alguna alerta fuera de cooldown,
+# por clave: los siguientes a %(after)s en orden de clean_url.
+_DUE_ALERTS_PAGE_SQL = _ALERTS_TO_CHECK_SQL.format(
+    products=f"""
+        SELECT DISTINCT a.clean_url
+        FROM alerts a
+        LEFT JOIN tracked_products p ON p.clean_url = a.clean_url
+        WHERE a.clean_url > %(after)s
+          AND (p.next_check_at IS NULL OR p.next_check_at <= now())
+          AND {_ALERT_OUT_OF_COOLDOWN}
+        ORDER BY a.clean_url
+        LIMIT %(limit)s
+    """,
+    where=f"WHERE {_ALERT_OUT_OF_COOLDOWN}",
+)
+
+_ALERTS_FOR_PRODUCTS_SQL = _ALERTS_TO_CHECK_SQL.format(
+    products="SELECT unnest(%(clean_urls)s::text[]) AS clean_url", where="",
+)
+
+async def iter_due_alerts(page_size: int | None = None) -> AsyncIterator[Alert]:
+    """Recorre, ordenadas por clean_url, las alertas que pueden dispararse en este ciclo.
+
+    Solo productos sin planificar o vencidos y alertas fuera de cooldown. Se leen por páginas
+    de `page_size` productos (por defecto CHECKER_PREFETCH_BATCH_SIZE) con get_due_alerts_page:
+    cada página es una consulta corta que devuelve la conexión al pool antes de entregar las
+    filas, así el ciclo no retiene una conexión ni una transacción abierta (que frenaría el
+    vacuum de alerts y tracked_products) mientras scrapea.
+    """
+    limit = max(1, page_size or config.CHECKER_PREFETCH_BATCH_SIZE)
+    after = ''
+    while True:
+        page = await get_due_alerts_page(after, limit)
+        for alert in page:
+            yield alert
+        if len({alert.clean_url for alert in page}) < limit:
+            return
+        after = page[-1].clean_url
+
+async def get_due_alerts_page(after: str, limit: int) -> list[Alert]:
+    """Una página de iter_due_alerts: alertas de los `limit` primeros productos vencidos con
+    clean_url posterior a `after` (paginación por clave)."""
+    params = {'cooldown_seconds': config.NOTIFY_COOLDOWN_HOURS * 3600, 'limit': limit, 'after': after}
+    async with get_async_db_connection() as conn, conn.cursor(row_factory=_alert_row) as cur:
+        await cur.execute(_DUE_ALERTS_PAGE_SQL, params)
+        return await cur.fetchall()
+
+async def claim_due_products(worker_id: str, limit: int, lease_seconds: float) -> list[str]:
+    """Reserva para `worker_id` hasta `limit` productos vencidos durante `lease_seconds`.
+
+    Con FOR UPDATE SKIP LOCKED varios workers reclaman a la vez sin esperarse ni repetir
+    productos. El lease se libera al guardar la planificación del producto; si el worker
+    muere, caduca y el producto vuelve a estar disponible.
+    """
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            WITH due AS (
+                SELECT p.clean_url
+                FROM tracked_products p
+                WHERE p.next_check_at <= now()
+                  AND (p.lease_expires_at IS NULL OR p.lease_expires_at <= now())
+                  AND EXISTS (SELECT 1 FROM alerts a WHERE a.clean_url = p.clean_url)
+                ORDER BY p.next_check_at
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE tracked_products p
+            SET lease_owner = %(worker_id)s,
+                lease_expires_at = now() + make_interval(secs => %(lease_seconds)s)
+            FROM due
+            WHERE p.clean_url = due.clean_url
+            RETURNING p.clean_url
+        """, {'worker_id': worker_id, 'limit': limit, 'lease_seconds': lease_seconds})
+        return [row['clean_url'] for row in await cur.fetchall()]
+
+async def get_alerts_for_products(clean_urls: list[str]) -> list[Alert]:
+    """Todas las alertas de los productos reclamados, ordenadas por clean_url (incluidas las que
+    están en cooldown: el checker las usa para planificar el producto)."""
+    if not clean_urls:
+        return []
+    async with get_async_db_connection() as conn, conn.cursor(row_factory=_alert_row) as cur:
+        await cur.execute(_ALERTS_FOR_PRODUCTS_SQL, {'clean_urls': clean_urls})
+        return await cur.fetchall()
+
+async def renew_product_leases(worker_id: str, lease_seconds: float) -> int:
+    """Prorroga `lease_seconds` los leases que `worker_id` aún conserve (productos del lote sin planificar)."""
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            UPDATE tracked_products
+            SET lease_expires_at = now() + make_interval(secs => %s)
+            WHERE lease_owner = %s
+        """, (lease_seconds, worker_id))
+        return cur.rowcount
+
+async def release_product_leases(worker_id: str) -> int:
+    """Libera los leases que `worker_id` aún conserve (productos que no llegó a planificar)."""
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            UPDATE tracked_products SET lease_owner = NULL, lease_expires_at = NULL
+            WHERE lease_owner = %s
+        """, (worker_id,))
+        return cur.rowcount
+
+async def reschedule_products_in_cooldown() -> int:
+    """Aplaza hasta el fin del primer cooldown los productos vencidos cuyas alertas están todas en cooldown.
+
+    iter_due_alerts no devuelve esos productos: sin esto seguirían vencidos en cada ciclo.
+    """
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            UPDATE tracked_products p
+            SET next_check_at = c.ready_at
+            FROM (
+                SELECT a.clean_url, min(a.last_notified) + make_interval(secs => %(cooldown_seconds)s) AS ready_at
+                FROM tracked_products d
+                JOIN alerts a ON a.clean_url = d.clean_url
+                WHERE d.next_check_at <= now()
+                GROUP BY a.clean_url
+                HAVING bool_and(COALESCE(a.last_notified >= now() - make_interval(secs => %(cooldown_seconds)s), false))
+            ) c
+            WHERE p.clean_url = c.clean_url
+        """, {'cooldown_seconds': config.NOTIFY_COOLDOWN_HOURS * 3600})
+        return cur.rowcount
+
+async def get_seconds_until_next_check() -> float | None:
+    """Segundos hasta el próximo producto planificado (negativo si ya hay alguno vencido)."""
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("SELECT EXTRACT(EPOCH FROM (min(next_check_at) - now())) AS seconds FROM tracked_products")
+        row = await cur.fetchone()
+    return float(row['seconds']) if row and row['seconds'] is not None else None
+
+async def upsert_product_schedules(schedules: list[tuple[str, int, int, float | None, bool]]) -> int:
+    """Guarda en bloque la próxima revisión de cada producto y libera su lease, si lo tenía.
+
+    `schedules` son tuplas (clean_url, segundos_hasta_la_revisión, intervalo_en_segundos,
+    último_precio, precio_cambiado).
+    """
+    if not schedules:
+        return 0
+    clean_urls, next_check_in, intervals, prices, changed = (list(column) for column in zip(*schedules))
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            INSERT INTO tracked_products (
+                clean_url, next_check_at, check_interval_seconds, last_price, last_checked_at, last_changed_at
+            )
+            SELECT v.clean_url, now() + v.next_check_in * interval '1 second', v.interval_seconds,
+                   v.last_price, now(), CASE WHEN v.price_changed THEN now() END
+            FROM unnest(%s::text[], %s::int4[], %s::int4[], %s::float8[], %s::bool[])
+                AS v(clean_url, next_check_in, interval_seconds, last_price, price_changed)
+            ON CONFLICT (clean_url) DO UPDATE SET
+                next_check_at = EXCLUDED.next_check_at,
+                check_interval_seconds = EXCLUDED.check_interval_seconds,
+                last_price = COALESCE(EXCLUDED.last_price, tracked_products.last_price),
+                last_checked_at = EXCLUDED.last_checked_at,
+                last_changed_at = COALESCE(EXCLUDED.last_changed_at, tracked_products.last_changed_at),
+                lease_owner = NULL,
+                lease_expires_at = NULL
+        """, (clean_urls, next_check_in, intervals, prices, changed))
+        return cur.rowcount
+
+async def cleanup_untracked_products() -> int:
+    """Elimina la planificación de productos que ya no tienen ninguna alerta."""
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            DELETE FROM tracked_products p
+            WHERE NOT EXISTS (SELECT 1 FROM alerts a WHERE a.clean_url = p.clean_url)
+        """)
+        deleted_count = cur.rowcount
+    if deleted_count > 0:
+        logger.info(f"Planificación: {deleted_count} producto(s) sin alertas eliminados.")
+    return deleted_count
+
+# --- Price History (serie temporal particionada por mes) ---
+
+_PRICE_HISTORY_PARTITION_RE = re.compile(r"^price_history_p(\d{4})(\d{2})$")
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def _next_month(month: date) -> date:
+    return date(month.year + (month.month == 12), month.month % 12 + 1, 1)
+
+async def append_price_history(clean_url: str, price: float | None, in_stock: bool | None):
+    """Añade una observación a price_history, registrando el producto en el diccionario si es nuevo."""
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            WITH new_product AS (
+                INSERT INTO products (clean_url) VALUES (%(clean_url)s)
+                ON CONFLICT (clean_url) DO NOTHING
+                RETURNING id
+            )
+            INSERT INTO price_history (product_id, observed_at, price, in_stock)
+            SELECT p.id, now(), %(price)s, %(in_stock)s
+            FROM (
+                SELECT id FROM new_product
+                UNION ALL
+                SELECT id FROM products WHERE clean_url = %(clean_url)s
+            ) p
+            LIMIT 1
+        """, {'clean_url': clean_url, 'price': price, 'in_stock': in_stock})
+
+async def append_unchanged_price_history(clean_url: str, price: float | None):
+    """Añade la observación de una página sin cambios (304 o mismo JSON-LD): el precio anterior y
+    el in_stock de la última observación del producto, sin haber vuelto a parsear."""
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            WITH new_product AS (
+                INSERT INTO products (clean_url) VALUES (%(clean_url)s)
+                ON CONFLICT (clean_url) DO NOTHING
+                RETURNING id
+            ), product AS (
+                SELECT id FROM new_product
+                UNION ALL
+                SELECT id FROM products WHERE clean_url = %(clean_url)s
+                LIMIT 1
+            )
+            INSERT INTO price_history (product_id, observed_at, price, in_stock)
+            SELECT product.id, now(), %(price)s, (
+                SELECT h.in_stock FROM price_history h
+                WHERE h.product_id = product.id
+                ORDER BY h.observed_at DESC
+                LIMIT 1
+            )
+            FROM product
+        """, {'clean_url': clean_url, 'price': price})
+
+async def ensure_price_history_partitions(months_ahead: int = 1) -> int:
+    """Crea las particiones mensuales del mes actual y de los `months_ahead` siguientes que falten.
+
+    Deben existir antes de que lleguen filas de ese mes; el bot y los workers la llaman al
+    arrancar y el checker en cada mantenimiento. Si ya hay filas del mes en la partición por
+    defecto (rezagados, o un arranque tardío), se trasladan a la nueva en la misma
+    transacción: Postgres no deja crear la partición mientras la por defecto tenga filas de
+    su rango. Cada mes va por separado, así que un fallo en uno no impide crear los demás.
+    Devuelve el número de particiones creadas.
+    """
+    month = _month_start(datetime.utcnow().date())
+    created = 0
+    for _ in range(months_ahead + 1):
+        following = _next_month(month)
+        # Nombres y límites salen de fechas generadas aquí; los DDL no admiten parámetros.
+        partition = f"price_history_p{month:%Y%m}"
+        bounds = f"FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+        try:
+            async with get_async_db_connection() as conn, conn.transaction(), conn.cursor() as cur:
+                await cur.execute("SELECT to_regclass(%s) IS NOT NULL AS present", (partition,))
+                if not (await cur.fetchone())['present']:
+                    # Se bloquea la partición por defecto para que no entren filas del mes
+                    # entre el traslado y el ATTACH (que la revisa entera).
+                    await cur.execute("LOCK TABLE price_history_default IN EXCLUSIVE MODE")
+                    await cur.execute(f"CREATE TABLE {partition} (LIKE price_history INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+                    await cur.execute(f"""
+                        WITH moved AS (
+                            DELETE FROM price_history_default
+                            WHERE observed_at >= %s AND observed_at < %s
+                            RETURNING product_id, observed_at, price, in_stock
+                        )
+                        INSERT INTO {partition} (product_id, observed_at, price, in_stock)
+                        SELECT product_id, observed_at, price, in_stock FROM moved
+                    """, (month, following))
+                    moved = cur.rowcount
+                    await cur.execute(f"ALTER TABLE price_history ATTACH PARTITION {partition} FOR VALUES {bounds}")
+                    created += 1
+                    logger.info(f"Histórico de precios: partición {partition} creada ({moved} fila(s) trasladada(s) desde la partición por defecto).")
+        except Exception as e:
+            logger.error(f"Histórico de precios: error creando la partición {partition}: {e}", exc_info=True)
+        month = following
+    return created
+
+async def downsample_price_history(raw_retention_days: int | None = None) -> int:
+    """Resume por día las particiones mensuales ya fuera de retención y las elimina; de la
+    partición por defecto se resumen y borran las filas fuera de retención.
+
+    Borrar particiones enteras evita el DELETE fila a fila (y su bloat). El resumen usa
+    ON CONFLICT DO NOTHING, así que repetir el proceso tras un fallo es seguro.
+    """
+    if raw_retention_days is None:
+        raw_retention_days = config.PRICE_HISTORY_RAW_RETENTION_DAYS
+    cutoff = datetime.utcnow().date() - timedelta(days=raw_retention_days)
+    dropped = 0
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            SELECT c.relname
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'price_history'::regclass
+        """)
+        partitions = [row['relname'] for row in await cur.fetchall()]
+        for partition in sorted(partitions):
+            match = _PRICE_HISTORY_PARTITION_RE.match(partition)
+            if not match:
+                continue
+            month = date(int(match.group(1)), int(match.group(2)), 1)
+            if _next_month(month) > cutoff:
+                continue
+            await cur.execute(f"""
+                INSERT INTO price_history_daily (product_id, day, min_price, max_price, avg_price, last_price, samples)
+                SELECT product_id, observed_at::date, min(price), max(price), avg(price),
+                       (array_agg(price ORDER BY observed_at DESC))[1], count(*)
+                FROM {partition}
+                GROUP BY product_id, observed_at::date
+                ON CONFLICT (product_id, day) DO NOTHING
+            """)
+            await cur.execute(f"DROP TABLE {partition}")
+            dropped += 1
+        # La partición por defecto (rezagados, meses sin partición a tiempo) no se puede eliminar:
+        # sus filas fuera de retención se borran y resumen en la misma sentencia, sumándose al
+        # resumen del día si ya existía.
+        await cur.execute("""
+            WITH expired AS (
+                DELETE FROM price_history_default
+                WHERE observed_at < %s
+                RETURNING product_id, observed_at, price
+            )
+            INSERT INTO price_history_daily AS d (product_id, day, min_price, max_price, avg_price, last_price, samples)
+            SELECT product_id, observed_at::date, min(price), max(price), avg(price),
+                   (array_agg(price ORDER BY observed_at DESC))[1], count(*)
+            FROM expired
+            GROUP BY product_id, observed_at::date
+            ON CONFLICT (product_id, day) DO UPDATE SET
+                min_price = LEAST(d.min_price, EXCLUDED.min_price),
+                max_price = GREATEST(d.max_price, EXCLUDED.max_price),
+                avg_price = (COALESCE(d.avg_price * d.samples, 0) + COALESCE(EXCLUDED.avg_price * EXCLUDED.samples, 0))
+                            / (d.samples + EXCLUDED.samples),
+                last_price = COALESCE(d.last_price, EXCLUDED.last_price),
+                samples = d.samples + EXCLUDED.samples
+        """, (cutoff,))
+        default_days = cur.rowcount
+    if dropped > 0:
+        logger.info(f"Histórico de precios: {dropped} partición(es) resumida(s) por día y eliminada(s).")
+    if default_days > 0:
+        logger.info(f"Histórico de precios: {default_days} día(s) de la partición por defecto resumidos y eliminados.")
+    return dropped
+
+async def get_price_history(clean_url: str, since: datetime, until: datetime | None = None) -> list[dict]:
+    """Observaciones en bruto de un producto dentro de [since, until)."""
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            SELECT h.observed_at, h.price, h.in_stock
+            FROM price_history h
+            JOIN products p ON p.id = h.product_id
+            WHERE p.clean_url = %s AND h.observed_at >= %s AND h.observed_at < COALESCE(%s, 'infinity'::timestamp)
+            ORDER BY h.observed_at
+        """, (clean_url, since, until))
+        return await cur.fetchall()
+
+async def get_last_price_observations(clean_url: str, limit: int = 10) -> list[dict]:
+    """Las `limit` observaciones más recientes de un producto, de la más nueva a la más antigua."""
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            SELECT h.observed_at, h.price, h.in_stock
+            FROM price_history h
+            JOIN products p ON p.id = h.product_id
+            WHERE p.clean_url = %s
+            ORDER BY h.observed_at DESC
+            LIMIT %s
+        """, (clean_url, limit))
+        return await cur.fetchall()
+
+async def get_daily_price_history(clean_url: str, since: date, until: date | None = None) -> list[dict]:
+    """Resumen diario (mín/máx/media/último) de [since, until), combinando el histórico ya
+    reducido con el que aún está en bruto."""
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            WITH product AS (SELECT id FROM products WHERE clean_url = %(clean_url)s)
+            SELECT day, min_price, max_price, avg_price, last_price, samples
+            FROM price_history_daily
+            WHERE product_id = (SELECT id FROM product)
+              AND day >= %(since)s AND day < COALESCE(%(until)s, 'infinity'::date)
+            UNION ALL
+            SELECT observed_at::date, min(price), max(price), avg(price),
+                   (array_agg(price ORDER BY observed_at DESC))[1], count(*)
+            FROM price_history
+            WHERE product_id = (SELECT id FROM product)
+              AND observed_at >= %(since)s AND observed_at < COALESCE(%(until)s, 'infinity'::date)
+            GROUP BY observed_at::date
+            ORDER BY day
+        """, {'clean_url': clean_url, 'since': since, 'until': until})
+        return await cur.fetchall()
+
+async def get_price_extremes(clean_url: str, since: datetime | None = None) -> dict | None:
+    """Precio mínimo y máximo de un producto desde `since` (todo el histórico si es None)."""
+    async with get_async_db_connection() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            WITH product AS (SELECT id FROM products WHERE clean_url = %(clean_url)s),
+            observations AS (
+                SELECT min_price, max_price, samples
+                FROM price_history_daily
+                WHERE product_id = (SELECT id FROM product)
+                  AND day >= COALESCE(%(since)s, '-infinity'::timestamp)::date
+                UNION ALL
+                SELECT price, price, 1
+                FROM price_history
+                WHERE product_id = (SELECT id FROM product)
+                  AND observed_at >= COALESCE(%(since)s, '-infinity'::timestamp)
+            )
+            SELECT min(min_price) AS min_price, max(max_price) AS max_price, sum(samples) AS samples
+            FROM observations
+        """, {'clean_url': clean_url, 'since': since})
+        row = await cur.fetchone()
+    return row if row and row['samples'] else None
+
+# Debe ir al final del módulo: envuelve todas las funciones de consulta definidas arriba.
+metrics.instrument_queries(sys.modules[__name__])
@@ -1,32 +1,102 @@
 # db/connection.py
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 import logging
 import config
 
 logger = logging.getLogger(__name__)
-conn = None
+
+_pool: ThreadedConnectionPool | None = None
+_pool_lock = threading.Lock()
+# psycopg2 lanza PoolError cuando se agota el pool; el semáforo hace que los hilos esperen turno.
+_pool_slots = threading.BoundedSemaphore(config.DB_POOL_MAX_SIZE)
+_last_used: dict[int, float] = {}
+
+
+def _get_pool() -> ThreadedConnectionPool:
+    """Crea el pool la primera vez (o tras cerrarlo) y lo devuelve."""
+    global _pool
+    if _pool is None or _pool.closed:
+        with _pool_lock:
+            if _pool is None or _pool.closed:
+                try:
+                    _pool = ThreadedConnectionPool(
+                        config.DB_POOL_MIN_SIZE, config.DB_POOL_MAX_SIZE,
+                        config.DATABASE_URL, cursor_factory=RealDictCursor
+                    )
+                    logger.info(f"Pool de conexiones creado (min={config.DB_POOL_MIN_SIZE}, max={config.DB_POOL_MAX_SIZE}).")
+                except psycopg2.Error as e:
+                    logger.critical(f"Error CRÍTICO al conectar con la base de datos: {e}")
+                    raise
+    return _pool
 
 
+def _is_healthy(conn) -> bool:
+    """Comprueba la conexión antes de prestarla. Solo hace ping si lleva un rato ociosa."""
+    if conn.closed or conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    idle_seconds = time.monotonic() - _last_used.get(id(conn), 0.0)
+    if idle_seconds < config.DB_POOL_HEALTHCHECK_IDLE_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        return True
+    except psycopg2.Error as e:
+        logger.warning(f"Conexión del pool descartada tras fallar el health check: {e}")
+        return False
+
+
+def _prepare(conn):
+    if not conn.closed and not conn.autocommit:
+        conn.autocommit = True
+    return conn
+
+
+def _checkout(pool: ThreadedConnectionPool):
+    conn = _prepare(pool.getconn())
+    if not _is_healthy(conn):
+        _last_used.pop(id(conn), None)
+        pool.putconn(conn, close=True)
+        conn = _prepare(pool.getconn())  # El pool abre una conexión nueva: reconexión automática
+        logger.info("Nueva conexión a la base de datos establecida (reconexión).")
+    return conn
+
+
+@contextmanager
 def get_db_connection():
-    """Establece o retorna la conexión existente a la base de datos."""
-    global conn
-    if conn is None or conn.closed:
+    """Presta una conexión sana del pool y la devuelve al salir del bloque `with`."""
+    if not _pool_slots.acquire(timeout=config.DB_POOL_TIMEOUT_SECONDS):
+        raise PoolError(f"Sin conexiones libres tras {config.DB_POOL_TIMEOUT_SECONDS}s de espera.")
+    try:
+        pool = _get_pool()
+        conn = _checkout(pool)
         try:
-            conn = psycopg2.connect(config.DATABASE_URL, cursor_factory=RealDictCursor)
-            conn.autocommit = True
-            logger.info("Nueva conexión a la base de datos establecida.")
-        except psycopg2.Error as e:
-            logger.critical(f"Error CRÍTICO al conectar con la base de datos: {e}")
-            raise
-    return conn
+            yield conn
+        finally:
+            # Las conexiones rotas durante su uso se descartan; el siguiente préstamo abrirá otra.
+            if conn.closed:
+                _last_used.pop(id(conn), None)
+            else:
+                _last_used[id(conn)] = time.monotonic()
+            if not pool.closed:
+                pool.putconn(conn, close=bool(conn.closed))
+    finally:
+        _pool_slots.release()
 
 def close_db_connection():
-    """Cierra la conexión a la base de datos si está abierta."""
-    global conn
-    if conn and not conn.closed:
-        conn.close()
-        logger.info("Conexión a la base de datos cerrada.")
-        conn = None
+    """Cierra todas las conexiones del pool si está abierto."""
+    global _pool
+    if _pool and not _pool.closed:
+        _pool.closeall()
+        _last_used.clear()
+        logger.info("Pool de conexiones a la base de datos cerrado.")
+        _pool = None
     else:
         logger.info("No hay conexión abierta a cerrar.")
@@ -0,0 +1,43 @@
+# db/models.py
+from collections.abc import Mapping
+from dataclasses import dataclass, fields
+from datetime import datetime
+
+
+class RowAccessMixin:
+    """Acceso `obj['campo']` / `obj.get('campo')` para que el código escrito para dicts siga funcionando."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+
+@dataclass(slots=True)
+class Alert(RowAccessMixin):
+    """Alerta tal como la recorre el checker (una fila de iter_due_alerts).
+
+    El orden de los campos es el de las columnas de _ALERTS_TO_CHECK_SQL: db.async_queries
+    construye las filas por posición (_alert_row), sin pasar por un dict por fila.
+    """
+    id: str
+    chat_id: int
+    full_url: str
+    clean_url: str
+    target_price: float
+    last_price: float | None = None
+    last_notified: datetime | None = None
+    check_interval_seconds: int | None = None
+    product_last_price: float | None = None
+    subscriber_count: int | None = None
+
+    @classmethod
+    def from_mapping(cls, row: Mapping) -> "Alert":
+        """Alert a partir de un dict (p. ej. filas de get_all_alerts); ignora las claves sobrantes."""
+        return cls(**{f.name: row[f.name] for f in fields(cls) if f.name in row})
@@ -1,34 +1,41 @@
 # db/queries.py
+# API síncrona original (psycopg2), conservada para scripts y tareas puntuales. El bot, el
+# scraper y el checker usan db/async_queries.py, y las consultas nuevas solo se añaden allí.
 import logging
+import sys
 from datetime import datetime, timedelta
 from .connection import get_db_connection
 import config
+import metrics
 
 logger = logging.getLogger(__name__)
 
 # --- Scraped Prices Queries ---
 
-def get_cached_price(clean_url: str) -> dict | None:
-    conn = get_db_connection()
-    with conn.cursor() as cur:
+def get_cached_price(clean_url: str, max_age_minutes: float | None = None) -> dict | None:
+    """Fila de scraped_prices más reciente que `max_age_minutes` (por defecto SCRAPE_TTL_MINUTES)."""
+    if max_age_minutes is None:
+        max_age_minutes = config.SCRAPE_TTL_MINUTES
+    with get_db_connection() as conn, conn.cursor() as cur:
         cur.execute("""
             SELECT price, product_condition, scraped_at,
                    product_name, description, image_url,
                    color, storage, brand_name
             FROM scraped_prices
             WHERE clean_url = %s
-            ORDER BY scraped_at DESC LIMIT 1
         """, (clean_url,))
         row = cur.fetchone()
-    if row and datetime.utcnow() - row['scraped_at'] < timedelta(minutes=config.SCRAPE_TTL_MINUTES):
+    if row and datetime.utcnow() - row['scraped_at'] < timedelta(minutes=max_age_minutes):
         logger.info(f"Usando datos completos de caché para {clean_url}")
         return dict(row)
     return None
 
-def save_scraped_price(clean_url: str, product_details: dict):
-    """Guarda o actualiza todos los detalles scrapeados del producto."""
-    conn = get_db_connection()
-    
+def save_scraped_price(clean_url: str, product_details: dict, validators: dict | None = None):
+    """Guarda o actualiza todos los detalles scrapeados del producto.
+
+    `validators` admite 'etag', 'last_modified' y 'content_hash' para la próxima petición condicional.
+    """
+    validators = validators or {}
     # Crear un diccionario para los parámetros de la query,
     # combinando clean_url con product_details.
     params_for_query = {
@@ -47,18 +54,23 @@ def save_scraped_price(clean_url: str, product_details: dict):
         'image_url': product_details.get('image'), # La columna es image_url, el detalle es 'image'
         'color': product_details.get('color'),
         'storage': product_details.get('storage'),
-        'brand_name': product_details.get('brand_name')
+        'brand_name': product_details.get('brand_name'),
+        'etag': validators.get('etag'),
+        'last_modified': validators.get('last_modified'),
+        'content_hash': validators.get('content_hash')
     }
 
-    with conn.cursor() as cur:
+    with get_db_connection() as conn, conn.cursor() as cur:
         sql = """
             INSERT INTO scraped_prices (
                 clean_url, price, product_condition, scraped_at,
-                product_name, description, image_url, color, storage, brand_name
+                product_name, description, image_url, color, storage, brand_name,
+                etag, last_modified, content_hash
             )
             VALUES (
                 %(clean_url)s, %(price)s, %(product_condition)s, now(),
-                %(name)s, %(description)s, %(image_url)s, %(color)s, %(storage)s, %(brand_name)s
+                %(name)s, %(description)s, %(image_url)s, %(color)s, %(storage)s, %(brand_name)s,
+                %(etag)s, %(last_modified)s, %(content_hash)s
             )
             ON CONFLICT (clean_url) DO UPDATE SET
                 price = EXCLUDED.price,
@@ -69,15 +81,16 @@ def save_scraped_price(clean_url: str, product_details: dict):
                 image_url = EXCLUDED.image_url,
                 color = EXCLUDED.color,
                 storage = EXCLUDED.storage,
-                brand_name = EXCLUDED.brand_name
+                brand_name = EXCLUDED.brand_name,
+                etag = EXCLUDED.etag,
+                last_modified = EXCLUDED.last_modified,
+                content_hash = EXCLUDED.content_hash
         """
         cur.execute(sql, params_for_query)
     logger.info(f"Datos completos del producto guardados/actualizados para {clean_url}")
 
-
 def cleanup_old_scraped_prices():
-    conn = get_db_connection()
-    with conn.cursor() as cur:
+    with get_db_connection() as conn, conn.cursor() as cur:
         # El intervalo para limpieza podría ir a config.py
         cur.execute("DELETE FROM scraped_prices WHERE scraped_at < now() - interval '2 days'")
         deleted_count = cur.rowcount
@@ -90,22 +103,19 @@ def cleanup_old_scraped_prices():
 # --- Alerts Queries ---
 
 def get_alert_by_chat_and_clean_url(chat_id: int, clean_url: str) -> dict | None: # Renombrado
-    conn = get_db_connection()
-    with conn.cursor() as cur:
+    with get_db_connection() as conn, conn.cursor() as cur:
         cur.execute("SELECT * FROM alerts WHERE chat_id=%s AND clean_url=%s", (chat_id, clean_url))
         return cur.fetchone()
 
 # NUEVA FUNCIÓN para obtener una alerta por su ID
 def get_alert_by_id(alert_id: str) -> dict | None:
     """Obtiene una alerta específica por su ID (UUID como string)."""
-    conn = get_db_connection()
-    with conn.cursor() as cur:
+    with get_db_connection() as conn, conn.cursor() as cur:
         cur.execute("SELECT * FROM alerts WHERE id::text = %s", (alert_id,))
         return cur.fetchone()
 
 def update_alert_target_price(alert_id: str, target_price: float, full_url: str): # Renombrado
-    conn = get_db_connection()
-    with conn.cursor() as cur:
+    with get_db_connection() as conn, conn.cursor() as cur:
         cur.execute(
             "UPDATE alerts SET target_price=%s, inserted_at=now(), full_url=%s WHERE id::text=%s",
             (target_price, full_url, alert_id)
@@ -113,27 +123,31 @@ def update_alert_target_price(alert_id: str, target_price: float, full_url: str)
     logger.info(f"Alerta {alert_id} actualizada. Nuevo objetivo: {target_price}€")
 
 def create_alert(chat_id: int, full_url: str, clean_url: str, target_price: float, product_name: str | None = None):
-    conn = get_db_connection()
-    with conn.cursor() as cur:
+    with get_db_connection() as conn, conn.cursor() as cur:
         # Podríamos considerar añadir product_name a la tabla alerts si queremos mostrarlo en /alerts sin joins
+        # El producto entra en tracked_products al momento: los workers solo reclaman productos planificados.
         cur.execute("""
-            INSERT INTO alerts (chat_id, full_url, clean_url, target_price) 
-            VALUES (%s, %s, %s, %s) RETURNING id
+            WITH new_alert AS (
+                INSERT INTO alerts (chat_id, full_url, clean_url, target_price)
+                VALUES (%s, %s, %s, %s) RETURNING id, clean_url
+            ), tracked AS (
+                INSERT INTO tracked_products (clean_url)
+                SELECT clean_url FROM new_alert
+                ON CONFLICT (clean_url) DO NOTHING
+            )
+            SELECT id FROM new_alert
         """, (chat_id, full_url, clean_url, target_price))
         new_alert_id = cur.fetchone()['id']
     logger.info(f"Nueva alerta ID {new_alert_id} creada para chat_id {chat_id}, URL: {clean_url}, Objetivo: {target_price}€")
     return new_alert_id
 
-
 def get_user_alerts(chat_id: int) -> list[dict]:
-    conn = get_db_connection()
-    with conn.cursor() as cur:
-        cur.execute("SELECT * FROM alerts WHERE chat_id=%s ORDER BY inserted_at DESC", (chat_id,))
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT * FROM alerts WHERE chat_id=%s ORDER BY inserted_at DESC, id DESC", (chat_id,))
         return cur.fetchall()
 
 def delete_alert_by_id(alert_id: str, chat_id: int) -> bool:
-    conn = get_db_connection()
-    with conn.cursor() as cur:
+    with get_db_connection() as conn, conn.cursor() as cur:
         cur.execute("DELETE FROM alerts WHERE id::text=%s AND chat_id=%s RETURNING id", (alert_id, chat_id))
         deleted_row = cur.fetchone()
     if deleted_row:
@@ -143,21 +157,21 @@ def delete_alert_by_id(alert_id: str, chat_id: int) -> bool:
     return False
 
 def get_all_alerts() -> list[dict]:
-    conn = get_db_connection()
-    with conn.cursor() as cur:
+    with get_db_connection() as conn, conn.cursor() as cur:
         cur.execute("SELECT * FROM alerts")
         return cur.fetchall()
 
 def update_alert_last_price(alert_id: str, current_price: float | None):
-    conn = get_db_connection()
-    with conn.cursor() as cur:
+    with get_db_connection() as conn, conn.cursor() as cur:
         # Si current_price es None, guardamos NULL en la BD
         cur.execute(
-            "UPDATE alerts SET last_price=%s, inserted_at=now() WHERE id::text=%s",
+            "UPDATE alerts SET last_price=%s WHERE id::text=%s",
             (current_price, alert_id)
         )
 
 def update_alert_last_notified(alert_id: str):
-    conn = get_db_connection()
-    with conn.cursor() as cur:
+    with get_db_connection() as conn, conn.cursor() as cur:
         cur.execute("UPDATE alerts SET last_notified=now() WHERE id::text=%s", (alert_id,))
+
+# Debe ir al final del módulo: envuelve todas las funciones de consulta definidas arriba.
+metrics.instrument_queries(sys.modules[__name__])
@@ -0,0 +1,67 @@
+# db/write_buffer.py
+import asyncio
+import logging
+import time
+
+from . import async_queries as db_queries
+
+logger = logging.getLogger(__name__)
+
+
+class AlertWriteBuffer:
+    """Acumula las actualizaciones de last_price y la planificación de productos de un ciclo,
+    y las vuelca en bloque. last_notified no pasa por aquí: lo escribe el notificador (on_sent)
+    en cuanto el mensaje se entrega, para que el cooldown se aplique sin esperar al volcado.
+
+    Se vacía al llegar a `batch_size` actualizaciones pendientes, cuando han pasado
+    `flush_interval_seconds` desde el último volcado y, explícitamente, al final del ciclo.
+    """
+
+    def __init__(self, batch_size: int, flush_interval_seconds: float):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_seconds = flush_interval_seconds
+        self._last_prices: dict[str, float | None] = {}
+        self._schedules: dict[str, tuple[int, int, float | None, bool]] = {}
+        self._last_flush = time.monotonic()
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def pending(self) -> int:
+        return len(self._last_prices) + len(self._schedules)
+
+    async def add_last_price(self, alert_id: str, price: float | None):
+        self._last_prices[alert_id] = price
+        await self._maybe_flush()
+
+    async def add_product_schedule(self, clean_url: str, next_check_in_seconds: float, interval_seconds: int,
+                                   last_price: float | None, price_changed: bool):
+        self._schedules[clean_url] = (int(next_check_in_seconds), int(interval_seconds), last_price, price_changed)
+        await self._maybe_flush()
+
+    async def _maybe_flush(self):
+        if self.pending >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval_seconds:
+            await self.flush()
+
+    async def flush(self):
+        """Escribe todo lo pendiente. Si la BD falla, las actualizaciones vuelven al buffer."""
+        async with self._flush_lock:
+            last_prices, self._last_prices = self._last_prices, {}
+            schedules, self._schedules = self._schedules, {}
+            self._last_flush = time.monotonic()
+            if not last_prices and not schedules:
+                return
+            try:
+                if last_prices:
+                    await db_queries.update_alerts_last_price_bulk(list(last_prices.items()))
+                    last_prices = {}
+                if schedules:
+                    await db_queries.upsert_product_schedules(
+                        [(clean_url, *schedule) for clean_url, schedule in schedules.items()]
+                    )
+                    schedules = {}
+                logger.debug("Buffer de escritura volcado.")
+            except Exception as e:
+                logger.error(f"Error volcando buffer de escritura de alertas: {e}", exc_info=True)
+                # Lo añadido mientras tanto es más reciente y prevalece.
+                self._last_prices = {**last_prices, **self._last_prices}
+                self._schedules = {**schedules, **self._schedules}
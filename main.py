@@ -6,13 +6,18 @@ import asyncio
 import logging
 
 import config
+import metrics
 
 from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler
 
 # Importar módulos como paquetes desde la raíz del proyecto
 from bot import handlers as bot_handlers
+from bot import outbox as bot_outbox
 from tasks import checker as tasks_checker
+from scraper import core as scraper_core
 from db import connection as db_connection
+from db import async_connection as db_async_connection
+from db import async_queries as db_async_queries
 
 # Configuración del logger principal de la aplicación
 logging.basicConfig(
@@ -29,15 +34,21 @@ async def main_async_logic():
     logger.info("Iniciando el bot...")
 
     try:
-        db_conn = db_connection.get_db_connection()
-        if db_conn is None or db_conn.closed:
-            logger.critical("La conexión a la BD no se pudo establecer o está cerrada después del intento inicial.")
-            return
+        await db_async_connection.open_async_pool()
         logger.info("Conexión inicial a la base de datos verificada.")
     except Exception as e:
         logger.critical(f"Fallo crítico al obtener conexión a la BD en main: {e}", exc_info=True)
         return
 
+    # Las particiones del histórico deben existir antes de la primera escritura del checker.
+    await db_async_queries.ensure_price_history_partitions()
+
+    try:
+        metrics.start_metrics_server()
+    except OSError as e:
+        # Sin métricas el bot sigue funcionando; no merece la pena abortar el arranque.
+        logger.error(f"No se pudo abrir el endpoint de métricas en el puerto {config.METRICS_PORT}: {e}")
+
     application = (
         ApplicationBuilder()
         .token(config.TELEGRAM_TOKEN)
@@ -51,10 +62,17 @@ async def main_async_logic():
     application.add_handler(CommandHandler("delete", bot_handlers.delete_alert_by_number_command))
     application.add_handler(CallbackQueryHandler(bot_handlers.callback_query_handler))
 
-    # Crear y programar la tarea del checker
-    # Esta tarea se ejecutará en el mismo bucle de eventos que application.run_polling()
-    checker_task = asyncio.create_task(tasks_checker.check_alerts_periodically(application))
-    logger.info("Tarea del checker programada.")
+    # Crear y programar las tareas de fondo (checker y, con entrega por outbox, el notificador)
+    # Se ejecutarán en el mismo bucle de eventos que application.run_polling()
+    background_tasks = {}
+    if config.RUN_CHECKER_IN_BOT:
+        background_tasks["checker"] = asyncio.create_task(tasks_checker.check_alerts_periodically(application))
+        logger.info("Tarea del checker programada.")
+    else:
+        logger.info("Checker desactivado en este proceso (RUN_CHECKER_IN_BOT=false): lo ejecutan los workers de tasks.worker.")
+    if config.NOTIFICATION_DELIVERY == "outbox" and config.RUN_NOTIFIER_IN_BOT:
+        background_tasks["notificador"] = asyncio.create_task(bot_outbox.run_outbox_notifier(application.bot))
+        logger.info("Tarea del notificador (outbox) programada.")
 
     try:
         logger.info("🤖 Bot iniciado y escuchando actualizaciones...")
@@ -67,17 +85,22 @@ async def main_async_logic():
     finally:
         logger.info("Iniciando proceso de apagado (desde el bloque finally de main_async_logic)...")
 
-        if checker_task and not checker_task.done():
-            logger.info("Cancelando la tarea del checker...")
-            checker_task.cancel()
+        for name, task in background_tasks.items():
+            if task.done():
+                continue
+            logger.info(f"Cancelando la tarea del {name}...")
+            task.cancel()
             try:
-                await checker_task
-                logger.info("Tarea del checker finalizada después de la cancelación.")
+                await task
+                logger.info(f"Tarea del {name} finalizada después de la cancelación.")
             except asyncio.CancelledError:
-                logger.info("Tarea del checker explícitamente cancelada y finalizada.")
+                logger.info(f"Tarea del {name} explícitamente cancelada y finalizada.")
             except Exception as e_task:
-                logger.error(f"Error durante la espera de la cancelación de la tarea del checker: {e_task}", exc_info=True)
+                logger.error(f"Error durante la espera de la cancelación de la tarea del {name}: {e_task}", exc_info=True)
 
+        scraper_core.shutdown_parse_executor()
+        await scraper_core.close_http_client()
+        await db_async_connection.close_async_pool()
         db_connection.close_db_connection()
         logger.info("🤖 Bot detenido (desde el bloque finally de main_async_logic).")
 
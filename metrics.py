@@ -0,0 +1,140 @@
+# metrics.py
+"""Métricas Prometheus del proceso (scraper, caché, checker, BD y notificaciones).
+
+Se exponen en http://METRICS_ADDR:METRICS_PORT/metrics con start_metrics_server();
+con METRICS_PORT=0 no se abre ningún puerto, pero las métricas se siguen registrando.
+"""
+import functools
+import inspect
+import logging
+import time
+from contextlib import aclosing
+from types import ModuleType
+
+from prometheus_client import Counter, Histogram, start_http_server
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Cubos pensados para latencias de red/BD: de milisegundos a un minuto.
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+CHECKER_CYCLE_DURATION = Histogram(
+    "checker_cycle_duration_seconds", "Duración de cada ciclo de run_check_cycle.",
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+CHECKER_ALERTS_PROCESSED = Counter("checker_alerts_processed_total", "Alertas evaluadas por el checker.")
+CHECKER_PRODUCTS_PROCESSED = Counter("checker_products_processed_total", "Productos distintos procesados por el checker.")
+
+# result: CACHE_HIT, CACHE_STALE o SCRAPE (sin caché válida; COALESCED si se unió a un scrape en curso)
+# en get_product_info, y PREFETCH_HIT para la caché precargada en bloque por el checker.
+PRODUCT_INFO_LOOKUPS = Counter("product_info_lookups_total", "Datos de producto pedidos, por origen.", ["result"])
+
+FETCH_DURATION = Histogram(
+    "scraper_fetch_duration_seconds", "Latencia de cada intento de descarga, por estado (SUCCESS, TIMEOUT_ERROR, API_ERROR...).",
+    ["status"], buckets=_LATENCY_BUCKETS,
+)
+PARSE_DURATION = Histogram(
+    "scraper_parse_duration_seconds", "Tiempo de parseo de una página (incluida la espera al executor).",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Latencia de las funciones de db/queries.py y db/async_queries.py.",
+    ["function"], buckets=_LATENCY_BUCKETS,
+)
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "Funciones de consulta que terminaron con excepción.", ["function"])
+
+NOTIFICATION_SEND_DURATION = Histogram(
+    "notification_send_duration_seconds", "Latencia de cada envío a Telegram.", buckets=_LATENCY_BUCKETS,
+)
+NOTIFICATIONS_SENT = Counter("notifications_sent_total", "Mensajes de notificación entregados.")
+# reason: retry_after, rejected (Forbidden/BadRequest), telegram_error, unexpected, dropped (sin más reintentos).
+NOTIFICATION_FAILURES = Counter("notification_failures_total", "Envíos de notificación fallidos.", ["reason"])
+
+
+def start_metrics_server() -> bool:
+    """Abre el endpoint /metrics en un hilo propio. Devuelve False si está desactivado (METRICS_PORT=0)."""
+    if not config.METRICS_PORT:
+        return False
+    start_http_server(config.METRICS_PORT, addr=config.METRICS_ADDR)
+    logger.info(f"Métricas Prometheus en http://{config.METRICS_ADDR}:{config.METRICS_PORT}/metrics")
+    return True
+
+
+def _timed(func, name: str):
+    histogram = DB_QUERY_DURATION.labels(name)
+    errors = DB_QUERY_ERRORS.labels(name)
+
+    if inspect.isasyncgenfunction(func):
+        # Generadores (lectura por páginas): se suma solo el tiempo dentro del generador, no el
+        # que el consumidor pasa con cada elemento (en el checker, el scraping). aclosing propaga
+        # un cierre anticipado al generador interno para que suelte su conexión enseguida.
+        @functools.wraps(func)
+        async def async_gen_wrapper(*args, **kwargs):
+            elapsed = 0.0
+            try:
+                async with aclosing(func(*args, **kwargs)) as items:
+                    while True:
+                        start = time.perf_counter()
+                        try:
+                            item = await items.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            elapsed += time.perf_counter() - start
+                        yield item
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(elapsed)
+        return async_gen_wrapper
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def gen_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                yield from func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return gen_wrapper
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - start)
+    return wrapper
+
+
+def instrument_queries(module: ModuleType):
+    """Envuelve las funciones públicas definidas en `module` para medir su latencia en
+    db_query_duration_seconds{function=...}. Las variantes síncrona y asíncrona comparten etiqueta."""
+    for name, func in list(vars(module).items()):
+        if name.startswith("_") or not inspect.isfunction(func) or func.__module__ != module.__name__:
+            continue
+        setattr(module, name, _timed(func, name))
@@ -0,0 +1,70 @@
+# scraper/cache.py
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Caché LRU acotada en memoria, con la misma caducidad que la tabla scraped_prices.
+
+    La vigencia de cada entrada se mide desde `scraped_at` (antigüedad del dato),
+    no desde el momento en que se guardó en memoria. `max_entries=0` la desactiva.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max(0, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, row = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return row
+
+    def set(self, key: str, row: dict, scraped_at: datetime | None = None):
+        if self.max_entries == 0:
+            return
+        scraped_at = scraped_at or row.get("scraped_at") or datetime.utcnow()
+        remaining = self.ttl_seconds - (datetime.utcnow() - scraped_at).total_seconds()
+        if remaining <= 0:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = (time.monotonic() + remaining, row)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
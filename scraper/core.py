@@ -1,23 +1,150 @@
 # scraper/core.py
+import hashlib
 import logging
 import json
+import re
+import time
 import asyncio
+import dataclasses
+from datetime import datetime, timedelta
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-import requests
+import httpx
 from bs4 import BeautifulSoup
 
 import config
-from db import queries as db_queries
+import metrics
+from db import async_queries as db_queries
 from .utils import clean_url
+from .throttle import HostThrottle
+from .cache import TTLCache
+from .models import ProductInfo
 
 logger = logging.getLogger(__name__)
 
-def _parse_product_details(html_content: str, url_for_logging: str) -> dict:
-    details = {
+try:
+    import h2  # noqa: F401  (extra opcional de httpx para HTTP/2)
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+SCRAPERAPI_ENDPOINT = "https://api.scraperapi.com/"
+DIRECT_REQUEST_HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+
+# Límite de cortesía por host de destino; sustituye a la pausa fija entre alertas del checker.
+_host_throttle = HostThrottle(config.SCRAPER_PER_HOST_CONCURRENCY, config.SCRAPER_PER_HOST_DELAY_SECONDS)
+
+# Caché en memoria delante de scraped_prices. Conserva las filas hasta el TTL duro
+# para poder servirlas como CACHE_STALE; la frescura (TTL blando) se decide al leer.
+_price_cache = TTLCache(config.SCRAPE_MEMORY_CACHE_MAX_ENTRIES, config.SCRAPE_HARD_TTL_MINUTES * 60)
+
+# Scrapes en curso por clean_url, compartidos entre llamadores concurrentes.
+_inflight_scrapes: dict[str, asyncio.Task] = {}
+
+_parse_executor: Executor | None = None
+_http_client: httpx.AsyncClient | None = None
+
+# Bloques <script type="application/ld+json"> tal y como los vería html.parser:
+# nombre de etiqueta sin distinguir mayúsculas, valor del atributo exacto.
+_LD_JSON_SCRIPT_RE = re.compile(
+    r'<(?i:script)\b[^>]*\s(?i:type)\s*=\s*(["\']?)application/ld\+json\1[^>]*>(.*?)</(?i:script)\s*>',
+    re.DOTALL
+)
+
+# Columnas de scraped_prices que solo sirven para el siguiente scrape, no para la respuesta.
+_VALIDATOR_KEYS = ("etag", "last_modified", "content_hash")
+
+def _content_hash(html_content: str) -> str | None:
+    """Hash de los bloques JSON-LD de la página: si no cambia, los datos del producto tampoco."""
+    blocks = [match.group(2).strip() for match in _LD_JSON_SCRIPT_RE.finditer(html_content)]
+    if not any(blocks):
+        return None
+    return hashlib.sha256("\n".join(blocks).encode("utf-8")).hexdigest()
+
+def _conditional_headers(validators: dict | None) -> dict:
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+def _empty_product_details() -> dict:
+    return {
         "price": None, "availability": None, "condition": None,
         "name": None, "description": None, "image": None,
         "color": None, "storage": None, "brand_name": None
     }
+
+def _find_product_data(data) -> dict | None:
+    """Devuelve el objeto '@type': 'Product' de un bloque JSON-LD (objeto o lista)."""
+    if isinstance(data, list):
+        for item in data:
+            if isinstance(item, dict) and item.get("@type") == "Product":
+                return item
+        return None
+    if isinstance(data, dict) and data.get("@type") == "Product":
+        return data
+    return None
+
+def _apply_product_data(details: dict, data: dict, url_for_logging: str) -> bool:
+    """Vuelca un Product JSON-LD en `details`. Devuelve True si tenía una oferta con precio."""
+    details["name"] = data.get("name")
+    details["description"] = data.get("description")
+    image_data = data.get("image")
+    if isinstance(image_data, list) and image_data:
+        details["image"] = image_data[0]
+    elif isinstance(image_data, str):
+        details["image"] = image_data
+    details["color"] = data.get("color")
+    details["storage"] = data.get("storage")
+    brand_data = data.get("brand")
+    if isinstance(brand_data, dict):
+        details["brand_name"] = brand_data.get("name")
+    elif isinstance(brand_data, str):
+        details["brand_name"] = brand_data
+    offers_data = data.get("offers")
+    if offers_data:
+        offer = None
+        if isinstance(offers_data, list):
+            if offers_data: offer = offers_data[0]
+        elif isinstance(offers_data, dict):
+            offer = offers_data
+        if offer and isinstance(offer, dict) and "price" in offer:
+            try:
+                details["price"] = float(offer["price"])
+            except (ValueError, TypeError):
+                logger.warning(f"Precio inválido '{offer['price']}' en {url_for_logging}")
+            details["availability"] = offer.get("availability", "").split("/")[-1]
+            item_condition_url = offer.get("itemCondition")
+            if isinstance(item_condition_url, str):
+                details["condition"] = item_condition_url.split("/")[-1]
+            return True
+    return False
+
+def _parse_product_details_fast(html_content: str, url_for_logging: str) -> dict | None:
+    """Camino rápido: recorre el texto crudo buscando bloques ld+json sin construir el árbol HTML.
+
+    Se detiene en el primer Product con oferta. Devuelve None ante cualquier situación que
+    no sepa resolver igual que el parser completo, para que éste decida.
+    """
+    details = _empty_product_details()
+    try:
+        for match in _LD_JSON_SCRIPT_RE.finditer(html_content):
+            block = match.group(2)
+            if not block:
+                continue
+            product_data = _find_product_data(json.loads(block))
+            if product_data is not None and _apply_product_data(details, product_data, url_for_logging):
+                return details
+    except Exception as e:
+        logger.debug(f"Camino rápido JSON-LD descartado para {url_for_logging}: {e}")
+    return None
+
+def _parse_product_details_soup(html_content: str, url_for_logging: str) -> dict:
+    details = _empty_product_details()
     try:
         soup = BeautifulSoup(html_content, "html.parser")
         scripts = soup.find_all("script", type="application/ld+json")
@@ -25,48 +152,12 @@ def _parse_product_details(html_content: str, url_for_logging: str) -> dict:
         for script in scripts:
             if not script.string:
                 continue
-            data = json.loads(script.string)
-            if isinstance(data, list):
-                for item in data:
-                    if isinstance(item, dict) and item.get("@type") == "Product":
-                        data = item
-                        break
-                else:
-                    continue
-            if isinstance(data, dict) and data.get("@type") == "Product":
+            data = _find_product_data(json.loads(script.string))
+            if data is not None:
                 product_data_found = True
-                details["name"] = data.get("name")
-                details["description"] = data.get("description")
-                image_data = data.get("image")
-                if isinstance(image_data, list) and image_data:
-                    details["image"] = image_data[0]
-                elif isinstance(image_data, str):
-                    details["image"] = image_data
-                details["color"] = data.get("color")
-                details["storage"] = data.get("storage")
-                brand_data = data.get("brand")
-                if isinstance(brand_data, dict):
-                    details["brand_name"] = brand_data.get("name")
-                elif isinstance(brand_data, str):
-                    details["brand_name"] = brand_data
-                offers_data = data.get("offers")
-                if offers_data:
-                    offer = None
-                    if isinstance(offers_data, list):
-                        if offers_data: offer = offers_data[0]
-                    elif isinstance(offers_data, dict):
-                        offer = offers_data
-                    if offer and isinstance(offer, dict) and "price" in offer:
-                        try:
-                            details["price"] = float(offer["price"])
-                        except (ValueError, TypeError):
-                            logger.warning(f"Precio inválido '{offer['price']}' en {url_for_logging}")
-                        details["availability"] = offer.get("availability", "").split("/")[-1]
-                        item_condition_url = offer.get("itemCondition")
-                        if isinstance(item_condition_url, str):
-                            details["condition"] = item_condition_url.split("/")[-1]
-                        logger.info(f"Detalles parseados (JSON-LD) para {url_for_logging}")
-                        return details
+                if _apply_product_data(details, data, url_for_logging):
+                    logger.info(f"Detalles parseados (JSON-LD) para {url_for_logging}")
+                    return details
         if not product_data_found:
              logger.info(f"No se encontró '@type': 'Product' en JSON-LD para {url_for_logging}")
         elif details["price"] is None:
@@ -77,55 +168,144 @@ def _parse_product_details(html_content: str, url_for_logging: str) -> dict:
         logger.error(f"Error procesando contenido para {url_for_logging}: {e}", exc_info=True)
     return details
 
-def _fetch_url_content_attempt(full_url: str, use_api: bool) -> requests.Response:
-    # Esta función es SÍNCRONA y será ejecutada en un hilo por asyncio.to_thread
-    logger.info(f"SYNC_FETCH_ATTEMPT: Iniciando petición síncrona para {full_url}. Timeout={config.API_TIMEOUT_SECONDS}s. Usar API: {use_api}")
-    response = None
+def _parse_product_details(html_content: str, url_for_logging: str) -> dict:
+    details = _parse_product_details_fast(html_content, url_for_logging)
+    if details is not None:
+        logger.info(f"Detalles parseados (JSON-LD) para {url_for_logging}")
+        return details
+    return _parse_product_details_soup(html_content, url_for_logging)
+
+def get_parse_executor() -> Executor | None:
+    """Crea bajo demanda el executor de parseo según PARSE_EXECUTOR ('none', 'thread' o 'process')."""
+    global _parse_executor
+    if _parse_executor is None and config.PARSE_EXECUTOR != "none":
+        workers = max(1, config.PARSE_WORKERS)
+        if config.PARSE_EXECUTOR == "process":
+            _parse_executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            _parse_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parse")
+        logger.info(f"Executor de parseo '{config.PARSE_EXECUTOR}' creado con {workers} worker(s).")
+    return _parse_executor
+
+def shutdown_parse_executor():
+    """Cierra el executor de parseo si se llegó a crear."""
+    global _parse_executor
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=False, cancel_futures=True)
+        _parse_executor = None
+        logger.info("Executor de parseo cerrado.")
+
+async def parse_product_details_async(html_content: str, url_for_logging: str) -> dict:
+    """Parsea fuera del bucle de eventos para no bloquear la atención de comandos del bot."""
+    with metrics.PARSE_DURATION.time():
+        return await _parse_in_executor(html_content, url_for_logging)
+
+async def _parse_in_executor(html_content: str, url_for_logging: str) -> dict:
+    global _parse_executor
+    executor = get_parse_executor()
+    if executor is None:
+        return _parse_product_details(html_content, url_for_logging)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(executor, _parse_product_details, html_content, url_for_logging)
+    except BrokenProcessPool:
+        logger.error(f"Pool de procesos de parseo roto al parsear {url_for_logging}. Se recreará en el próximo uso.")
+        _parse_executor = None
+        return _parse_product_details(html_content, url_for_logging)
+
+def get_http_client() -> httpx.AsyncClient:
+    """Cliente HTTP compartido: reutiliza conexiones (keep-alive) entre scrapes."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        use_http2 = config.HTTP2_ENABLED and _HTTP2_AVAILABLE
+        _http_client = httpx.AsyncClient(
+            http2=use_http2,
+            limits=httpx.Limits(
+                max_connections=config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=config.API_TIMEOUT_SECONDS,
+            follow_redirects=True,
+        )
+        logger.info(f"Cliente HTTP creado (HTTP/2: {use_http2}, max_connections={config.HTTP_MAX_CONNECTIONS}).")
+    return _http_client
+
+async def close_http_client():
+    """Cierra el cliente HTTP compartido y su pool de conexiones."""
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+        logger.info("Cliente HTTP cerrado.")
+    _http_client = None
+
+async def _fetch_url_content_attempt(full_url: str, use_api: bool, validators: dict | None = None) -> httpx.Response:
+    logger.info(f"FETCH_ATTEMPT: Iniciando petición para {full_url}. Timeout={config.API_TIMEOUT_SECONDS}s. Usar API: {use_api}")
+    client = get_http_client()
     if use_api and config.SCRAPERAPI_KEY:
         payload = {'api_key': config.SCRAPERAPI_KEY, 'url': full_url, 'max_cost': config.SCRAPER_MAX_COST}
-        response = requests.get("https://api.scraperapi.com/", params=payload, timeout=config.API_TIMEOUT_SECONDS)
+        response = await client.get(SCRAPERAPI_ENDPOINT, params=payload, timeout=config.API_TIMEOUT_SECONDS)
     else:
         if not use_api:
-            logger.debug(f"SYNC_FETCH_ATTEMPT: Usando petición directa (use_api=False) para {full_url}")
+            logger.debug(f"FETCH_ATTEMPT: Usando petición directa (use_api=False) para {full_url}")
         else:
-            logger.warning(f"SYNC_FETCH_ATTEMPT: SCRAPERAPI_KEY no configurado. Usando petición directa para {full_url}")
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        response = requests.get(full_url, headers=headers, timeout=config.API_TIMEOUT_SECONDS)
-    logger.info(f"SYNC_FETCH_ATTEMPT: Petición síncrona para {full_url} completada. Status: {response.status_code if response else 'No Response'}")
-    if response:
+            logger.warning(f"FETCH_ATTEMPT: SCRAPERAPI_KEY no configurado. Usando petición directa para {full_url}")
+        # Solo las peticiones directas llegan al origen con las cabeceras condicionales.
+        headers = {**DIRECT_REQUEST_HEADERS, **_conditional_headers(validators)}
+        response = await client.get(full_url, headers=headers, timeout=config.API_TIMEOUT_SECONDS)
+    logger.info(f"FETCH_ATTEMPT: Petición para {full_url} completada. Status: {response.status_code} ({response.http_version})")
+    if response.status_code != 304:
         response.raise_for_status()
-    elif not response :
-        raise requests.exceptions.RequestException("No se obtuvo respuesta del servidor (variable response es None).")
     return response
 
-async def fetch_product_details_from_url(full_url: str, use_api: bool = True) -> tuple[str | None, str | None]:
+async def fetch_product_details_from_url(full_url: str, use_api: bool = True,
+                                         validators: dict | None = None) -> tuple[str | None, str | None, dict]:
+    """Descarga la página. Devuelve (texto, estado, validadores de la respuesta).
+
+    Con `validators` (etag/last_modified de la vez anterior) las peticiones directas son
+    condicionales; un 304 se devuelve como estado 'NOT_MODIFIED' y sin texto.
+    """
     response_text = None
     status = None
+    response_validators = {}
     for attempt in range(config.MAX_RETRIES_SCRAPER + 1):
+        attempt_started_at = None
         try:
             log_prefix = f"[API Intento {attempt + 1}]" if use_api and config.SCRAPERAPI_KEY else f"[Directo Intento {attempt + 1}]"
             logger.info(f"{log_prefix} Preparando para obtener {full_url}")
-            # Ejecutar la función de red en un hilo separado
-            # usando asyncio.to_thread para evitar bloquear el hilo principal
-            response_object = await asyncio.to_thread(_fetch_url_content_attempt, full_url, use_api)
+            async with _host_throttle.slot(full_url):
+                # La espera del throttle por host no cuenta como latencia de descarga.
+                attempt_started_at = time.perf_counter()
+                response_object = await _fetch_url_content_attempt(full_url, use_api, validators)
+            if not (use_api and config.SCRAPERAPI_KEY):
+                response_validators = {
+                    "etag": response_object.headers.get("etag"),
+                    "last_modified": response_object.headers.get("last-modified"),
+                }
+            if response_object.status_code == 304:
+                status = 'NOT_MODIFIED'
+                break
             response_text = response_object.text
             status = 'SUCCESS'
             break
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             logger.warning(f"Timeout en intento {attempt + 1} para {full_url} (después de {config.API_TIMEOUT_SECONDS}s)")
             status = 'TIMEOUT_ERROR'
-        except requests.exceptions.HTTPError as e:
-            logger.warning(f"HTTPError intento {attempt + 1} para {full_url}: {e.response.status_code if e.response else 'Unknown status'}")
+        except httpx.HTTPStatusError as e:
+            logger.warning(f"HTTPError intento {attempt + 1} para {full_url}: {e.response.status_code}")
             status = 'API_ERROR' if use_api and config.SCRAPERAPI_KEY else 'REQUEST_ERROR'
-            if e.response and e.response.status_code in [401, 403, 404] and attempt == config.MAX_RETRIES_SCRAPER:
+            if e.response.status_code in [401, 403, 404] and attempt == config.MAX_RETRIES_SCRAPER:
                 logger.error(f"Error cliente ({e.response.status_code}) para {full_url}. Sin más reintentos.")
                 break
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"RequestException intento {attempt + 1} para {full_url}: {e}")
+        except httpx.RequestError as e:
+            logger.warning(f"RequestError intento {attempt + 1} para {full_url}: {e!r}")
             status = 'REQUEST_ERROR'
         except Exception as e_general:
-            logger.error(f"Excepción general en intento {attempt + 1} para {full_url} originada en to_thread: {e_general}", exc_info=True)
-            status = 'THREAD_EXECUTION_ERROR'
+            logger.error(f"Excepción general en intento {attempt + 1} para {full_url}: {e_general}", exc_info=True)
+            status = 'THREAD_EXECUTION_ERROR' # Se conserva el nombre histórico del estado
+        finally:
+            if attempt_started_at is not None:
+                metrics.FETCH_DURATION.labels(status or 'UNKNOWN').observe(time.perf_counter() - attempt_started_at)
         if attempt < config.MAX_RETRIES_SCRAPER:
             logger.info(f"Reintentando en {config.RETRY_DELAY_SCRAPER_SECONDS}s...")
             await asyncio.sleep(config.RETRY_DELAY_SCRAPER_SECONDS)
@@ -133,45 +313,178 @@ async def fetch_product_details_from_url(full_url: str, use_api: bool = True) ->
             logger.error(f"Todos los {config.MAX_RETRIES_SCRAPER + 1} intentos fallaron para {full_url}.")
     if response_text is None and status != 'SUCCESS':
         status = 'NO_TEXT' if status is None else status
-    return response_text, status
+    return response_text, status, response_validators
+
+def product_info_from_cache(cached_row: dict, url_to_scrape: str, cleaned_url_str: str | None = None, status: str = "CACHE_HIT") -> ProductInfo:
+    """Construye la respuesta de get_product_info a partir de una fila de scraped_prices."""
+    return ProductInfo.from_cache_row(
+        cached_row, clean_url=cleaned_url_str or clean_url(url_to_scrape), full_url=url_to_scrape, status=status
+    )
+
+def _cache_row_from_details(product_details: dict) -> dict:
+    """Convierte los detalles parseados a la forma de fila que devuelve get_cached_price."""
+    return {
+        "price": product_details.get("price"),
+        "product_condition": product_details.get("condition"),
+        "scraped_at": datetime.utcnow(),
+        "product_name": product_details.get("name"),
+        "description": product_details.get("description"),
+        "image_url": product_details.get("image"),
+        "color": product_details.get("color"),
+        "storage": product_details.get("storage"),
+        "brand_name": product_details.get("brand_name"),
+    }
+
+def _is_fresh(row: dict) -> bool:
+    """True si la fila está dentro del TTL blando (SCRAPE_TTL_MINUTES)."""
+    return datetime.utcnow() - row["scraped_at"] < timedelta(minutes=config.SCRAPE_TTL_MINUTES)
+
+async def get_cached_row(cleaned_url_str: str) -> dict | None:
+    """Fila de scraped_prices dentro del TTL duro, consultando primero la caché en memoria.
+
+    Puede estar caducada respecto al TTL blando; el llamador lo comprueba con _is_fresh.
+    """
+    row = _price_cache.get(cleaned_url_str)
+    if row is not None:
+        return row
+    row = await db_queries.get_cached_price(cleaned_url_str, max_age_minutes=config.SCRAPE_HARD_TTL_MINUTES)
+    if row:
+        _price_cache.set(cleaned_url_str, row)
+    return row
+
+async def get_cached_rows(clean_urls: list[str]) -> dict[str, dict]:
+    """Filas frescas (TTL blando) en bloque: solo las URLs sin dato fresco en memoria van a la BD."""
+    found = {}
+    missing = []
+    for url in clean_urls:
+        row = _price_cache.get(url)
+        if row is not None and _is_fresh(row):
+            found[url] = row
+        else:
+            missing.append(url)
+    if missing:
+        db_rows = await db_queries.get_cached_prices(missing)
+        for url, row in db_rows.items():
+            _price_cache.set(url, row)
+        found.update(db_rows)
+    return found
+
+async def save_scraped_price(cleaned_url_str: str, product_details: dict, validators: dict | None = None):
+    """Guarda en BD e invalida/actualiza la entrada correspondiente en memoria.
+
+    La observación se añade también al histórico; si eso falla, la caché no se ve afectada.
+    """
+    _price_cache.invalidate(cleaned_url_str)
+    await db_queries.save_scraped_price(cleaned_url_str, product_details, validators)
+    _price_cache.set(cleaned_url_str, _cache_row_from_details(product_details))
+    availability = product_details.get("availability")
+    in_stock = availability.lower() == "instock" if availability else None
+    try:
+        await db_queries.append_price_history(cleaned_url_str, product_details.get("price"), in_stock)
+    except Exception as e:
+        logger.error(f"Error guardando histórico de precio para {cleaned_url_str}: {e}", exc_info=True)
+
+def get_price_cache_stats() -> dict:
+    return _price_cache.stats()
 
-async def get_product_info(url_to_scrape: str) -> dict:
+async def get_product_info(url_to_scrape: str, check_cache: bool = True, allow_stale: bool = True) -> ProductInfo:
+    """Devuelve los detalles del producto desde caché o scrapeando.
+
+    `check_cache=False` omite la consulta de caché cuando el llamador ya sabe que no hay
+    datos vigentes (p. ej. el checker tras precargar la caché con get_cached_rows).
+    Con `allow_stale`, una fila pasada del TTL blando pero dentro del duro se devuelve
+    al momento como CACHE_STALE mientras se refresca en segundo plano.
+    """
     cleaned_url_str = clean_url(url_to_scrape)
     logger.info(f"GET_PRODUCT_INFO: URL original: {url_to_scrape}, URL limpiada para caché: {cleaned_url_str}")
-    cached_product_info = await asyncio.to_thread(db_queries.get_cached_price, cleaned_url_str)
-    if cached_product_info:
-        logger.info(f"Usando datos completos de caché para {cleaned_url_str}")
-        cached_product_info["clean_url"] = cleaned_url_str
-        cached_product_info["full_url"] = url_to_scrape
-        cached_product_info["status"] = "CACHE_HIT"
-        cached_product_info.setdefault("price", None)
-        cached_product_info.setdefault("availability", "N/A (cache)")
-        cached_product_info.setdefault("condition", cached_product_info.get("product_condition"))
-        return cached_product_info
+    if check_cache:
+        cached_row = await get_cached_row(cleaned_url_str)
+        if cached_row:
+            if _is_fresh(cached_row):
+                logger.info(f"Usando datos completos de caché para {cleaned_url_str}")
+                metrics.PRODUCT_INFO_LOOKUPS.labels("CACHE_HIT").inc()
+                return product_info_from_cache(cached_row, url_to_scrape, cleaned_url_str)
+            if allow_stale:
+                logger.info(f"Caché caducada (TTL blando) para {cleaned_url_str}: se sirve y se refresca en segundo plano.")
+                metrics.PRODUCT_INFO_LOOKUPS.labels("CACHE_STALE").inc()
+                _start_scrape(url_to_scrape, cleaned_url_str)
+                return product_info_from_cache(cached_row, url_to_scrape, cleaned_url_str, status="CACHE_STALE")
     logger.info(f"No hay caché válida para {cleaned_url_str}, procediendo a scrapear.")
+
+    scrape_task = _inflight_scrapes.get(cleaned_url_str)
+    if scrape_task is None and check_cache:
+        # Un scrape que terminó mientras se consultaba la BD ya habrá llenado la caché en memoria.
+        cached_row = _price_cache.get(cleaned_url_str)
+        if cached_row is not None and _is_fresh(cached_row):
+            metrics.PRODUCT_INFO_LOOKUPS.labels("CACHE_HIT").inc()
+            return product_info_from_cache(cached_row, url_to_scrape, cleaned_url_str)
+    if scrape_task is not None:
+        logger.info(f"Scrape ya en curso para {cleaned_url_str}; reutilizando su resultado.")
+        metrics.PRODUCT_INFO_LOOKUPS.labels("COALESCED").inc()
+    else:
+        metrics.PRODUCT_INFO_LOOKUPS.labels("SCRAPE").inc()
+        scrape_task = _start_scrape(url_to_scrape, cleaned_url_str)
+    # shield: cancelar a un llamador no cancela el scrape que otros pueden estar esperando.
+    product_info = await asyncio.shield(scrape_task)
+    if product_info.full_url == url_to_scrape:
+        return product_info
+    return dataclasses.replace(product_info, full_url=url_to_scrape)
+
+def _start_scrape(url_to_scrape: str, cleaned_url_str: str) -> asyncio.Task:
+    """Single-flight: devuelve el scrape en curso para el producto o lanza uno nuevo."""
+    scrape_task = _inflight_scrapes.get(cleaned_url_str)
+    if scrape_task is None:
+        scrape_task = asyncio.create_task(_scrape_product(url_to_scrape, cleaned_url_str))
+        _inflight_scrapes[cleaned_url_str] = scrape_task
+        scrape_task.add_done_callback(lambda task, key=cleaned_url_str: _forget_inflight_scrape(key, task))
+    return scrape_task
+
+def _forget_inflight_scrape(cleaned_url_str: str, task: asyncio.Task):
+    if _inflight_scrapes.get(cleaned_url_str) is task:
+        del _inflight_scrapes[cleaned_url_str]
+    if not task.cancelled() and task.exception() is not None:
+        # Recupera la excepción aunque nadie espere la tarea (p. ej. refresco en segundo plano)
+        logger.warning(f"Scrape de {cleaned_url_str} terminado con error: {task.exception()!r}")
+
+async def _scrape_product(url_to_scrape: str, cleaned_url_str: str) -> ProductInfo:
     use_api_for_this_url = True 
     if not config.SCRAPERAPI_KEY:
         logger.warning(f"SCRAPERAPI_KEY no disponible. El scraping para {url_to_scrape} podría fallar.")
-    html_content, fetch_status = await fetch_product_details_from_url(url_to_scrape, use_api=use_api_for_this_url)
-    base_fail_response = {
-        "price": None, "availability": None, "condition": None,
-        "name": None, "description": None, "image": None,
-        "color": None, "storage": None, "brand_name": None,
-        "clean_url": cleaned_url_str, "full_url": url_to_scrape,
-        "status": f"SCRAPE_FAILED_{fetch_status}"
-    }
+    try:
+        previous_row = await db_queries.get_last_scraped_price(cleaned_url_str)
+    except Exception as e:
+        logger.warning(f"No se pudieron leer los validadores previos de {cleaned_url_str}: {e}")
+        previous_row = None
+    html_content, fetch_status, response_validators = await fetch_product_details_from_url(
+        url_to_scrape, use_api=use_api_for_this_url, validators=previous_row
+    )
+    content_hash = _content_hash(html_content) if fetch_status == 'SUCCESS' and html_content else None
+    if previous_row is not None and (
+        fetch_status == 'NOT_MODIFIED'
+        or (content_hash is not None and content_hash == previous_row.get("content_hash"))
+    ):
+        return await _refresh_unchanged_product(url_to_scrape, cleaned_url_str, previous_row, response_validators)
     if fetch_status == 'SUCCESS' and html_content:
-        product_details = _parse_product_details(html_content, url_to_scrape)
+        product_details = await parse_product_details_async(html_content, url_to_scrape)
         if product_details.get("price") is not None:
-            await asyncio.to_thread(
-                db_queries.save_scraped_price,
-                cleaned_url_str,
-                product_details
-            )
-        final_details = base_fail_response.copy()
-        final_details.update(product_details)
-        final_details["status"] = "SCRAPED_SUCCESS"
-        return final_details
+            await save_scraped_price(cleaned_url_str, product_details, {**response_validators, "content_hash": content_hash})
+        return ProductInfo.from_details(product_details, clean_url=cleaned_url_str, full_url=url_to_scrape, status="SCRAPED_SUCCESS")
     else:
-        logger.error(f"Fallo al obtener/parsear detalles para {url_to_scrape}. Estado final: {base_fail_response['status']}")
-        return base_fail_response
+        status = f"SCRAPE_FAILED_{fetch_status}"
+        logger.error(f"Fallo al obtener/parsear detalles para {url_to_scrape}. Estado final: {status}")
+        return ProductInfo(clean_url=cleaned_url_str, full_url=url_to_scrape, status=status)
+
+async def _refresh_unchanged_product(url_to_scrape: str, cleaned_url_str: str, previous_row: dict, response_validators: dict) -> ProductInfo:
+    """Página sin cambios (304 o mismo hash de JSON-LD): sin parsear ni reescribir la fila, solo se renueva
+    scraped_at y se anota la observación en el histórico con el precio anterior."""
+    logger.info(f"Sin cambios en {cleaned_url_str}; se renueva scraped_at sin parsear.")
+    await db_queries.touch_scraped_price(cleaned_url_str, response_validators.get("etag"), response_validators.get("last_modified"))
+    cached_row = {key: value for key, value in previous_row.items() if key not in _VALIDATOR_KEYS}
+    cached_row["scraped_at"] = datetime.utcnow()
+    _price_cache.set(cleaned_url_str, cached_row)
+    # Aunque no se reescriba la fila, cada revisión sigue siendo una observación del histórico.
+    try:
+        await db_queries.append_unchanged_price_history(cleaned_url_str, previous_row.get("price"))
+    except Exception as e:
+        logger.error(f"Error guardando histórico de precio para {cleaned_url_str}: {e}", exc_info=True)
+    return product_info_from_cache(cached_row, url_to_scrape, cleaned_url_str, status="SCRAPED_UNCHANGED")
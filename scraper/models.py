@@ -0,0 +1,49 @@
+# scraper/models.py
+from collections.abc import Mapping
+from dataclasses import dataclass
+from datetime import datetime
+
+from db.models import RowAccessMixin
+
+# Claves que produce el parser (scraper.core); coinciden con los primeros campos de ProductInfo.
+_DETAIL_KEYS = ("price", "availability", "condition", "name", "description", "image", "color", "storage", "brand_name")
+
+
+@dataclass(slots=True)
+class ProductInfo(RowAccessMixin):
+    """Resultado de get_product_info. Admite `info['price']` / `info.get('price')` como el dict anterior."""
+    price: float | None = None
+    availability: str | None = None
+    condition: str | None = None
+    name: str | None = None
+    description: str | None = None
+    image: str | None = None
+    color: str | None = None
+    storage: str | None = None
+    brand_name: str | None = None
+    clean_url: str | None = None
+    full_url: str | None = None
+    status: str = ""
+    scraped_at: datetime | None = None
+
+    @classmethod
+    def from_details(cls, details: Mapping, **extra) -> "ProductInfo":
+        """ProductInfo a partir de los detalles parseados (dict de scraper.core)."""
+        return cls(**{key: details.get(key) for key in _DETAIL_KEYS}, **extra)
+
+    @classmethod
+    def from_cache_row(cls, row: Mapping, **extra) -> "ProductInfo":
+        """ProductInfo a partir de una fila de scraped_prices (nombres de columna de la tabla)."""
+        return cls(
+            price=row.get("price"),
+            availability=row.get("availability") or "N/A (cache)",
+            condition=row.get("product_condition"),
+            name=row.get("product_name"),
+            description=row.get("description"),
+            image=row.get("image_url"),
+            color=row.get("color"),
+            storage=row.get("storage"),
+            brand_name=row.get("brand_name"),
+            scraped_at=row.get("scraped_at"),
+            **extra,
+        )
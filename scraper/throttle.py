@@ -0,0 +1,40 @@
+# scraper/throttle.py
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class HostThrottle:
+    """Limita la concurrencia y el ritmo de peticiones hacia un mismo host."""
+
+    def __init__(self, max_concurrency: int, min_delay_seconds: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_delay_seconds = max(0.0, min_delay_seconds)
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._next_start: dict[str, float] = {}
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Reserva un hueco para `url`: respeta el máximo de peticiones simultáneas
+        y la separación mínima entre inicios de petición para su host."""
+        host = urlsplit(url).netloc.lower()
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(self.max_concurrency)
+        async with semaphore:
+            await self._wait_turn(host)
+            yield
+
+    async def _wait_turn(self, host: str):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        # Se reserva el turno antes de dormir, así varias corrutinas del mismo host
+        # quedan espaciadas sin necesidad de un lock adicional.
+        start_at = max(now, self._next_start.get(host, 0.0))
+        self._next_start[host] = start_at + self.min_delay_seconds
+        if start_at > now:
+            logger.debug(f"Throttle {host}: esperando {start_at - now:.2f}s")
+            await asyncio.sleep(start_at - now)
@@ -1,5 +1,5 @@
 -- public.scraped_prices definition
-CREATE TABLE public.scraped_prices (
+CREATE TABLE IF NOT EXISTS public.scraped_prices (
     id uuid DEFAULT gen_random_uuid() NOT NULL,
     clean_url text NOT NULL,
     price float8 NULL,
@@ -15,10 +15,14 @@ CREATE TABLE public.scraped_prices (
     CONSTRAINT scraped_prices_pkey PRIMARY KEY (id),
     CONSTRAINT scraped_prices_clean_url_key UNIQUE (clean_url)
 );
-CREATE INDEX scraped_prices_scraped_at_idx ON public.scraped_prices USING btree (scraped_at);
+CREATE INDEX IF NOT EXISTS scraped_prices_scraped_at_idx ON public.scraped_prices USING btree (scraped_at);
+-- Validadores para peticiones condicionales y hash del JSON-LD para detectar páginas sin cambios.
+ALTER TABLE public.scraped_prices ADD COLUMN IF NOT EXISTS etag text NULL;
+ALTER TABLE public.scraped_prices ADD COLUMN IF NOT EXISTS last_modified text NULL;
+ALTER TABLE public.scraped_prices ADD COLUMN IF NOT EXISTS content_hash text NULL;
 
 -- public.alerts definition
-CREATE TABLE public.alerts (
+CREATE TABLE IF NOT EXISTS public.alerts (
     id uuid DEFAULT gen_random_uuid() NOT NULL,
     chat_id int8 NOT NULL,
     full_url text NOT NULL,
@@ -29,5 +33,108 @@ CREATE TABLE public.alerts (
     inserted_at timestamp DEFAULT now() NULL,
     CONSTRAINT alerts_pkey PRIMARY KEY (id)
 );
-CREATE UNIQUE INDEX alerts_chat_id_clean_url_idx ON public.alerts USING btree (chat_id, clean_url);
-CREATE INDEX alerts_chat_id_idx ON public.alerts USING btree (chat_id);
+CREATE UNIQUE INDEX IF NOT EXISTS alerts_chat_id_clean_url_idx ON public.alerts USING btree (chat_id, clean_url);
+CREATE INDEX IF NOT EXISTS alerts_chat_id_idx ON public.alerts USING btree (chat_id);
+-- Conjunto de trabajo del checker: agrupación por producto y exclusión de alertas en cooldown.
+-- (clean_url, target_price) también sirve a apply_observed_price: alertas de un producto con objetivo >= precio.
+CREATE INDEX IF NOT EXISTS alerts_clean_url_target_price_idx ON public.alerts USING btree (clean_url, target_price);
+DROP INDEX IF EXISTS public.alerts_clean_url_idx; -- cubierto por el prefijo del índice anterior
+CREATE INDEX IF NOT EXISTS alerts_last_notified_idx ON public.alerts USING btree (last_notified);
+-- Orden del listado de /alerts: paginación por clave (inserted_at, id) y posición para /delete.
+-- inserted_at solo cambia al crear la alerta o al cambiar su objetivo, nunca al guardar precios:
+-- si el checker lo moviera, los cursores de los botones de página saltarían o repetirían alertas.
+CREATE INDEX IF NOT EXISTS alerts_chat_id_inserted_at_id_idx ON public.alerts USING btree (chat_id, inserted_at DESC, id DESC);
+
+-- public.tracked_products definition
+-- Planificación por producto del checker: next_check_at actúa como cola de prioridad persistente.
+CREATE TABLE IF NOT EXISTS public.tracked_products (
+    id bigserial NOT NULL,
+    clean_url text NOT NULL,
+    next_check_at timestamp DEFAULT now() NOT NULL,
+    check_interval_seconds int4 NULL,
+    last_price float8 NULL,
+    last_checked_at timestamp NULL,
+    last_changed_at timestamp NULL,
+    CONSTRAINT tracked_products_pkey PRIMARY KEY (id),
+    CONSTRAINT tracked_products_clean_url_key UNIQUE (clean_url)
+);
+CREATE INDEX IF NOT EXISTS tracked_products_next_check_at_idx ON public.tracked_products USING btree (next_check_at);
+-- Leases de los workers del checker (tasks.worker): quién revisa el producto y hasta cuándo.
+ALTER TABLE public.tracked_products ADD COLUMN IF NOT EXISTS lease_owner text NULL;
+ALTER TABLE public.tracked_products ADD COLUMN IF NOT EXISTS lease_expires_at timestamp NULL;
+-- Los workers solo reclaman productos planificados; create_alert ya los registra, esto cubre las alertas anteriores.
+INSERT INTO public.tracked_products (clean_url)
+SELECT DISTINCT clean_url FROM public.alerts
+ON CONFLICT (clean_url) DO NOTHING;
+
+-- public.products definition
+-- Diccionario clean_url -> id compacto para las tablas de histórico. Sus filas no se borran.
+CREATE TABLE IF NOT EXISTS public.products (
+    id bigserial NOT NULL,
+    clean_url text NOT NULL,
+    CONSTRAINT products_pkey PRIMARY KEY (id),
+    CONSTRAINT products_clean_url_key UNIQUE (clean_url)
+);
+
+-- public.price_history definition
+-- Histórico de precios en bruto, solo inserciones: una fila por observación, también en las
+-- páginas sin cambios (304 o mismo JSON-LD), que repiten el precio y stock anteriores.
+-- Particiones mensuales price_history_pYYYYMM, creadas al arrancar el bot o los workers y en el
+-- mantenimiento del checker (mes actual y siguiente);
+-- la partición por defecto solo recoge rezagados.
+CREATE TABLE IF NOT EXISTS public.price_history (
+    product_id int8 NOT NULL,
+    observed_at timestamp NOT NULL,
+    price float8 NULL,
+    in_stock bool NULL
+) PARTITION BY RANGE (observed_at);
+CREATE TABLE IF NOT EXISTS public.price_history_default PARTITION OF public.price_history DEFAULT;
+CREATE INDEX IF NOT EXISTS price_history_product_id_observed_at_idx ON public.price_history USING btree (product_id, observed_at);
+
+-- public.price_history_daily definition
+-- Resumen diario de las particiones que superan PRICE_HISTORY_RAW_RETENTION_DAYS.
+CREATE TABLE IF NOT EXISTS public.price_history_daily (
+    product_id int8 NOT NULL,
+    day date NOT NULL,
+    min_price float8 NULL,
+    max_price float8 NULL,
+    avg_price float8 NULL,
+    last_price float8 NULL,
+    samples int4 NOT NULL,
+    CONSTRAINT price_history_daily_pkey PRIMARY KEY (product_id, day)
+);
+
+-- public.telegram_file_ids definition
+-- file_id devuelto por Telegram la primera vez que se envió cada imagen, para no volver a subirla por URL.
+CREATE TABLE IF NOT EXISTS public.telegram_file_ids (
+    image_url text NOT NULL,
+    file_id text NOT NULL,
+    created_at timestamp DEFAULT now() NOT NULL,
+    CONSTRAINT telegram_file_ids_pkey PRIMARY KEY (image_url)
+);
+
+-- public.notification_outbox definition
+-- Notificaciones disparadas por el checker pendientes de enviar (NOTIFICATION_DELIVERY=outbox).
+-- Cada inserción emite NOTIFY alert_triggered; el notificador las reclama, las envía y las borra.
+CREATE TABLE IF NOT EXISTS public.notification_outbox (
+    id bigserial NOT NULL,
+    alert_id uuid NOT NULL,
+    chat_id int8 NOT NULL,
+    payload jsonb NOT NULL,
+    created_at timestamp DEFAULT now() NOT NULL,
+    claimed_until timestamp NULL,
+    CONSTRAINT notification_outbox_pkey PRIMARY KEY (id),
+    CONSTRAINT notification_outbox_alert_id_key UNIQUE (alert_id)
+);
+
+CREATE OR REPLACE FUNCTION public.notify_alert_triggered() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('alert_triggered', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS notification_outbox_notify ON public.notification_outbox;
+CREATE TRIGGER notification_outbox_notify
+    AFTER INSERT ON public.notification_outbox
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_alert_triggered();
@@ -1,115 +1,391 @@
 # tasks/checker.py
 import asyncio
 import logging
+import time
+from collections.abc import AsyncIterator
+from contextlib import aclosing
 from datetime import datetime, timedelta
 
+from telegram import Bot
 from telegram.ext import Application
-from telegram.constants import ParseMode
-from telegram.error import TelegramError
 
 import config
-from db import queries as db_queries
+import metrics
+from db import async_connection as db_async_connection
+from db import async_queries as db_queries
+from db.models import Alert
+from db.write_buffer import AlertWriteBuffer
 from scraper import core as scraper_core
-from bot import ui as bot_ui
+from scraper.models import ProductInfo
+from bot.notifier import NotificationDispatcher
+from bot.outbox import OutboxPublisher
+from . import scheduler
 
 logger = logging.getLogger(__name__)
 
-async def check_alerts_periodically(application: Application):
-    bot = application.bot
+# Evita bucles calientes si quedan productos vencidos (p. ej. tras un error al planificarlos).
+MIN_SLEEP_SECONDS = 5
+# Advisory lock del mantenimiento: con varios workers (y el bot) solo uno lo ejecuta a la vez.
+MAINTENANCE_LOCK_KEY = 0x70726963
+
+def _group_alerts_by_product(alerts: list[Alert]) -> dict[str, list[Alert]]:
+    """Agrupa las alertas por clean_url."""
+    alerts_by_url: dict[str, list[Alert]] = {}
+    for alert in alerts:
+        alerts_by_url.setdefault(alert.clean_url, []).append(alert)
+    return alerts_by_url
+
+def _split_cooldown(alerts: list[Alert]) -> tuple[list[Alert], float]:
+    """Separa las alertas activas de las que están en cooldown.
+
+    Devuelve las activas y los segundos que faltan para que termine el primer cooldown.
+    iter_due_alerts ya excluye el cooldown en SQL; esto cubre las listas pasadas a mano.
+    """
+    now_utc = datetime.utcnow()
+    cooldown = timedelta(hours=config.NOTIFY_COOLDOWN_HOURS)
+    active_alerts = []
+    seconds_until_ready = cooldown.total_seconds()
+    for alert in alerts:
+        last_notified_utc = alert.last_notified
+        if last_notified_utc and now_utc - last_notified_utc < cooldown:
+            logger.info(f"Saltando alerta ID {alert.id} (cooldown).")
+            seconds_until_ready = min(seconds_until_ready, (last_notified_utc + cooldown - now_utc).total_seconds())
+            continue
+        active_alerts.append(alert)
+    return active_alerts, seconds_until_ready
+
+async def _check_product(dispatcher: NotificationDispatcher, clean_url: str, alerts: list[Alert], cached_rows: dict[str, dict] | None, write_buffer: AlertWriteBuffer):
+    """Scrapea un producto una sola vez, reparte el resultado entre sus alertas y planifica su próxima revisión.
+
+    `cached_rows` es la caché precargada del ciclo; None si la precarga falló.
+    """
+    logger.debug(f"[Checker] Procesando {clean_url} para {len(alerts)} alerta(s)")
+    previous_interval = alerts[0].check_interval_seconds or config.CHECK_INTERVAL_SECONDS
+    active_alerts, seconds_until_ready = _split_cooldown(alerts)
+    if not active_alerts:
+        # Nada puede notificarse hasta que acabe el primer cooldown: no merece la pena scrapear antes.
+        await write_buffer.add_product_schedule(clean_url, max(seconds_until_ready, 60), previous_interval, None, False)
+        return
+
+    cached_row = cached_rows.get(clean_url) if cached_rows is not None else None
+    if cached_row is not None:
+        metrics.PRODUCT_INFO_LOOKUPS.labels("PREFETCH_HIT").inc()
+        product_info = scraper_core.product_info_from_cache(cached_row, active_alerts[0].full_url, clean_url)
+    else:
+        # Si la caché del ciclo ya se consultó en bloque, no se repite la consulta por producto.
+        product_info = await scraper_core.get_product_info(active_alerts[0].full_url, check_cache=cached_rows is None, allow_stale=False)
+    subscriber_count = alerts[0].subscriber_count or len(alerts)
+    if 0 < config.CHECKER_SQL_TRIGGER_MIN_SUBSCRIBERS <= subscriber_count:
+        await _evaluate_product_in_db(dispatcher, clean_url, product_info)
+    else:
+        for alert in active_alerts:
+            try:
+                await _evaluate_alert(dispatcher, alert, product_info, write_buffer)
+            except Exception as e:
+                logger.error(f"[Checker] Error evaluando alerta ID {alert.id}: {e}", exc_info=True)
+
+    current_price = product_info.price
+    product_last_price = alerts[0].product_last_price
+    price_changed = current_price is not None and product_last_price is not None and current_price != product_last_price
+    base_interval = scheduler.compute_base_interval(previous_interval, price_changed, current_price)
+    next_check_in = scheduler.compute_next_check_delay(
+        base_interval, current_price, [alert.target_price for alert in alerts], subscriber_count
+    )
+    logger.debug(f"[Checker] {clean_url}: próxima revisión en {next_check_in}s (base {base_interval}s, cambio de precio: {price_changed}).")
+    await write_buffer.add_product_schedule(clean_url, next_check_in, base_interval, current_price, price_changed)
+
+async def _evaluate_alert(dispatcher: NotificationDispatcher, alert: Alert, product_info: ProductInfo, write_buffer: AlertWriteBuffer):
+    """Evalúa una alerta frente al producto ya scrapeado y, si procede, notifica."""
+    current_price = product_info.price
+
+    if current_price is None:
+        logger.warning(f"No se pudo obtener precio para alerta ID {alert.id}. Estado: {product_info.status}")
+        await write_buffer.add_last_price(str(alert.id), None) # Marcar que falló
+        return
+
+    previous_last_price = alert.last_price
+    await write_buffer.add_last_price(str(alert.id), current_price)
+
+    notification_triggered = False
+    target_price = alert.target_price
+
+    if current_price <= target_price:
+        log_msg_notif_base = f"Alerta ID {alert.id}: Precio {current_price}€"
+        if previous_last_price is None:
+            notification_triggered = True
+            logger.info(f"{log_msg_notif_base} alcanza objetivo (sin precio anterior).")
+        elif current_price < previous_last_price:
+            notification_triggered = True
+            logger.info(f"{log_msg_notif_base} bajó de {previous_last_price}€.")
+        elif current_price == previous_last_price:
+            notification_triggered = True
+            logger.info(f"{log_msg_notif_base} sigue cumpliendo (igual que anterior), cooldown permite.")
+        else:
+            notification_triggered = True
+            logger.info(f"{log_msg_notif_base} (subió de {previous_last_price}€) pero sigue en objetivo, cooldown permite.")
+
+    if notification_triggered:
+        # Sin copias: la alerta aún tiene el precio anterior (el nuevo va al buffer) y el producto se
+        # comparte entre sus alertas. El envío (y last_notified) lo hace el notificador, fuera del ciclo.
+        if dispatcher.enqueue(alert, product_info):
+            logger.info(f"Notificación encolada para chat_id {alert.chat_id} por alerta ID {alert.id}.")
+        else:
+            logger.info(f"Alerta ID {alert.id}: ya hay una notificación pendiente de envío.")
+    else:
+        logger.info(f"Alerta ID {alert.id}: Precio {current_price}€ (Obj:{target_price}€, Prev:{previous_last_price}€). No requiere notificación.")
+
+async def _evaluate_product_in_db(dispatcher: NotificationDispatcher, clean_url: str, product_info: ProductInfo):
+    """Evalúa de una vez todas las alertas de un producto con muchos suscriptores: apply_observed_price
+    guarda el precio en todas y devuelve solo las que disparan (objetivo alcanzado y fuera de cooldown)."""
+    current_price = product_info.price
+    if current_price is None:
+        logger.warning(f"No se pudo obtener precio para {clean_url}. Estado: {product_info.status}")
+    try:
+        triggered_alerts = await db_queries.apply_observed_price(
+            clean_url, current_price, config.NOTIFY_COOLDOWN_HOURS * 3600
+        )
+    except Exception as e:
+        logger.error(f"[Checker] Error evaluando en la BD las alertas de {clean_url}: {e}", exc_info=True)
+        return
+    for alert in triggered_alerts:
+        # Como en _evaluate_alert, la alerta llega con el precio anterior.
+        if dispatcher.enqueue(alert, product_info):
+            logger.info(f"Alerta ID {alert.id}: Precio {current_price}€ alcanza objetivo {alert.target_price}€ (Prev: {alert.last_price}€). Notificación encolada.")
+        else:
+            logger.info(f"Alerta ID {alert.id}: ya hay una notificación pendiente de envío.")
+
+async def _checker_worker(worker_id: int, queue: asyncio.Queue, dispatcher: NotificationDispatcher, write_buffer: AlertWriteBuffer):
+    """Consume productos de la cola hasta que el ciclo cancela al worker."""
     while True:
-        logger.info(f"[Checker] Ejecutando ciclo a las {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        clean_url, alerts, cached_rows = await queue.get()
+        try:
+            await _check_product(dispatcher, clean_url, alerts, cached_rows, write_buffer)
+        except Exception as e:
+            logger.error(f"[Checker] Worker {worker_id}: error procesando {clean_url}: {e}", exc_info=True)
+            # Reintentar más tarde sin perder el intervalo aprendido
+            previous_interval = alerts[0].check_interval_seconds or config.CHECK_INTERVAL_SECONDS
+            await write_buffer.add_product_schedule(clean_url, config.SCHEDULE_MIN_INTERVAL_SECONDS, previous_interval, None, False)
+        finally:
+            queue.task_done()
+
+async def _iter_products(alerts_to_check: list[Alert | dict] | AsyncIterator[Alert]) -> AsyncIterator[tuple[str, list[Alert]]]:
+    """Agrupa las alertas por clean_url. Las que llegan en streaming vienen ya ordenadas por producto,
+    así que basta con cortar cada vez que cambia la URL. Las listas pueden traer dicts (filas de
+    get_all_alerts); se convierten a Alert."""
+    if isinstance(alerts_to_check, list):
+        alerts_list = [a if isinstance(a, Alert) else Alert.from_mapping(a) for a in alerts_to_check]
+        for clean_url, alerts in _group_alerts_by_product(alerts_list).items():
+            yield clean_url, alerts
+        return
+    current_url, current_alerts = None, []
+    async with aclosing(alerts_to_check):
+        async for alert in alerts_to_check:
+            if alert.clean_url != current_url and current_alerts:
+                yield current_url, current_alerts
+                current_alerts = []
+            current_url = alert.clean_url
+            current_alerts.append(alert)
+    if current_alerts:
+        yield current_url, current_alerts
+
+async def _enqueue_batch(queue: asyncio.Queue, batch: list[tuple[str, list[Alert]]]):
+    """Precarga en una consulta la caché de precios del lote y lo pasa a los workers."""
+    try:
+        cached_rows = await scraper_core.get_cached_rows([clean_url for clean_url, _ in batch])
+    except Exception as e:
+        logger.error(f"[Checker] Error precargando caché de precios: {e}", exc_info=True)
+        cached_rows = None
+    for clean_url, alerts in batch:
+        await queue.put((clean_url, alerts, cached_rows))
+
+def create_dispatcher(bot: Bot) -> NotificationDispatcher | OutboxPublisher:
+    """Notificador que registra last_notified en bloque por cada mensaje entregado.
+
+    Con NOTIFICATION_DELIVERY=outbox las alertas disparadas se publican en notification_outbox
+    y las envía el notificador (bot.outbox), no este proceso.
+    """
+    if config.NOTIFICATION_DELIVERY == "outbox":
+        return OutboxPublisher()
+    return NotificationDispatcher(bot, on_sent=db_queries.update_alerts_last_notified_bulk)
+
+async def run_check_cycle(bot: Bot, alerts_to_check: list[Alert | dict] | AsyncIterator[Alert],
+                          dispatcher: NotificationDispatcher | None = None) -> int:
+    """Procesa las alertas con un pool de `CHECKER_CONCURRENCY` workers sobre una cola acotada.
+
+    Cada producto (clean_url) se scrapea una única vez por ciclo, independientemente
+    del número de chats que lo sigan. `alerts_to_check` puede ser una lista o un flujo
+    ordenado por clean_url (iter_due_alerts); se consume por lotes de
+    CHECKER_PREFETCH_BATCH_SIZE productos, así la memoria no crece con la tabla.
+    Con un `dispatcher` de larga duración las notificaciones se envían en segundo plano;
+    sin él, el ciclo espera a entregarlas. Devuelve el número de productos procesados.
+    """
+    owns_dispatcher = dispatcher is None
+    if owns_dispatcher:
+        dispatcher = create_dispatcher(bot)
+
+    worker_count = max(1, config.CHECKER_CONCURRENCY)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=worker_count * 2)
+    write_buffer = AlertWriteBuffer(config.CHECKER_WRITE_BATCH_SIZE, config.CHECKER_WRITE_FLUSH_SECONDS)
+    workers = [asyncio.create_task(_checker_worker(i, queue, dispatcher, write_buffer)) for i in range(worker_count)]
+    batch_size = max(1, config.CHECKER_PREFETCH_BATCH_SIZE)
+    product_count = alert_count = 0
+    started_at = time.perf_counter()
+    try:
+        try:
+            batch = []
+            async with aclosing(_iter_products(alerts_to_check)) as products:
+                async for product in products:
+                    batch.append(product)
+                    if len(batch) >= batch_size:
+                        await _enqueue_batch(queue, batch)
+                        product_count += len(batch)
+                        alert_count += sum(len(alerts) for _, alerts in batch)
+                        batch = []
+            if batch:
+                await _enqueue_batch(queue, batch)
+                product_count += len(batch)
+                alert_count += sum(len(alerts) for _, alerts in batch)
+        except Exception as e:
+            # Lo ya encolado se procesa igualmente; el resto queda vencido para el próximo ciclo.
+            logger.error(f"[Checker] Error leyendo las alertas a revisar: {e}", exc_info=True)
+        await queue.join()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await write_buffer.flush()
+        # Un mensaje por chat con todo lo que ha disparado en este ciclo
+        await dispatcher.flush()
+        if owns_dispatcher:
+            await dispatcher.stop()
+    metrics.CHECKER_CYCLE_DURATION.observe(time.perf_counter() - started_at)
+    metrics.CHECKER_PRODUCTS_PROCESSED.inc(product_count)
+    metrics.CHECKER_ALERTS_PROCESSED.inc(alert_count)
+    if product_count:
+        logger.info(f"[Checker] {product_count} producto(s) distinto(s) y {alert_count} alerta(s) revisados.")
+    return product_count
+
+async def _seconds_until_next_wake() -> float:
+    """Duerme hasta el próximo producto planificado, sin pasar de CHECKER_MAX_SLEEP_SECONDS
+    para recoger a tiempo los productos nuevos que aún no tienen planificación."""
+    try:
+        seconds = await db_queries.get_seconds_until_next_check()
+    except Exception as e:
+        logger.error(f"[Checker] Error consultando la próxima revisión planificada: {e}", exc_info=True)
+        seconds = None
+    if seconds is None:
+        return config.CHECKER_MAX_SLEEP_SECONDS
+    return min(max(seconds, MIN_SLEEP_SECONDS), config.CHECKER_MAX_SLEEP_SECONDS)
+
+async def _run_maintenance():
+    try:
+        async with db_async_connection.try_advisory_lock(MAINTENANCE_LOCK_KEY) as locked:
+            if not locked:
+                logger.info("[Checker] Otro proceso está ejecutando el mantenimiento; se omite esta vez.")
+                return
+            await _run_maintenance_tasks()
+    except Exception as e:
+        logger.error(f"[Checker] Error durante el mantenimiento: {e}", exc_info=True)
+
+async def _run_maintenance_tasks():
+    try:
+        await db_queries.cleanup_old_scraped_prices()
+        await db_queries.cleanup_untracked_products()
+        await db_queries.cleanup_unused_telegram_file_ids()
+    except Exception as e:
+        logger.error(f"[Checker] Error durante limpieza de caché: {e}", exc_info=True)
+    try:
+        await db_queries.ensure_price_history_partitions()
+        await db_queries.downsample_price_history()
+    except Exception as e:
+        logger.error(f"[Checker] Error durante el mantenimiento del histórico de precios: {e}", exc_info=True)
+    logger.info(f"[Checker] Estadísticas de caché en memoria: {scraper_core.get_price_cache_stats()}")
+
+async def process_claimed_batch(bot: Bot, dispatcher: NotificationDispatcher, worker_id: str) -> int:
+    """Reclama un lote de productos vencidos, los revisa y libera los leases que queden.
+
+    Devuelve el número de productos reclamados (0 si no había trabajo).
+    """
+    clean_urls = await db_queries.claim_due_products(worker_id, config.CHECKER_CLAIM_BATCH_SIZE, config.CHECKER_LEASE_SECONDS)
+    if not clean_urls:
+        return 0
+    # Un lote lento (scraping con reintentos, host limitado) puede durar más que el lease: se
+    # prorroga el de lo que quede sin planificar para que otro worker no lo reclame a la vez.
+    renewer = asyncio.create_task(_renew_leases_periodically(worker_id))
+    try:
+        alerts = await db_queries.get_alerts_for_products(clean_urls)
+        await run_check_cycle(bot, alerts, dispatcher)
+    finally:
+        renewer.cancel()
+        await asyncio.gather(renewer, return_exceptions=True)
+        # Lo planificado ya soltó su lease al volcar el buffer; esto libera el resto (p. ej. si
+        # falló la escritura) para que otro worker lo recoja sin esperar a que caduque.
         try:
-            alerts_to_check = await asyncio.to_thread(db_queries.get_all_alerts)
+            await db_queries.release_product_leases(worker_id)
         except Exception as e:
-            logger.error(f"[Checker] Error obteniendo alertas de BD: {e}", exc_info=True)
-            await asyncio.sleep(config.CHECK_INTERVAL_SECONDS)
+            logger.error(f"[Checker] Error liberando leases de {worker_id}: {e}", exc_info=True)
+    return len(clean_urls)
+
+async def _renew_leases_periodically(worker_id: str):
+    """Prorroga los leases de `worker_id` cada tercio de CHECKER_LEASE_SECONDS hasta que se cancela."""
+    while True:
+        await asyncio.sleep(config.CHECKER_LEASE_SECONDS / 3)
+        try:
+            renewed = await db_queries.renew_product_leases(worker_id, config.CHECKER_LEASE_SECONDS)
+            logger.debug(f"[Checker] Worker {worker_id}: {renewed} lease(s) prorrogado(s).")
+        except Exception as e:
+            logger.error(f"[Checker] Error prorrogando leases de {worker_id}: {e}", exc_info=True)
+
+async def check_claimed_products_forever(bot: Bot, dispatcher: NotificationDispatcher, worker_id: str):
+    """Bucle de un worker del modo multi-proceso: encadena lotes mientras haya productos vencidos
+    y, si no, duerme hasta el siguiente. Varios workers pueden ejecutarlo a la vez."""
+    last_maintenance = None
+    while True:
+        now = time.monotonic()
+        if last_maintenance is None or now - last_maintenance >= config.CHECK_INTERVAL_SECONDS:
+            await _run_maintenance()
+            last_maintenance = now
+        try:
+            claimed = await process_claimed_batch(bot, dispatcher, worker_id)
+        except Exception as e:
+            logger.error(f"[Checker] Worker {worker_id}: error procesando un lote: {e}", exc_info=True)
+            claimed = 0
+        if claimed:
             continue
+        sleep_seconds = await _seconds_until_next_wake()
+        logger.info(f"[Checker] Worker {worker_id}: sin productos vencidos. Durmiendo por {sleep_seconds:.0f}s.")
+        await asyncio.sleep(sleep_seconds)
 
-        if not alerts_to_check:
-            logger.info("[Checker] No hay alertas activas.")
-        else:
-            logger.info(f"[Checker] Verificando {len(alerts_to_check)} alerta(s).")
-
-        for i, alert_data in enumerate(alerts_to_check):
-            logger.debug(f"[Checker] Procesando alerta ID {alert_data['id']} para URL: {alert_data['clean_url']}")
-            if i > 0: await asyncio.sleep(1)
-
-            now_utc = datetime.utcnow()
-            last_notified_utc = alert_data.get('last_notified')
-
-            if last_notified_utc and now_utc - last_notified_utc < timedelta(hours=config.NOTIFY_COOLDOWN_HOURS):
-                logger.info(f"Saltando alerta ID {alert_data['id']} (cooldown).")
-                continue
-            
-            product_info = await scraper_core.get_product_info(alert_data['full_url'])
-            current_price = product_info.get("price")
-
-            if current_price is None:
-                logger.warning(f"No se pudo obtener precio para alerta ID {alert_data['id']}. Estado: {product_info.get('status')}")
-                await asyncio.to_thread(db_queries.update_alert_last_price, str(alert_data['id']), None) # Marcar que falló
-                continue
-
-            previous_last_price = alert_data.get('last_price')
-            await asyncio.to_thread(db_queries.update_alert_last_price, str(alert_data['id']), current_price)
-            
-            notification_triggered = False
-            target_price = alert_data['target_price']
-
-            if current_price <= target_price:
-                log_msg_notif_base = f"Alerta ID {alert_data['id']}: Precio {current_price}€"
-                if previous_last_price is None:
-                    notification_triggered = True
-                    logger.info(f"{log_msg_notif_base} alcanza objetivo (sin precio anterior).")
-                elif current_price < previous_last_price:
-                    notification_triggered = True
-                    logger.info(f"{log_msg_notif_base} bajó de {previous_last_price}€.")
-                elif current_price == previous_last_price:
-                    notification_triggered = True
-                    logger.info(f"{log_msg_notif_base} sigue cumpliendo (igual que anterior), cooldown permite.")
-                else: 
-                    notification_triggered = True
-                    logger.info(f"{log_msg_notif_base} (subió de {previous_last_price}€) pero sigue en objetivo, cooldown permite.")
-            
-            if notification_triggered:
-                alert_data_for_msg = alert_data.copy()
-                alert_data_for_msg['last_price'] = previous_last_price 
-                
-                # Obtener texto, teclado y URL de imagen para la notificación
-                message_text, inline_keyboard, image_url = bot_ui.format_notification_content(alert_data_for_msg, product_info)
-                
-                try:
-                    if image_url: # Si hay URL de imagen, enviar como foto con caption
-                        await bot.send_photo(
-                            chat_id=alert_data['chat_id'],
-                            photo=image_url,
-                            caption=message_text,
-                            parse_mode=ParseMode.MARKDOWN,
-                            reply_markup=inline_keyboard
-                        )
-                    else: # Si no hay imagen, enviar como mensaje de texto
-                        await bot.send_message(
-                            chat_id=alert_data['chat_id'],
-                            text=message_text,
-                            parse_mode=ParseMode.MARKDOWN,
-                            reply_markup=inline_keyboard
-                        )
-                    
-                    await asyncio.to_thread(db_queries.update_alert_last_notified, str(alert_data['id']))
-                    logger.info(f"Notificación enviada a chat_id {alert_data['chat_id']} por alerta ID {alert_data['id']}.")
-                except TelegramError as e: # Capturar errores específicos de Telegram
-                    logger.error(f"Error Telegram al enviar notificación a {alert_data['chat_id']} (alerta {alert_data['id']}): {e}")
-                    if "bot was blocked by the user" in str(e).lower() or "chat not found" in str(e).lower():
-                        logger.warning(f"Bot bloqueado o chat no encontrado para {alert_data['chat_id']}. Considerar eliminar/desactivar alertas.")
-                        # Aquí podrías añadir lógica para eliminar/desactivar alertas para este chat_id
-                except Exception as e: # Otros errores
-                    logger.error(f"Error general al enviar notificación a {alert_data['chat_id']} (alerta {alert_data['id']}): {e}", exc_info=True)
-            else:
-                logger.info(f"Alerta ID {alert_data['id']}: Precio {current_price}€ (Obj:{target_price}€, Prev:{previous_last_price}€). No requiere notificación.")
-        
+async def check_alerts_periodically(application: Application):
+    bot = application.bot
+    dispatcher = create_dispatcher(bot)
+    dispatcher.start()
+    try:
+        await _check_alerts_forever(bot, dispatcher)
+    finally:
+        await dispatcher.stop(timeout=config.NOTIFY_SHUTDOWN_TIMEOUT_SECONDS)
+
+async def _check_alerts_forever(bot: Bot, dispatcher: NotificationDispatcher):
+    last_maintenance = None
+    while True:
+        logger.info(f"[Checker] Ejecutando ciclo a las {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         try:
-            await asyncio.to_thread(db_queries.cleanup_old_scraped_prices)
+            await db_queries.reschedule_products_in_cooldown()
         except Exception as e:
-            logger.error(f"[Checker] Error durante limpieza de caché: {e}", exc_info=True)
+            logger.error(f"[Checker] Error aplazando productos en cooldown: {e}", exc_info=True)
+
+        # El conjunto de trabajo (productos vencidos, alertas fuera de cooldown) lo calcula la BD
+        # y llega por páginas de productos, cada una en una consulta corta.
+        product_count = await run_check_cycle(bot, db_queries.iter_due_alerts(), dispatcher)
+        if not product_count:
+            logger.info("[Checker] No hay productos pendientes de revisión.")
+
+        # La limpieza no necesita acompañar a cada despertar del planificador.
+        now = time.monotonic()
+        if last_maintenance is None or now - last_maintenance >= config.CHECK_INTERVAL_SECONDS:
+            await _run_maintenance()
+            last_maintenance = now
 
-        logger.info(f"[Checker] Ciclo completado. Durmiendo por {config.CHECK_INTERVAL_SECONDS}s.")
-        await asyncio.sleep(config.CHECK_INTERVAL_SECONDS)
+        sleep_seconds = await _seconds_until_next_wake()
+        logger.info(f"[Checker] Ciclo completado. Durmiendo por {sleep_seconds:.0f}s.")
+        await asyncio.sleep(sleep_seconds)
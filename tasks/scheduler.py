@@ -0,0 +1,54 @@
+# tasks/scheduler.py
+import math
+import logging
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Por debajo de este margen relativo sobre el objetivo se revisa con la frecuencia máxima.
+NEAR_TARGET_RATIO = 0.05
+CLOSE_TARGET_RATIO = 0.15
+
+
+def _clamp(interval: float) -> int:
+    min_interval = config.SCHEDULE_MIN_INTERVAL_SECONDS
+    max_interval = max(min_interval, config.SCHEDULE_MAX_INTERVAL_SECONDS)
+    return int(min(max(interval, min_interval), max_interval))
+
+
+def compute_base_interval(previous_interval: int | None, price_changed: bool, current_price: float | None) -> int:
+    """Intervalo base de un producto según su volatilidad; es el que se guarda en check_interval_seconds.
+
+    Si el precio cambió se reduce a la mitad y si no, crece un 50%. Un scrape fallido no
+    aporta información y lo deja igual. Queda entre SCHEDULE_MIN_INTERVAL_SECONDS y
+    SCHEDULE_MAX_INTERVAL_SECONDS.
+    """
+    interval = float(previous_interval or config.CHECK_INTERVAL_SECONDS)
+    if current_price is not None:
+        interval = interval / 2 if price_changed else interval * 1.5
+    return _clamp(interval)
+
+
+def compute_next_check_delay(base_interval: int, current_price: float | None,
+                             target_prices: list[float], subscriber_count: int) -> int:
+    """Segundos hasta la próxima revisión (next_check_at) a partir del intervalo base.
+
+    - Cercanía al objetivo: cerca del objetivo más alto de sus alertas se revisa más a menudo.
+    - Suscriptores: los productos seguidos por muchos chats se revisan antes.
+    Estos factores no se guardan en el intervalo base; si no, se acumularían ciclo tras ciclo.
+    """
+    if current_price is None:
+        return _clamp(base_interval)
+
+    interval = float(base_interval)
+    if target_prices:
+        nearest_target = max(target_prices)
+        gap_ratio = (current_price - nearest_target) / nearest_target if nearest_target > 0 else 0.0
+        if gap_ratio <= NEAR_TARGET_RATIO:
+            interval = min(interval, config.SCHEDULE_MIN_INTERVAL_SECONDS * 2)
+        elif gap_ratio <= CLOSE_TARGET_RATIO:
+            interval *= 0.75
+
+    interval /= 1 + math.log10(max(1, subscriber_count))
+    return _clamp(interval)
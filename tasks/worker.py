@@ -0,0 +1,76 @@
+# tasks/worker.py
+"""Worker del checker en un proceso propio, sin el polling de Telegram:
+
+    python -m tasks.worker
+
+Se pueden lanzar tantos como se quiera (en uno o varios hosts): cada uno reclama lotes de
+productos con leases en tracked_products. El proceso del bot debe arrancarse con
+RUN_CHECKER_IN_BOT=false para que no revise también por su cuenta.
+"""
+import asyncio
+import logging
+import os
+import socket
+
+from telegram import Bot
+
+import config
+import metrics
+from db import async_connection as db_async_connection
+from db import async_queries as db_queries
+from db import connection as db_connection
+from scraper import core as scraper_core
+from . import checker
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id() -> str:
+    return config.CHECKER_WORKER_ID or f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def run_worker(worker_id: str | None = None):
+    worker_id = worker_id or default_worker_id()
+    try:
+        await db_async_connection.open_async_pool()
+    except Exception as e:
+        logger.critical(f"Fallo crítico al conectar con la BD en el worker {worker_id}: {e}", exc_info=True)
+        return
+    # Las particiones del histórico deben existir antes de la primera escritura del checker.
+    await db_queries.ensure_price_history_partitions()
+    try:
+        metrics.start_metrics_server()
+    except OSError as e:
+        logger.error(f"No se pudo abrir el endpoint de métricas en el puerto {config.METRICS_PORT}: {e}")
+
+    logger.info(f"Worker del checker {worker_id} iniciado.")
+    try:
+        async with Bot(config.TELEGRAM_TOKEN) as bot:
+            dispatcher = checker.create_dispatcher(bot)
+            dispatcher.start()
+            try:
+                await checker.check_claimed_products_forever(bot, dispatcher, worker_id)
+            finally:
+                await dispatcher.stop(timeout=config.NOTIFY_SHUTDOWN_TIMEOUT_SECONDS)
+    finally:
+        scraper_core.shutdown_parse_executor()
+        await scraper_core.close_http_client()
+        await db_async_connection.close_async_pool()
+        db_connection.close_db_connection()
+        logger.info(f"Worker del checker {worker_id} detenido.")
+
+
+def main():
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - [%(module)s:%(lineno)d] - %(message)s',
+        level=config.LOGGING_LEVEL
+    )
+    logging.getLogger("httpx").setLevel(config.LOGGING_HTTPX_LEVEL)
+    try:
+        asyncio.run(run_worker())
+    except KeyboardInterrupt:
+        logger.info("Worker interrumpido (Ctrl+C).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+# tests/test_benchmarks_run.py
+from benchmarks import run
+
+
+def test_compare_flags_only_regressions_beyond_tolerance():
+    baseline = {"results": {"a": {"median_s": 1.0}, "b": {"median_s": 1.0}, "gone": {"median_s": 1.0}}}
+    current = {"results": {"a": {"median_s": 1.1}, "b": {"median_s": 1.3}, "new": {"median_s": 5.0}}}
+
+    rows = {row["name"]: row for row in run.compare(current, baseline, tolerance=0.15)}
+
+    assert set(rows) == {"a", "b"}
+    assert not rows["a"]["regression"]
+    assert rows["b"]["regression"]
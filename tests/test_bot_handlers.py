@@ -0,0 +1,40 @@
+# tests/test_bot_handlers.py
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+import pytest
+from bot import handlers
+
+@pytest.mark.asyncio
+@patch('bot.handlers.config.ALERTS_PAGE_SIZE', 2)
+@patch('bot.handlers.db_queries.get_user_alerts_page', new_callable=AsyncMock)
+async def test_render_alerts_page_links_next_page_by_keyset(mock_get_page):
+    inserted_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    mock_get_page.return_value = ([
+        {"id": "00000000-0000-0000-0000-000000000002", "full_url": "https://a/2", "target_price": 5.0, "last_price": None, "inserted_at": inserted_at},
+        {"id": "00000000-0000-0000-0000-000000000001", "full_url": "https://a/1", "target_price": 5.0, "last_price": None, "inserted_at": inserted_at},
+    ], True)
+
+    text, markup = await handlers.render_alerts_page(42)
+
+    next_button = markup.inline_keyboard[-1][0]
+    assert len(next_button.callback_data.encode()) <= 64
+    start_index, cursor = handlers._decode_page_callback(next_button.callback_data)
+    assert start_index == 2
+    assert cursor == (inserted_at, "00000000000000000000000000000001")
+    mock_get_page.assert_awaited_once_with(42, 2, after=None, before=None)
+
+@pytest.mark.asyncio
+@patch('bot.handlers.db_queries', new_callable=AsyncMock)
+async def test_delete_by_number_resolves_position_in_db(mock_db_queries):
+    mock_db_queries.get_user_alert_id_at.return_value = "abc"
+    mock_db_queries.delete_alert_by_id.return_value = True
+    update = MagicMock()
+    update.effective_chat.id = 42
+    update.message.reply_text = AsyncMock()
+    context = MagicMock(args=["3"])
+
+    await handlers.delete_alert_by_number_command(update, context)
+
+    mock_db_queries.get_user_alert_id_at.assert_awaited_once_with(42, 3)
+    mock_db_queries.delete_alert_by_id.assert_awaited_once_with("abc", 42)
+    mock_db_queries.get_user_alerts.assert_not_awaited()
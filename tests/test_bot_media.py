@@ -0,0 +1,74 @@
+# tests/test_bot_media.py
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+import pytest
+from telegram.error import BadRequest, TelegramError
+from bot import media
+
+@pytest.fixture(autouse=True)
+def clear_file_ids():
+    media._file_ids.clear()
+    yield
+    media._file_ids.clear()
+
+def _photo_message(file_id):
+    return SimpleNamespace(photo=[SimpleNamespace(file_id="small"), SimpleNamespace(file_id=file_id)])
+
+@pytest.mark.asyncio
+@patch('bot.media.db_queries', new_callable=AsyncMock)
+async def test_send_photo_cached_reuses_file_id_after_first_upload(mock_db_queries):
+    mock_db_queries.get_telegram_file_id.return_value = None
+    bot = AsyncMock()
+    bot.send_photo.return_value = _photo_message("FILE1")
+
+    await media.send_photo_cached(bot, 1, "https://img/x.jpg", caption="a")
+    await media.send_photo_cached(bot, 2, "https://img/x.jpg", caption="b")
+
+    photos = [c.kwargs["photo"] for c in bot.send_photo.await_args_list]
+    assert photos == ["https://img/x.jpg", "FILE1"]
+    mock_db_queries.save_telegram_file_id.assert_awaited_once_with("https://img/x.jpg", "FILE1")
+
+@pytest.mark.asyncio
+@patch('bot.media.db_queries', new_callable=AsyncMock)
+async def test_send_photo_cached_falls_back_to_url_when_file_id_is_rejected(mock_db_queries):
+    mock_db_queries.get_telegram_file_id.return_value = "STALE"
+    bot = AsyncMock()
+    bot.send_photo.side_effect = [BadRequest("Wrong file identifier/http url specified"), _photo_message("FILE2")]
+
+    await media.send_photo_cached(bot, 1, "https://img/x.jpg")
+
+    assert bot.send_photo.await_args_list[1].kwargs["photo"] == "https://img/x.jpg"
+    mock_db_queries.delete_telegram_file_id.assert_awaited_once_with("https://img/x.jpg")
+    assert media._file_ids["https://img/x.jpg"] == "FILE2"
+
+@pytest.mark.asyncio
+@patch('bot.media.db_queries', new_callable=AsyncMock)
+async def test_send_photo_cached_keeps_one_upload_lock_while_others_wait(mock_db_queries):
+    mock_db_queries.get_telegram_file_id.return_value = None
+    uploads = {"active": 0, "max_active": 0, "by_url": 0}
+
+    async def send_photo(chat_id, photo, **kwargs):
+        if photo == "FILE1":
+            return _photo_message("FILE1")
+        uploads["by_url"] += 1
+        uploads["active"] += 1
+        uploads["max_active"] = max(uploads["max_active"], uploads["active"])
+        await asyncio.sleep(0.01)
+        uploads["active"] -= 1
+        if uploads["by_url"] == 1:
+            raise TelegramError("timeout")
+        return _photo_message("FILE1")
+
+    bot = AsyncMock()
+    bot.send_photo.side_effect = send_photo
+    first = asyncio.create_task(media.send_photo_cached(bot, 1, "https://img/x.jpg"))
+    waiting = asyncio.create_task(media.send_photo_cached(bot, 2, "https://img/x.jpg"))
+    await asyncio.gather(first, return_exceptions=True)
+    # Llega cuando la primera subida ya ha fallado y la segunda está en curso o a punto de empezar.
+    late = asyncio.create_task(media.send_photo_cached(bot, 3, "https://img/x.jpg"))
+    await asyncio.gather(waiting, late)
+
+    assert uploads["max_active"] == 1
+    assert uploads["by_url"] == 2
+    assert media._upload_locks == {}
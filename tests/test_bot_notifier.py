@@ -0,0 +1,58 @@
+# tests/test_bot_notifier.py
+from unittest.mock import AsyncMock
+import pytest
+from telegram.error import RetryAfter
+from bot.notifier import NotificationDispatcher
+
+def _alert(alert_id, chat_id):
+    return {"id": alert_id, "chat_id": chat_id, "full_url": f"https://example.com/{alert_id}",
+            "target_price": 50.0, "last_price": None}
+
+@pytest.mark.asyncio
+async def test_dispatcher_sends_one_digest_per_chat():
+    bot = AsyncMock()
+    on_sent = AsyncMock()
+    dispatcher = NotificationDispatcher(bot, on_sent=on_sent, global_rate=1000, per_chat_rate=1000)
+
+    for alert_id in (1, 2, 3):
+        assert dispatcher.enqueue(_alert(alert_id, chat_id=7), {"price": 40.0, "name": f"P{alert_id}"})
+    assert not dispatcher.enqueue(_alert(1, chat_id=7), {"price": 40.0})
+    dispatcher.enqueue(_alert(4, chat_id=8), {"price": 40.0, "name": "P4"})
+    await dispatcher.stop()
+
+    assert bot.send_message.await_count == 2
+    digest_kwargs = next(c.kwargs for c in bot.send_message.await_args_list if c.kwargs["chat_id"] == 7)
+    assert "3 alertas" in digest_kwargs["text"]
+    on_sent.assert_any_await(["1", "2", "3"])
+    on_sent.assert_any_await(["4"])
+
+@pytest.mark.asyncio
+async def test_dispatcher_retries_after_flood_control():
+    bot = AsyncMock()
+    bot.send_message.side_effect = [RetryAfter(0), None]
+    on_sent = AsyncMock()
+    dispatcher = NotificationDispatcher(bot, on_sent=on_sent, global_rate=1000, per_chat_rate=1000)
+
+    dispatcher.enqueue(_alert(1, chat_id=7), {"price": 40.0})
+    await dispatcher.stop(timeout=5)
+
+    assert bot.send_message.await_count == 2
+    on_sent.assert_awaited_once_with(["1"])
+
+@pytest.mark.asyncio
+async def test_dispatcher_keeps_alert_pending_until_last_notified_is_saved():
+    bot = AsyncMock()
+    dispatcher = NotificationDispatcher(bot, global_rate=1000, per_chat_rate=1000)
+    enqueued_while_saving = []
+
+    async def on_sent(alert_ids):
+        # Mientras se guarda last_notified, la misma alerta no puede volver a encolarse.
+        enqueued_while_saving.append(dispatcher.enqueue(_alert(1, chat_id=7), {"price": 40.0}))
+    dispatcher.on_sent = on_sent
+
+    dispatcher.enqueue(_alert(1, chat_id=7), {"price": 40.0})
+    await dispatcher.stop(timeout=5)
+
+    assert enqueued_while_saving == [False]
+    assert bot.send_message.await_count == 1
+    assert dispatcher.enqueue(_alert(1, chat_id=7), {"price": 40.0})
@@ -0,0 +1,77 @@
+# tests/test_bot_outbox.py
+import json
+from unittest.mock import AsyncMock, patch
+import pytest
+from db.models import Alert
+from scraper.models import ProductInfo
+from bot.notifier import NotificationDispatcher
+from bot.outbox import OutboxNotifier, OutboxPublisher, encode_payload
+
+def _alert(alert_id, chat_id):
+    return Alert(id=alert_id, chat_id=chat_id, full_url=f"https://example.com/p?ref={alert_id}",
+                 clean_url="https://example.com/p", target_price=50.0)
+
+@pytest.mark.asyncio
+@patch('bot.outbox.db_queries.enqueue_outbox_notifications', new_callable=AsyncMock, return_value=2)
+async def test_publisher_writes_each_alert_once_on_flush(mock_enqueue):
+    publisher = OutboxPublisher()
+    product_info = ProductInfo(price=40.0, name="Producto", status="SCRAPED_SUCCESS")
+
+    assert publisher.enqueue(_alert("a1", 7), product_info)
+    assert not publisher.enqueue(_alert("a1", 7), product_info)
+    assert publisher.enqueue(_alert("a2", 8), product_info)
+    mock_enqueue.assert_not_awaited()
+    await publisher.flush()
+
+    rows = mock_enqueue.await_args.args[0]
+    assert [(alert_id, chat_id) for alert_id, chat_id, _ in rows] == [("a1", 7), ("a2", 8)]
+    assert json.loads(rows[0][2])["product"]["price"] == 40.0
+    assert publisher.pending == 0
+
+@pytest.mark.asyncio
+@patch('bot.outbox.db_queries.delete_outbox_notifications', new_callable=AsyncMock)
+@patch('bot.outbox.db_queries.claim_outbox_notifications', new_callable=AsyncMock)
+async def test_notifier_sends_claimed_notifications_and_deletes_them(mock_claim, mock_delete):
+    product_info = ProductInfo(price=40.0, name="Producto", status="SCRAPED_SUCCESS")
+    payloads = [json.loads(encode_payload(_alert(alert_id, 7), product_info)) for alert_id in ("a1", "a2")]
+    mock_claim.side_effect = [[{"id": 1, "payload": payloads[0]}, {"id": 2, "payload": payloads[1]}], []]
+    bot = AsyncMock()
+    on_sent = AsyncMock()
+    notifier = OutboxNotifier(bot, NotificationDispatcher(bot, on_sent=on_sent, global_rate=1000, per_chat_rate=1000))
+
+    assert await notifier.drain_once() == 2
+    assert await notifier.drain_once() == 0
+    await notifier.dispatcher.stop()
+
+    # Las dos alertas del mismo chat llegan en un único resumen.
+    bot.send_message.assert_awaited_once()
+    on_sent.assert_awaited_once_with(["a1", "a2"])
+    mock_delete.assert_awaited_once_with([1, 2])
+
+@pytest.mark.asyncio
+@patch('bot.outbox.config.OUTBOX_LEASE_SECONDS', 0.03)
+@patch('bot.outbox.db_queries.renew_outbox_claims', new_callable=AsyncMock, return_value=1)
+@patch('bot.outbox.db_queries.delete_outbox_notifications', new_callable=AsyncMock)
+@patch('bot.outbox.db_queries.claim_outbox_notifications', new_callable=AsyncMock)
+async def test_notifier_renews_claims_while_a_slow_send_is_in_flight(mock_claim, mock_delete, mock_renew):
+    import asyncio
+
+    product_info = ProductInfo(price=40.0, name="Producto", status="SCRAPED_SUCCESS")
+    mock_claim.return_value = [{"id": 1, "payload": json.loads(encode_payload(_alert("a1", 7), product_info))}]
+    bot = AsyncMock()
+
+    async def slow_send(**kwargs):
+        await asyncio.sleep(0.1)
+
+    bot.send_message.side_effect = slow_send
+    notifier = OutboxNotifier(bot, NotificationDispatcher(bot, global_rate=1000, per_chat_rate=1000))
+
+    assert await notifier.drain_once() == 1
+    renewals = mock_renew.await_count
+    await asyncio.sleep(0.05)
+    await notifier.dispatcher.stop()
+
+    assert renewals >= 2
+    mock_renew.assert_awaited_with([1], 0.03)
+    assert mock_renew.await_count == renewals
+    mock_delete.assert_awaited_once_with([1])
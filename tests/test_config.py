@@ -8,3 +8,16 @@ def test_logging_levels():
 def test_environment_variables():
     assert isinstance(config.CHECK_INTERVAL_SECONDS, int)
     assert isinstance(config.NOTIFY_COOLDOWN_HOURS, float)
+
+def test_per_host_limits_follow_checker_concurrency(monkeypatch):
+    import importlib
+    monkeypatch.setenv("CHECKER_CONCURRENCY", "8")
+    monkeypatch.delenv("SCRAPER_PER_HOST_CONCURRENCY", raising=False)
+    monkeypatch.delenv("SCRAPER_PER_HOST_DELAY_SECONDS", raising=False)
+    try:
+        reloaded = importlib.reload(config)
+        assert reloaded.SCRAPER_PER_HOST_CONCURRENCY == 8
+        assert reloaded.SCRAPER_PER_HOST_DELAY_SECONDS == 0
+    finally:
+        monkeypatch.undo()
+        importlib.reload(config)
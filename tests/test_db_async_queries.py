@@ -0,0 +1,89 @@
+# tests/test_db_async_queries.py
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+import pytest
+from db import async_queries
+
+def _fake_connection(cursor):
+    conn = MagicMock()
+    conn.cursor.return_value.__aenter__.return_value = cursor
+
+    @asynccontextmanager
+    async def fake_get_async_db_connection():
+        yield conn
+    return fake_get_async_db_connection
+
+@pytest.mark.asyncio
+async def test_get_alert_by_chat_and_clean_url_async():
+    cursor = AsyncMock()
+    cursor.fetchone.return_value = {"id": "123", "chat_id": 1, "clean_url": "https://example.com"}
+
+    with patch("db.async_queries.get_async_db_connection", _fake_connection(cursor)):
+        result = await async_queries.get_alert_by_chat_and_clean_url(1, "https://example.com")
+
+    assert result == {"id": "123", "chat_id": 1, "clean_url": "https://example.com"}
+    cursor.execute.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_iter_due_alerts_pages_by_clean_url_key():
+    from db.models import Alert
+
+    def alert(alert_id, clean_url):
+        return Alert(id=alert_id, chat_id=1, full_url=clean_url, clean_url=clean_url, target_price=10.0)
+
+    seen_after = []
+    cursor = AsyncMock()
+    cursor.execute.side_effect = lambda sql, params: seen_after.append(params['after'])
+    cursor.fetchall.side_effect = [
+        [alert("1", "https://a"), alert("2", "https://a"), alert("3", "https://b")],
+        [alert("4", "https://c")],
+    ]
+
+    with patch("db.async_queries.get_async_db_connection", _fake_connection(cursor)):
+        alerts = [a async for a in async_queries.iter_due_alerts(page_size=2)]
+
+    assert [a.id for a in alerts] == ["1", "2", "3", "4"]
+    # Una consulta corta por página; la segunda, incompleta, termina el recorrido.
+    assert seen_after == ["", "https://b"]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("call", [
+    lambda: async_queries.update_alert_last_price("00000000-0000-0000-0000-000000000001", 10.0),
+    lambda: async_queries.update_alerts_last_price_bulk([("00000000-0000-0000-0000-000000000001", 10.0)]),
+    # Camino SQL del checker para productos con muchos suscriptores: mismo comportamiento.
+    lambda: async_queries.apply_observed_price("https://example.com/p", 10.0, 3600),
+])
+async def test_price_writers_do_not_move_alerts_in_the_list(call):
+    cursor = AsyncMock()
+    cursor.fetchall.return_value = []
+
+    with patch("db.async_queries.get_async_db_connection", _fake_connection(cursor)):
+        await call()
+
+    # inserted_at es la clave de paginación de /alerts: guardar un precio no debe reordenar la lista.
+    assert "inserted_at" not in cursor.execute.await_args.args[0]
+
+@pytest.mark.asyncio
+async def test_ensure_price_history_partitions_moves_default_rows_and_isolates_months():
+    statements = []
+
+    async def execute(sql, params=None):
+        statements.append(" ".join(sql.split()))
+        if sql.startswith("SELECT to_regclass") and len(statements) == 1:
+            raise RuntimeError("lock timeout")
+
+    cursor = AsyncMock()
+    cursor.execute.side_effect = execute
+    cursor.fetchone.return_value = {"present": False}
+    cursor.rowcount = 3
+
+    with patch("db.async_queries.get_async_db_connection", _fake_connection(cursor)):
+        created = await async_queries.ensure_price_history_partitions(months_ahead=1)
+
+    # El fallo del primer mes no impide crear el siguiente, con sus filas sacadas de la partición por defecto.
+    assert created == 1
+    assert statements[1].startswith("SELECT to_regclass")
+    assert statements[2].startswith("LOCK TABLE price_history_default")
+    assert statements[3].startswith("CREATE TABLE price_history_p")
+    assert "DELETE FROM price_history_default" in statements[4]
+    assert statements[5].startswith("ALTER TABLE price_history ATTACH PARTITION")
@@ -0,0 +1,20 @@
+# tests/test_db_connection.py
+from unittest.mock import MagicMock, patch, call
+from db import connection as db_connection
+
+@patch("db.connection.ThreadedConnectionPool")
+def test_get_db_connection_replaces_broken_connection(mock_pool_cls):
+    broken_conn = MagicMock(closed=1)
+    healthy_conn = MagicMock(closed=0, autocommit=True)
+    healthy_conn.get_transaction_status.return_value = 0
+    mock_pool = mock_pool_cls.return_value
+    mock_pool.closed = False
+    mock_pool.getconn.side_effect = [broken_conn, healthy_conn]
+
+    try:
+        with db_connection.get_db_connection() as conn:
+            assert conn is healthy_conn
+    finally:
+        db_connection.close_db_connection()
+
+    assert mock_pool.putconn.call_args_list == [call(broken_conn, close=True), call(healthy_conn, close=False)]
@@ -0,0 +1,20 @@
+# tests/test_db_write_buffer.py
+from unittest.mock import AsyncMock, patch
+import pytest
+from db.write_buffer import AlertWriteBuffer
+
+@pytest.mark.asyncio
+@patch('db.write_buffer.db_queries', new_callable=AsyncMock)
+async def test_write_buffer_flushes_in_batches(mock_db_queries):
+    write_buffer = AlertWriteBuffer(batch_size=3, flush_interval_seconds=3600)
+
+    for i in range(7):
+        await write_buffer.add_last_price(f"alert-{i}", float(i))
+    assert mock_db_queries.update_alerts_last_price_bulk.await_count == 2
+
+    await write_buffer.add_product_schedule("https://example.com/p", 3600, 3600, 6.0, False)
+    await write_buffer.flush()
+
+    assert mock_db_queries.update_alerts_last_price_bulk.await_count == 3
+    mock_db_queries.upsert_product_schedules.assert_awaited_once()
+    assert write_buffer.pending == 0
@@ -0,0 +1,76 @@
+# tests/test_metrics.py
+import types
+
+import pytest
+from prometheus_client import REGISTRY
+
+import metrics
+
+
+def _sample(name: str, function: str) -> float:
+    return REGISTRY.get_sample_value(name, {"function": function}) or 0.0
+
+
+@pytest.mark.asyncio
+async def test_instrument_queries_wraps_public_functions_only():
+    module = types.ModuleType("fake_queries")
+    exec(
+        "async def fetch_thing():\n    return 1\n"
+        "def fail_thing():\n    raise RuntimeError('boom')\n"
+        "async def stream_things():\n    yield 1\n    yield 2\n"
+        "def _helper():\n    return 2\n",
+        module.__dict__,
+    )
+    helper = module._helper
+    count_before = _sample("db_query_duration_seconds_count", "fetch_thing")
+
+    metrics.instrument_queries(module)
+
+    assert await module.fetch_thing() == 1
+    assert _sample("db_query_duration_seconds_count", "fetch_thing") == count_before + 1
+    with pytest.raises(RuntimeError):
+        module.fail_thing()
+    assert _sample("db_query_errors_total", "fail_thing") >= 1
+    assert [item async for item in module.stream_things()] == [1, 2]
+    assert module._helper is helper
+
+
+@pytest.mark.asyncio
+async def test_instrumented_stream_closes_inner_generator_early():
+    module = types.ModuleType("fake_stream_queries")
+    module.closed = False
+    exec(
+        "async def iter_rows():\n"
+        "    global closed\n"
+        "    try:\n        for i in range(10):\n            yield i\n"
+        "    finally:\n        closed = True\n",
+        module.__dict__,
+    )
+    metrics.instrument_queries(module)
+
+    rows = module.iter_rows()
+    assert await rows.__anext__() == 0
+    await rows.aclose()
+
+    assert module.closed
+
+
+@pytest.mark.asyncio
+async def test_instrumented_stream_excludes_consumer_time():
+    import asyncio
+
+    module = types.ModuleType("fake_paged_queries")
+    exec(
+        "async def iter_pages():\n"
+        "    for i in range(3):\n        yield i\n",
+        module.__dict__,
+    )
+    metrics.instrument_queries(module)
+    sum_before = _sample("db_query_duration_seconds_sum", "iter_pages")
+
+    async for _ in module.iter_pages():
+        # El consumidor trabaja entre elementos (en el checker, scrapear el producto).
+        await asyncio.sleep(0.1)
+
+    assert _sample("db_query_duration_seconds_count", "iter_pages") == 1
+    assert _sample("db_query_duration_seconds_sum", "iter_pages") - sum_before < 0.05
@@ -0,0 +1,23 @@
+# tests/test_scraper_cache.py
+from datetime import datetime, timedelta
+from scraper.cache import TTLCache
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", {"price": 1})
+    cache.set("b", {"price": 2})
+    cache.get("a")
+    cache.set("c", {"price": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"price": 1}
+    assert cache.stats()["evictions"] == 1
+
+def test_ttl_cache_expires_by_scraped_at():
+    cache = TTLCache(max_entries=10, ttl_seconds=60)
+    cache.set("old", {"price": 1}, scraped_at=datetime.utcnow() - timedelta(seconds=61))
+    cache.set("fresh", {"price": 2}, scraped_at=datetime.utcnow() - timedelta(seconds=30))
+
+    assert cache.get("old") is None
+    assert cache.get("fresh") == {"price": 2}
+    assert (cache.hits, cache.misses) == (1, 1)
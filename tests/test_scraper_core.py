@@ -1,6 +1,14 @@
 # tests/test_scraper_core.py
+import asyncio
+import os
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+import httpx
 import pytest
-from scraper.core import _parse_product_details
+from scraper.core import _parse_product_details, _parse_product_details_soup
+from scraper.throttle import HostThrottle
+
+SAMPLE_HTML_PATH = os.path.join(os.path.dirname(__file__), '..', 'scraper.html')
 
 def test_parse_product_details_with_valid_html():
     html = """
@@ -25,3 +33,181 @@ def test_parse_product_details_with_no_product_data():
     result = _parse_product_details(html, "https://example.com")
     assert result["name"] is None
     assert result["price"] is None
+
+@pytest.mark.skipif(not os.path.exists(SAMPLE_HTML_PATH), reason="scraper.html no disponible")
+def test_parse_product_details_fast_path_matches_soup_on_sample_page():
+    with open(SAMPLE_HTML_PATH, encoding="utf-8") as f:
+        html = f.read()
+    result = _parse_product_details(html, "https://example.com")
+    assert result == _parse_product_details_soup(html, "https://example.com")
+    assert result["price"] is not None
+
+def test_parse_product_details_falls_back_when_fast_path_cannot_decide():
+    html = """
+    <script type="application/ld+json">{not json}</script>
+    <script type="application/ld+json">{"@type": "Product", "offers": {"price": "10"}}</script>
+    """
+    result = _parse_product_details(html, "https://example.com")
+    assert result == _parse_product_details_soup(html, "https://example.com")
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("executor_kind", ["none", "thread"])
+async def test_parse_product_details_async_uses_configured_executor(executor_kind, monkeypatch):
+    from scraper import core
+    monkeypatch.setattr(core.config, "PARSE_EXECUTOR", executor_kind)
+    monkeypatch.setattr(core.config, "PARSE_WORKERS", 1)
+    html = '<script type="application/ld+json">{"@type": "Product", "offers": {"price": "5"}}</script>'
+    try:
+        result = await core.parse_product_details_async(html, "https://example.com")
+    finally:
+        core.shutdown_parse_executor()
+    assert result["price"] == 5.0
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("handler_result, expected_status", [
+    (lambda request: httpx.Response(200, text="<html></html>"), "SUCCESS"),
+    (lambda request: httpx.Response(500), "API_ERROR"),
+    (httpx.ReadTimeout("timeout"), "TIMEOUT_ERROR"),
+    (httpx.ConnectError("refused"), "REQUEST_ERROR"),
+])
+async def test_fetch_product_details_maps_statuses(handler_result, expected_status, monkeypatch):
+    from scraper import core
+
+    def handler(request):
+        if isinstance(handler_result, Exception):
+            raise handler_result
+        return handler_result(request)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(core, "get_http_client", lambda: client)
+    monkeypatch.setattr(core.config, "SCRAPERAPI_KEY", "key")
+    monkeypatch.setattr(core.config, "MAX_RETRIES_SCRAPER", 0)
+    monkeypatch.setattr(core, "_host_throttle", HostThrottle(max_concurrency=1, min_delay_seconds=0))
+
+    text, status, _ = await core.fetch_product_details_from_url("https://example.com/p")
+    await client.aclose()
+
+    assert status == expected_status
+    assert (text is not None) == (expected_status == "SUCCESS")
+
+@pytest.mark.asyncio
+async def test_get_product_info_coalesces_concurrent_scrapes(monkeypatch):
+    from scraper import core
+    fetch_calls = 0
+
+    async def fake_fetch(url, use_api=True, validators=None):
+        nonlocal fetch_calls
+        fetch_calls += 1
+        await asyncio.sleep(0.01)
+        return '<script type="application/ld+json">{"@type": "Product", "offers": {"price": "7"}}</script>', "SUCCESS", {}
+
+    monkeypatch.setattr(core, "fetch_product_details_from_url", fake_fetch)
+    monkeypatch.setattr(core.db_queries, "get_last_scraped_price", AsyncMock(return_value=None))
+    monkeypatch.setattr(core, "save_scraped_price", AsyncMock())
+    monkeypatch.setattr(core.config, "PARSE_EXECUTOR", "none")
+
+    first, second = await asyncio.gather(
+        core.get_product_info("https://example.com/p?ref=a", check_cache=False),
+        core.get_product_info("https://example.com/p?ref=b", check_cache=False),
+    )
+
+    assert fetch_calls == 1
+    assert first["price"] == second["price"] == 7.0
+    assert (first["full_url"], second["full_url"]) == ("https://example.com/p?ref=a", "https://example.com/p?ref=b")
+    assert core._inflight_scrapes == {}
+
+@pytest.mark.asyncio
+async def test_get_product_info_propagates_scrape_failure_to_all_waiters(monkeypatch):
+    from scraper import core
+
+    async def failing_fetch(url, use_api=True, validators=None):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(core, "fetch_product_details_from_url", failing_fetch)
+    monkeypatch.setattr(core.db_queries, "get_last_scraped_price", AsyncMock(return_value=None))
+
+    results = await asyncio.gather(
+        core.get_product_info("https://example.com/p", check_cache=False),
+        core.get_product_info("https://example.com/p", check_cache=False),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert core._inflight_scrapes == {}
+
+@pytest.mark.asyncio
+async def test_get_product_info_serves_stale_row_and_refreshes_in_background(monkeypatch):
+    from scraper import core
+    refreshed = asyncio.Event()
+
+    async def fake_scrape(url, cleaned_url):
+        refreshed.set()
+        return {"price": 8.0, "status": "SCRAPED_SUCCESS"}
+
+    stale_row = {"price": 9.0, "scraped_at": datetime.utcnow() - timedelta(minutes=core.config.SCRAPE_TTL_MINUTES + 1)}
+    monkeypatch.setattr(core, "get_cached_row", AsyncMock(return_value=stale_row))
+    monkeypatch.setattr(core, "_scrape_product", fake_scrape)
+
+    result = await core.get_product_info("https://example.com/p")
+
+    assert result["status"] == "CACHE_STALE"
+    assert result["price"] == 9.0
+    await asyncio.wait_for(refreshed.wait(), timeout=1)
+
+@pytest.mark.asyncio
+async def test_save_scraped_price_appends_history_without_failing_on_history_errors(monkeypatch):
+    from scraper import core
+    fake_queries = AsyncMock()
+    fake_queries.append_price_history.side_effect = RuntimeError("partición inexistente")
+    monkeypatch.setattr(core, "db_queries", fake_queries)
+
+    await core.save_scraped_price("https://example.com/p", {"price": 7.0, "availability": "InStock"})
+
+    fake_queries.save_scraped_price.assert_awaited_once()
+    fake_queries.append_price_history.assert_awaited_once_with("https://example.com/p", 7.0, True)
+    assert core._price_cache.get("https://example.com/p")["price"] == 7.0
+    core._price_cache.clear()
+
+@pytest.mark.asyncio
+async def test_scrape_skips_parse_and_save_when_ld_json_is_unchanged(monkeypatch):
+    from scraper import core
+    html = '<script type="application/ld+json">{"@type": "Product", "offers": {"price": "7"}}</script>'
+    previous_row = {"price": 7.0, "product_name": "P", "scraped_at": datetime.utcnow() - timedelta(days=1),
+                    "etag": '"v1"', "last_modified": None, "content_hash": core._content_hash(html)}
+    fake_queries = AsyncMock()
+    fake_queries.get_last_scraped_price.return_value = previous_row
+    monkeypatch.setattr(core, "db_queries", fake_queries)
+    monkeypatch.setattr(core, "fetch_product_details_from_url", AsyncMock(return_value=(html, "SUCCESS", {})))
+    monkeypatch.setattr(core, "parse_product_details_async", AsyncMock())
+
+    result = await core._scrape_product("https://example.com/p", "https://example.com/p")
+
+    assert result["status"] == "SCRAPED_UNCHANGED"
+    assert result["price"] == 7.0
+    core.parse_product_details_async.assert_not_awaited()
+    fake_queries.save_scraped_price.assert_not_awaited()
+    fake_queries.touch_scraped_price.assert_awaited_once_with("https://example.com/p", None, None)
+    # La observación cuenta para el histórico aunque la fila de scraped_prices no se reescriba.
+    fake_queries.append_unchanged_price_history.assert_awaited_once_with("https://example.com/p", 7.0)
+    assert core.fetch_product_details_from_url.await_args.kwargs["validators"]["etag"] == '"v1"'
+    core._price_cache.clear()
+
+@pytest.mark.asyncio
+async def test_direct_fetch_sends_conditional_headers_and_maps_304(monkeypatch):
+    from scraper import core
+
+    def handler(request):
+        assert request.headers["If-None-Match"] == '"v1"'
+        return httpx.Response(304, headers={"ETag": '"v1"'})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(core, "get_http_client", lambda: client)
+    monkeypatch.setattr(core.config, "SCRAPERAPI_KEY", "")
+    monkeypatch.setattr(core, "_host_throttle", HostThrottle(max_concurrency=1, min_delay_seconds=0))
+
+    text, status, validators = await core.fetch_product_details_from_url("https://example.com/p", validators={"etag": '"v1"'})
+    await client.aclose()
+
+    assert (text, status) == (None, "NOT_MODIFIED")
+    assert validators["etag"] == '"v1"'
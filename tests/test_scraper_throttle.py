@@ -0,0 +1,19 @@
+# tests/test_scraper_throttle.py
+import asyncio
+import pytest
+from scraper.throttle import HostThrottle
+
+@pytest.mark.asyncio
+async def test_host_throttle_spaces_requests_to_same_host():
+    throttle = HostThrottle(max_concurrency=2, min_delay_seconds=0.05)
+    loop = asyncio.get_running_loop()
+    starts = []
+
+    async def request(url):
+        async with throttle.slot(url):
+            starts.append((url, loop.time()))
+
+    await asyncio.gather(request("https://a.com/1"), request("https://a.com/2"), request("https://b.com/1"))
+
+    a_starts = sorted(t for url, t in starts if "a.com" in url)
+    assert a_starts[1] - a_starts[0] >= 0.04
@@ -0,0 +1,255 @@
+# tests/test_tasks_checker.py
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+import pytest
+from db.models import Alert
+from scraper.models import ProductInfo
+from tasks import checker
+
+@pytest.fixture(autouse=True)
+def clear_price_cache():
+    checker.scraper_core._price_cache.clear()
+    yield
+    checker.scraper_core._price_cache.clear()
+
+@pytest.mark.asyncio
+@patch('tasks.checker.config.CHECKER_CONCURRENCY', 4)
+@patch('tasks.checker.db_queries.get_cached_prices', new_callable=AsyncMock, return_value={})
+@patch('db.write_buffer.db_queries', new_callable=AsyncMock)
+@patch('tasks.checker.scraper_core.get_product_info')
+async def test_run_check_cycle_runs_alerts_concurrently(mock_get_product_info, mock_db_queries, mock_get_cached_prices):
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fake_get_product_info(url, check_cache=True, allow_stale=True):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return ProductInfo(price=100.0, status="SCRAPED_SUCCESS")
+
+    mock_get_product_info.side_effect = fake_get_product_info
+    alerts = [
+        {"id": i, "chat_id": 1, "full_url": f"https://example.com/p{i}", "clean_url": f"https://example.com/p{i}",
+         "target_price": 50.0, "last_price": None, "last_notified": None}
+        for i in range(8)
+    ]
+
+    await checker.run_check_cycle(AsyncMock(), alerts)
+
+    assert mock_get_product_info.await_count == 8
+    assert max_in_flight == 4
+
+@pytest.mark.asyncio
+@patch('tasks.checker.db_queries.get_cached_prices', new_callable=AsyncMock, return_value={})
+@patch('db.write_buffer.db_queries', new_callable=AsyncMock)
+@patch('tasks.checker.scraper_core.get_product_info', new_callable=AsyncMock)
+async def test_run_check_cycle_scrapes_each_product_once(mock_get_product_info, mock_db_queries, mock_get_cached_prices):
+    mock_get_product_info.return_value = ProductInfo(price=100.0, status="SCRAPED_SUCCESS")
+    alerts = [
+        {"id": i, "chat_id": i, "full_url": f"https://example.com/p?ref={i}", "clean_url": "https://example.com/p",
+         "target_price": 50.0, "last_price": None, "last_notified": None}
+        for i in range(5)
+    ]
+
+    await checker.run_check_cycle(AsyncMock(), alerts)
+
+    mock_get_product_info.assert_awaited_once_with("https://example.com/p?ref=0", check_cache=False, allow_stale=False)
+    mock_db_queries.update_alerts_last_price_bulk.assert_awaited_once()
+    assert len(mock_db_queries.update_alerts_last_price_bulk.await_args.args[0]) == 5
+
+@pytest.mark.asyncio
+@patch('tasks.checker.config.CHECKER_SQL_TRIGGER_MIN_SUBSCRIBERS', 3)
+@patch('tasks.checker.db_queries.apply_observed_price', new_callable=AsyncMock)
+@patch('tasks.checker.db_queries.get_cached_prices', new_callable=AsyncMock, return_value={})
+@patch('db.write_buffer.db_queries', new_callable=AsyncMock)
+@patch('tasks.checker.scraper_core.get_product_info', new_callable=AsyncMock)
+async def test_popular_products_are_evaluated_in_one_query(mock_get_product_info, mock_db_queries, mock_get_cached_prices, mock_apply):
+    mock_get_product_info.return_value = ProductInfo(price=40.0, status="SCRAPED_SUCCESS")
+    alerts = [
+        Alert(id=str(i), chat_id=i, full_url="https://example.com/p", clean_url="https://example.com/p", target_price=50.0)
+        for i in range(3)
+    ]
+    mock_apply.return_value = [alerts[1]]
+    dispatcher = MagicMock(flush=AsyncMock())
+
+    await checker.run_check_cycle(AsyncMock(), alerts, dispatcher)
+
+    mock_apply.assert_awaited_once_with("https://example.com/p", 40.0, checker.config.NOTIFY_COOLDOWN_HOURS * 3600)
+    # Solo se encola lo que devuelve la BD y last_price ya lo ha guardado la propia consulta.
+    dispatcher.enqueue.assert_called_once_with(alerts[1], mock_get_product_info.return_value)
+    mock_db_queries.update_alerts_last_price_bulk.assert_not_awaited()
+
+@pytest.mark.asyncio
+@patch('tasks.checker.db_queries.update_alerts_last_notified_bulk', new_callable=AsyncMock)
+@patch('db.write_buffer.db_queries', new_callable=AsyncMock)
+@patch('tasks.checker.scraper_core.get_product_info', new_callable=AsyncMock)
+@patch('tasks.checker.db_queries.get_cached_prices', new_callable=AsyncMock)
+async def test_run_check_cycle_uses_prefetched_cache(mock_get_cached_prices, mock_get_product_info, mock_db_queries, mock_mark_notified):
+    mock_get_cached_prices.return_value = {"https://example.com/p": {"price": 40.0, "product_name": "P", "scraped_at": datetime.utcnow()}}
+    alerts = [{"id": 1, "chat_id": 1, "full_url": "https://example.com/p", "clean_url": "https://example.com/p",
+               "target_price": 50.0, "last_price": None, "last_notified": None}]
+    bot = AsyncMock()
+
+    await checker.run_check_cycle(bot, alerts)
+
+    mock_get_cached_prices.assert_awaited_once_with(["https://example.com/p"])
+    mock_get_product_info.assert_not_awaited()
+    bot.send_message.assert_awaited_once()
+    mock_mark_notified.assert_awaited_once_with(["1"])
+
+@pytest.mark.asyncio
+@patch('tasks.checker.db_queries.get_cached_prices', new_callable=AsyncMock, return_value={})
+@patch('db.write_buffer.db_queries', new_callable=AsyncMock)
+@patch('tasks.checker.scraper_core.get_product_info', new_callable=AsyncMock)
+async def test_run_check_cycle_schedules_products(mock_get_product_info, mock_db_queries, mock_get_cached_prices):
+    mock_get_product_info.return_value = ProductInfo(price=90.0, status="SCRAPED_SUCCESS")
+    alerts = [
+        {"id": 1, "chat_id": 1, "full_url": "https://example.com/a", "clean_url": "https://example.com/a",
+         "target_price": 50.0, "last_price": 100.0, "last_notified": None,
+         "check_interval_seconds": 7200, "product_last_price": 100.0},
+        {"id": 2, "chat_id": 1, "full_url": "https://example.com/b", "clean_url": "https://example.com/b",
+         "target_price": 50.0, "last_price": 100.0, "last_notified": datetime.utcnow(),
+         "check_interval_seconds": 7200, "product_last_price": 100.0},
+    ]
+
+    await checker.run_check_cycle(AsyncMock(), alerts)
+
+    # El producto en cooldown no se scrapea, pero se replanifica para cuando acabe el cooldown.
+    mock_get_product_info.assert_awaited_once()
+    schedules = {s[0]: s for s in mock_db_queries.upsert_product_schedules.await_args.args[0]}
+    assert schedules["https://example.com/a"][4] is True
+    assert schedules["https://example.com/a"][2] < 7200
+    assert schedules["https://example.com/b"][2] == 7200
+
+@pytest.mark.asyncio
+@patch('tasks.checker.config.CHECKER_PREFETCH_BATCH_SIZE', 2)
+@patch('tasks.checker.db_queries.get_cached_prices', new_callable=AsyncMock, return_value={})
+@patch('db.write_buffer.db_queries', new_callable=AsyncMock)
+@patch('tasks.checker.scraper_core.get_product_info', new_callable=AsyncMock)
+async def test_run_check_cycle_consumes_sorted_alert_stream_in_batches(mock_get_product_info, mock_db_queries, mock_get_cached_prices):
+    mock_get_product_info.return_value = ProductInfo(price=100.0, status="SCRAPED_SUCCESS")
+
+    async def stream():
+        for url, alert_id in [("https://example.com/a", 1), ("https://example.com/a", 2),
+                              ("https://example.com/b", 3), ("https://example.com/c", 4)]:
+            yield Alert(id=str(alert_id), chat_id=alert_id, full_url=url, clean_url=url, target_price=50.0, subscriber_count=2)
+
+    product_count = await checker.run_check_cycle(AsyncMock(), stream())
+
+    assert product_count == 3
+    assert mock_get_product_info.await_count == 3
+    assert [c.args[0] for c in mock_get_cached_prices.await_args_list] == [
+        ["https://example.com/a", "https://example.com/b"], ["https://example.com/c"]
+    ]
+
+@pytest.mark.asyncio
+@patch('tasks.checker.db_queries.update_alerts_last_notified_bulk', new_callable=AsyncMock)
+@patch('tasks.checker.db_queries.get_cached_prices', new_callable=AsyncMock, return_value={})
+@patch('db.write_buffer.db_queries', new_callable=AsyncMock)
+@patch('tasks.checker.scraper_core.get_product_info', new_callable=AsyncMock)
+async def test_notifications_share_product_info_but_link_each_alert_url(mock_get_product_info, mock_db_queries, mock_get_cached_prices, mock_mark_notified):
+    mock_get_product_info.return_value = ProductInfo(price=40.0, name="P", full_url="https://example.com/p?ref=1", status="SCRAPED_SUCCESS")
+    alerts = [
+        Alert(id=str(i), chat_id=i, full_url=f"https://example.com/p?ref={i}", clean_url="https://example.com/p", target_price=50.0)
+        for i in (1, 2)
+    ]
+    bot = AsyncMock()
+
+    await checker.run_check_cycle(bot, alerts)
+
+    texts = sorted(c.kwargs["text"] for c in bot.send_message.await_args_list)
+    assert "(https://example.com/p?ref=1)" in texts[0]
+    assert "(https://example.com/p?ref=2)" in texts[1]
+    # Las alertas no se copian ni se modifican: el nuevo precio solo va al buffer de escritura.
+    assert alerts[0].last_price is None
+
+@pytest.mark.asyncio
+@patch('tasks.checker.db_queries.release_product_leases', new_callable=AsyncMock)
+@patch('tasks.checker.db_queries.get_alerts_for_products', new_callable=AsyncMock)
+@patch('tasks.checker.db_queries.claim_due_products', new_callable=AsyncMock)
+@patch('tasks.checker.db_queries.get_cached_prices', new_callable=AsyncMock, return_value={})
+@patch('db.write_buffer.db_queries', new_callable=AsyncMock)
+@patch('tasks.checker.scraper_core.get_product_info', new_callable=AsyncMock)
+async def test_process_claimed_batch_checks_claimed_products_and_releases_leases(
+        mock_get_product_info, mock_db_queries, mock_get_cached_prices, mock_claim, mock_get_alerts, mock_release):
+    mock_get_product_info.return_value = ProductInfo(price=100.0, status="SCRAPED_SUCCESS")
+    mock_claim.side_effect = [["https://example.com/a"], []]
+    mock_get_alerts.return_value = [
+        Alert(id="1", chat_id=1, full_url="https://example.com/a", clean_url="https://example.com/a", target_price=50.0)
+    ]
+
+    dispatcher = MagicMock(flush=AsyncMock())
+
+    assert await checker.process_claimed_batch(AsyncMock(), dispatcher, "w1") == 1
+    assert await checker.process_claimed_batch(AsyncMock(), dispatcher, "w1") == 0
+
+    mock_get_alerts.assert_awaited_once_with(["https://example.com/a"])
+    mock_get_product_info.assert_awaited_once()
+    mock_release.assert_awaited_once_with("w1")
+    assert mock_db_queries.upsert_product_schedules.await_args.args[0][0][0] == "https://example.com/a"
+
+@pytest.mark.asyncio
+@patch('tasks.checker.config.SCHEDULE_MIN_INTERVAL_SECONDS', 1800)
+@patch('tasks.checker.config.SCHEDULE_MAX_INTERVAL_SECONDS', 86400)
+@patch('tasks.checker.db_queries.get_cached_prices', new_callable=AsyncMock, return_value={})
+@patch('db.write_buffer.db_queries', new_callable=AsyncMock)
+@patch('tasks.checker.scraper_core.get_product_info', new_callable=AsyncMock)
+async def test_unchanged_price_backs_off_across_cycles(mock_get_product_info, mock_db_queries, mock_get_cached_prices):
+    # Producto popular y a un 10% del objetivo: los dos factores solo adelantan la próxima revisión.
+    mock_get_product_info.return_value = ProductInfo(price=110.0, status="SCRAPED_SUCCESS")
+    interval = 4000
+    schedules = []
+    for _ in range(4):
+        alerts = [Alert(id=1, chat_id=1, full_url="https://example.com/a", clean_url="https://example.com/a",
+                        target_price=100.0, last_price=110.0, check_interval_seconds=interval,
+                        product_last_price=110.0, subscriber_count=10)]
+        await checker.run_check_cycle(AsyncMock(), alerts)
+        _, next_check_in, interval, _, price_changed = mock_db_queries.upsert_product_schedules.await_args.args[0][0]
+        assert price_changed is False
+        schedules.append((next_check_in, interval))
+
+    assert [interval for _, interval in schedules] == [6000, 9000, 13500, 20250]
+    assert [next_check_in for next_check_in, _ in schedules] == [2250, 3375, 5062, 7593]
+
+@pytest.mark.asyncio
+@patch('tasks.checker.config.CHECKER_LEASE_SECONDS', 0.03)
+@patch('tasks.checker.db_queries.renew_product_leases', new_callable=AsyncMock, return_value=1)
+@patch('tasks.checker.db_queries.release_product_leases', new_callable=AsyncMock)
+@patch('tasks.checker.db_queries.get_alerts_for_products', new_callable=AsyncMock)
+@patch('tasks.checker.db_queries.claim_due_products', new_callable=AsyncMock, return_value=["https://example.com/a"])
+@patch('tasks.checker.db_queries.get_cached_prices', new_callable=AsyncMock, return_value={})
+@patch('db.write_buffer.db_queries', new_callable=AsyncMock)
+@patch('tasks.checker.scraper_core.get_product_info', new_callable=AsyncMock)
+async def test_process_claimed_batch_renews_leases_while_a_slow_batch_runs(
+        mock_get_product_info, mock_db_queries, mock_get_cached_prices, mock_claim, mock_get_alerts, mock_release, mock_renew):
+    async def slow_scrape(*args, **kwargs):
+        await asyncio.sleep(0.1)
+        return ProductInfo(price=100.0, status="SCRAPED_SUCCESS")
+
+    mock_get_product_info.side_effect = slow_scrape
+    mock_get_alerts.return_value = [
+        Alert(id="1", chat_id=1, full_url="https://example.com/a", clean_url="https://example.com/a", target_price=50.0)
+    ]
+
+    await checker.process_claimed_batch(AsyncMock(), MagicMock(flush=AsyncMock()), "w1")
+    renewals = mock_renew.await_count
+    await asyncio.sleep(0.05)
+
+    assert renewals >= 2
+    mock_renew.assert_awaited_with("w1", 0.03)
+    # Terminado el lote, deja de prorrogar.
+    assert mock_renew.await_count == renewals
+
+@pytest.mark.asyncio
+@patch('tasks.checker.db_queries.cleanup_old_scraped_prices', new_callable=AsyncMock)
+@patch('tasks.checker.db_async_connection.try_advisory_lock')
+async def test_maintenance_is_skipped_while_another_process_holds_the_lock(mock_lock, mock_cleanup):
+    mock_lock.return_value.__aenter__.return_value = False
+
+    await checker._run_maintenance()
+
+    mock_lock.assert_called_once_with(checker.MAINTENANCE_LOCK_KEY)
+    mock_cleanup.assert_not_awaited()
@@ -0,0 +1,19 @@
+# tests/test_tasks_scheduler.py
+from unittest.mock import patch
+from tasks.scheduler import compute_base_interval, compute_next_check_delay
+
+@patch('tasks.scheduler.config.SCHEDULE_MIN_INTERVAL_SECONDS', 1800)
+@patch('tasks.scheduler.config.SCHEDULE_MAX_INTERVAL_SECONDS', 86400)
+def test_compute_base_interval_adapts_to_volatility_and_bounds():
+    assert compute_base_interval(8000, True, 200.0) == 4000
+    assert compute_base_interval(8000, False, 200.0) == 12000
+    assert compute_base_interval(80000, False, 200.0) == 86400
+    assert compute_base_interval(8000, False, None) == 8000
+
+@patch('tasks.scheduler.config.SCHEDULE_MIN_INTERVAL_SECONDS', 1800)
+@patch('tasks.scheduler.config.SCHEDULE_MAX_INTERVAL_SECONDS', 86400)
+def test_compute_next_check_delay_prioritizes_near_target_and_popular_products():
+    assert compute_next_check_delay(30000, 102.0, [100.0], 1) == 3600
+    assert compute_next_check_delay(12000, 200.0, [100.0], 10) == 6000
+    assert compute_next_check_delay(12000, 200.0, [100.0], 1) == 12000
+    assert compute_next_check_delay(12000, None, [100.0], 10) == 12000